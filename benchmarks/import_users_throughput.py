@@ -0,0 +1,110 @@
+"""Measures the throughput and the memory of `POST /v1/users:import`.
+
+The route used to read the whole body, decode it and split it into lines
+before the first user was inserted. It now parses the body as it is received
+and inserts each batch before reading the next one. This benchmark posts a
+CSV in chunks to both variants, served in process from a SQLite database, and
+prints the rows/s and the peak of memory allocated during the request::
+
+    python benchmarks/import_users_throughput.py --users 20000 --chunk-kb 64
+
+Passwords are hashed with the lowest bcrypt cost unless `PASSWORD_BCRYPT_ROUNDS`
+is set, so that the benchmark measures the reading of the body.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+# The api modules build the engine when imported, it is not used by the benchmark.
+for name, value in (("DB_USER", "identity"), ("DB_PASSWORD", "identity"), ("DB_DATABASE", "identity"),
+                    ("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("PASSWORD_BCRYPT_ROUNDS", "4"),
+                    ("PASSWORD_HASH_EXECUTOR", "thread")):
+    os.environ.setdefault(name, value)
+
+import httpx
+from fastapi import FastAPI, Request
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from identity import config
+from identity.adapters.db.tables import Base
+from identity.adapters.importers import read_users_csv
+from identity.api.dependencies import UsersUnitOfWork, get_users_uow
+from identity.api.main import app
+from identity.api.routers.tokens import get_current_active_user
+from identity.services import users as user_services
+from identity.services.hashing import shutdown_hashing_executor
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+buffered_app = FastAPI()
+
+
+@buffered_app.post("/v1/users:import")
+async def import_buffered_users(request: Request, uow: UsersUnitOfWork) -> dict:
+    """The previous route"""
+    lines = (await request.body()).decode().splitlines()
+    report = await user_services.bulk_new_users(read_users_csv(lines), uow,
+                                                batch_size=config.get_users_import_batch_size())
+    return {"created": report.created}
+
+
+def make_body(count: int, prefix: str) -> bytes:
+    rows = "".join(f"{prefix}{number}@example.com,password{number}\n" for number in range(count))
+    return ("email,password\n" + rows).encode()
+
+
+async def chunks(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def measure(asgi_app, body: bytes, chunk_size: int):
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = await client.post("/v1/users:import", content=chunks(body, chunk_size),
+                                     headers={"Content-Type": "text/csv"})
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    response.raise_for_status()
+    return response.json()["created"], elapsed, peak
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/bench.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        def get_uow():
+            return UsersSqlAlchemyUnitOfWork(session_maker)
+
+        for asgi_app in (app, buffered_app):
+            asgi_app.dependency_overrides[get_users_uow] = get_uow
+            asgi_app.dependency_overrides[get_current_active_user] = lambda: None
+
+        variants = (
+            ("buffered body", buffered_app),
+            ("streamed body", app),
+        )
+        try:
+            for name, asgi_app in variants:
+                body = make_body(args.users, name.split()[0])
+                created, elapsed, peak = await measure(asgi_app, body, args.chunk_kb * 1024)
+                print(f"{name:<14} users={created:<7} rows/s={created / elapsed:9.1f} "
+                      f"peak_memory={peak / 2 ** 20:7.1f}MiB body={len(body) / 2 ** 20:.1f}MiB")
+        finally:
+            shutdown_hashing_executor()
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+"""Measures the throughput of `GET /v1/users` listing 10k users.
+
+The route used to return the users and let FastAPI validate them against
+`response_model` and render them with the standard `json` module. It now
+serializes the trusted users with the schema fields and renders them with
+orjson by default. This benchmark serves three variants in process from a
+SQLite database and prints the requests/s of each one::
+
+    python benchmarks/list_users_throughput.py --users 10000 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+# The api modules build the engine when imported, it is not used by the benchmark.
+for name, value in (("DB_USER", "identity"), ("DB_PASSWORD", "identity"), ("DB_DATABASE", "identity"),
+                    ("DB_HOST", "localhost"), ("DB_PORT", "5432")):
+    os.environ.setdefault(name, value)
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from identity.adapters.db.tables import Base
+from identity.adapters.db.tables import users as db_users
+from identity.api import responses
+from identity.api.dependencies import UsersUnitOfWork, get_users_uow
+from identity.api.main import app
+from identity.api.routers.tokens import get_current_active_user
+from identity.api.schemas.users import User
+from identity.domain.utils import utcnow
+from identity.services import users as user_services
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+validated_app = FastAPI()
+
+
+@validated_app.get("/v1/users", response_model=List[User])
+async def list_validated_users(uow: UsersUnitOfWork) -> List[User]:
+    """The previous route"""
+    return await user_services.list_users(uow)
+
+
+async def fill(engine, count):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        now = utcnow()
+        rows = [{"created_at": now, "updated_at": now, "email": f"user{number}@example.com",
+                 "password": "$2b$12$" + "x" * 53, "active": True, "validated": True}
+                for number in range(count)]
+        await conn.execute(insert(db_users.User), rows)
+
+
+async def measure(asgi_app, requests):
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # The first request warms up the connection pool
+        (await client.get("/v1/users")).raise_for_status()
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/v1/users")
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+    return len(response.json()), elapsed
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/bench.db")
+        await fill(engine, args.users)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        def get_uow():
+            return UsersSqlAlchemyUnitOfWork(session_maker)
+
+        for asgi_app in (app, validated_app):
+            asgi_app.dependency_overrides[get_users_uow] = get_uow
+            asgi_app.dependency_overrides[get_current_active_user] = lambda: None
+
+        variants = (
+            ("validated json", validated_app, JSONResponse),
+            ("trusted json", app, JSONResponse),
+            ("trusted orjson", app, ORJSONResponse),
+        )
+        for name, asgi_app, response_class in variants:
+            responses.JSON_RESPONSE_CLASS = response_class
+            users, elapsed = await measure(asgi_app, args.requests)
+            print(f"{name:<16} users={users:<6} requests/s={args.requests / elapsed:8.2f} "
+                  f"ms/request={elapsed / args.requests * 1000:8.1f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""Measures the latency of `GET /` while a burst of logins is being served.
+
+Password hashing used to run inside the event loop, so every request handled by
+a worker waited for the bcrypt calls of the logins in flight. This benchmark
+probes the health endpoint at a fixed rate, first alone and then during a login
+burst, and prints the latency percentiles of both phases.
+
+It runs against a live server, e.g. the one started by `make up`::
+
+    python benchmarks/login_event_loop_latency.py --url http://localhost:8000 \\
+        --username bench@example.com --password secret --logins 200 --concurrency 20
+
+The user is registered if it does not exist yet.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, round(pct / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def report(name, latencies):
+    millis = [latency * 1000 for latency in latencies]
+    print(f"{name:<16} n={len(millis):<6} "
+          f"p50={percentile(millis, 50):8.2f}ms p90={percentile(millis, 90):8.2f}ms "
+          f"p99={percentile(millis, 99):8.2f}ms max={max(millis, default=float('nan')):8.2f}ms "
+          f"mean={statistics.fmean(millis) if millis else float('nan'):8.2f}ms")
+
+
+async def probe(client, stop, interval, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def login(client, username, password, latencies, errors):
+    started = time.perf_counter()
+    response = await client.post("/v1/token", data={"username": username, "password": password})
+    if response.status_code == 200:
+        latencies.append(time.perf_counter() - started)
+    else:
+        errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+
+async def login_burst(client, args, latencies, errors):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded_login():
+        async with semaphore:
+            await login(client, args.username, args.password, latencies, errors)
+
+    await asyncio.gather(*(bounded_login() for _ in range(args.logins)))
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client, \
+            httpx.AsyncClient(base_url=args.url, timeout=60) as probe_client:
+        await client.post("/v1/users", json={"username": args.username, "password": args.password})
+
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(probe_client, stop, args.probe_interval, idle))
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        await task
+
+        busy, logins, errors = [], [], {}
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(probe_client, stop, args.probe_interval, busy))
+        started = time.perf_counter()
+        await login_burst(client, args, logins, errors)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await task
+
+    report("GET / idle", idle)
+    report("GET / logins", busy)
+    report("POST /v1/token", logins)
+    print(f"logins/s={len(logins) / elapsed:.1f} errors={errors or 0}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
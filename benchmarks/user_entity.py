@@ -0,0 +1,71 @@
+"""Measures the memory per instance and construction rate of the domain `User`.
+
+The domain user used to be a pydantic model validated on every construction.
+It is now a slots dataclass and pydantic is only used by the API schemas.
+This benchmark builds a million users with both classes and prints the bytes
+allocated per instance and the instances built per second::
+
+    python benchmarks/user_entity.py --users 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Union
+
+from pydantic import BaseModel, EmailStr, Field
+
+from identity.domain.users import User
+from identity.domain.utils import utcnow
+
+
+class PydanticUser(BaseModel):
+    """The previous domain user"""
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+    email: EmailStr
+    password: Union[str, None] = None
+    active: bool = False
+    validated: bool = False
+
+
+def rows(count):
+    now = utcnow()
+    # bcrypt hashes are 60 characters long
+    return [{"created_at": now, "updated_at": now, "email": f"user{number}@example.com",
+             "password": "$2b$12$" + "x" * 53, "active": True, "validated": False}
+            for number in range(count)]
+
+
+def construction_rate(factory, values):
+    started = time.perf_counter()
+    for row in values:
+        factory(**row)
+    return len(values) / (time.perf_counter() - started)
+
+
+def bytes_per_instance(factory, values):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = [factory(**row) for row in values]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the users is not part of them
+    return (after - before - users.__sizeof__()) / len(users)
+
+
+def main(args):
+    values = rows(args.users)
+    factories = (("pydantic", PydanticUser), ("pydantic construct", PydanticUser.construct), ("slots", User))
+    for name, factory in factories:
+        rate = construction_rate(factory, values)
+        size = bytes_per_instance(factory, values)
+        print(f"{name:<20} users={args.users:<8} users/s={rate:12.0f} bytes/user={size:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    main(parser.parse_args())
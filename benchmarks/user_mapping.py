@@ -0,0 +1,72 @@
+"""Measures how many users per second are read and mapped to domain users.
+
+Reads used to load whole ORM users, `password` included, and map each one
+with `User.from_orm`. Listings and lookups now select the profile columns only
+and map the rows to `UserProfile` directly. This benchmark fills an in-memory SQLite database
+and prints the rows/s of both paths::
+
+    python benchmarks/user_mapping.py --users 100000 --repeat 3
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from identity.adapters.db.tables import Base
+from identity.adapters.db.tables import users as db_users
+from identity.adapters.repositories.users import PROFILE_COLUMNS, profile_from_row
+from identity.domain.users import User
+from identity.domain.utils import utcnow
+
+
+async def orm_users(session):
+    """The previous read path"""
+    result = await session.scalars(select(db_users.User))
+    return [User.from_orm(db_user) for db_user in result]
+
+
+async def profiles(session):
+    """The current read path"""
+    rows = (await session.execute(select(*PROFILE_COLUMNS))).mappings()
+    return [profile_from_row(row) for row in rows]
+
+
+async def fill(engine, count):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        now = utcnow()
+        # bcrypt hashes are 60 characters long
+        rows = [{"created_at": now, "updated_at": now, "email": f"user{number}@example.com",
+                 "password": "$2b$12$" + "x" * 53, "active": True, "validated": True}
+                for number in range(count)]
+        await conn.execute(insert(db_users.User), rows)
+
+
+async def measure(session_maker, read, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        # A new session each time, so the identity map does not keep the objects of previous runs
+        async with session_maker() as session:
+            started = time.perf_counter()
+            users = await read(session)
+            best = min(best, time.perf_counter() - started)
+    return len(users), best
+
+
+async def main(args):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    await fill(engine, args.users)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    for name, read in (("orm", orm_users), ("profiles", profiles)):
+        rows, seconds = await measure(session_maker, read, args.repeat)
+        print(f"{name:<10} rows={rows:<8} best={seconds:8.3f}s rows/s={rows / seconds:12.0f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+"""Module with a Bloom filter, a compact set that can answer with false positives"""
+import hashlib
+import math
+from typing import Iterable
+
+
+class BloomFilter:
+    """Set of strings that never misses an item added but may contain items that were not added
+
+    It is sized for a number of items and a false positive rate. Adding more
+    items than its capacity increases the rate. Items cannot be removed.
+
+    :param capacity: expected number of items
+    :type capacity: int
+    :param error_rate: probability of a false positive when it holds `capacity` items
+    :type error_rate: float
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def of(cls, items: Iterable[str], capacity: int = 100_000, error_rate: float = 0.001) -> "BloomFilter":
+        """Returns a filter with the items, it grows beyond `capacity` if there are more items"""
+        items = list(items)
+        bloom = cls(max(capacity, 2 * len(items)), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item: str):
+        # Double hashing: the positions are h1 + i * h2 of two 64 bits hashes
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self):
+        return self.count
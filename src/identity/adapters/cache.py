@@ -0,0 +1,210 @@
+"""Module with in-process caches"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Union
+
+
+class CacheStats:
+    """Counters of a cache
+
+    :param hits: lookups answered by the cache
+    :type hits: int
+    :param misses: lookups not found or expired
+    :type misses: int
+    :param coalesced: lookups that waited for a load already in progress
+    :type coalesced: int
+    :param evictions: entries removed to make room for new ones
+    :type evictions: int
+    :param expirations: entries removed because they were too old
+    :type expirations: int
+    :param invalidations: entries removed explicitly
+    :type invalidations: int
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class LRUCache:
+    """Bounded cache that discards the least recently used entries first.
+
+    Entries can expire after a time to live. It is meant to be used from a single event loop.
+
+    :param max_size: maximum number of entries
+    :type max_size: int
+    :param ttl: default seconds an entry is valid, `None` means forever.
+    :type ttl: float, optional
+    :param clock: function returning the current time in seconds
+    :type clock: Callable[[], float]
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: Union[float, None] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: OrderedDict = OrderedDict()
+        self._loading: dict = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value of the key or `default` if it is not cached or has expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Union[float, None] = None):
+        """Stores a value, `ttl` overrides the default time to live of the cache"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else self.clock() + ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Removes a key. A load of the key in progress will not be stored."""
+        removed = self._entries.pop(key, None) is not None
+        removed = self._loading.pop(key, None) is not None or removed
+        if removed:
+            self.stats.invalidations += 1
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Removes the keys for which `predicate(key)` is true, loads in progress included.
+
+        It goes through all the keys, it is meant for rare changes.
+        Returns the number of keys removed.
+        """
+        keys = [key for key in dict.fromkeys((*self._entries, *self._loading)) if predicate(key)]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value or loads it awaiting `loader()`.
+
+        Concurrent misses of the same key wait for a single load.
+        `None` values are returned but not stored.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        while key in self._loading:
+            future = self._loading[key]
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The task loading the key was cancelled, try it again
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except (asyncio.CancelledError, Exception) as ex:
+            self._fail_load(key, future, ex)
+            raise
+        self._finish_load(key, future, value)
+        return value
+
+    async def get_many_or_load(self, keys: Iterable[Hashable],
+                               loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Returns the values of many keys, those not cached are loaded at once awaiting `loader(missing_keys)`.
+
+        `loader` returns a dict with the values of the keys found. Keys being loaded by
+        other tasks are waited for instead of loaded again. Keys without value are not
+        in the result and are not stored.
+        """
+        missing = object()
+        found, waiting, futures = {}, {}, {}
+        for key in dict.fromkeys(keys):
+            value = self.get(key, missing)
+            if value is not missing:
+                found[key] = value
+            elif key in self._loading:
+                self.stats.coalesced += 1
+                waiting[key] = self._loading[key]
+            else:
+                futures[key] = self._loading[key] = asyncio.get_running_loop().create_future()
+
+        if futures:
+            try:
+                values = await loader(list(futures))
+            except (asyncio.CancelledError, Exception) as ex:
+                for key, future in futures.items():
+                    self._fail_load(key, future, ex)
+                raise
+            for key, future in futures.items():
+                value = values.get(key)
+                self._finish_load(key, future, value)
+                if value is not None:
+                    found[key] = value
+
+        for key, future in waiting.items():
+            try:
+                value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The task loading the key was cancelled, load it again
+                value = await self.get_or_load(key, lambda key=key: self._load_one(loader, key))
+            if value is not None:
+                found[key] = value
+        return found
+
+    @staticmethod
+    async def _load_one(loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]], key: Hashable) -> Any:
+        return (await loader([key])).get(key)
+
+    def _finish_load(self, key: Hashable, future: asyncio.Future, value: Any):
+        stored = self._end_load(key, future)
+        future.set_result(value)
+        if stored and value is not None:
+            self.set(key, value)
+
+    def _fail_load(self, key: Hashable, future: asyncio.Future, ex: BaseException):
+        self._end_load(key, future)
+        if isinstance(ex, asyncio.CancelledError):
+            future.cancel()
+            return
+        future.set_exception(ex)
+        # Waiters get the exception, avoid the "never retrieved" warning when there are none
+        future.exception()
+
+    def _end_load(self, key: Hashable, future: asyncio.Future) -> bool:
+        """Forgets a load, returns `False` if it was invalidated while in progress"""
+        if self._loading.get(key) is future:
+            del self._loading[key]
+            return True
+        return False
@@ -0,0 +1,198 @@
+"""Module with an adaptive limit of the requests served at the same time
+
+The limit follows the latency of the requests, like TCP congestion control.
+Two moving averages of the latency are kept: a short one over about
+`short_window` requests and a long one, the baseline, over `long_window`.
+The limit grows by one every `limit` requests while the short average stays
+close to the baseline, and it is cut by `backoff` when it gets `tolerance`
+times longer, at most once every `decrease_interval` seconds. Averages, rather
+than the fastest request seen, keep a mix of cheap and slow routes from
+looking like congestion.
+Requests over the limit wait in a bounded queue for a while and then are
+rejected, so an overloaded worker answers quickly instead of piling up work.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """The request cannot be served now
+
+    :param retry_after: seconds to wait before trying again
+    :type retry_after: int
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class LimiterStats:
+    """Counters of an :class:`AdaptiveLimiter`
+
+    :param admitted: requests served
+    :type admitted: int
+    :param queued: requests that waited for a slot
+    :type queued: int
+    :param rejected: requests rejected because the queue was full
+    :type rejected: int
+    :param timeouts: requests rejected because they waited too long
+    :type timeouts: int
+    :param increases: times the limit was raised
+    :type increases: int
+    :param decreases: times the limit was cut
+    :type decreases: int
+    """
+
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class AdaptiveLimiter:
+    """Limits the requests in flight, it is meant to be used from a single event loop
+
+    :param initial_limit: requests in flight allowed at first
+    :type initial_limit: int
+    :param min_limit: lowest limit
+    :type min_limit: int
+    :param max_limit: highest limit
+    :type max_limit: int
+    :param max_queue: requests that can wait for a slot, more are rejected at once
+    :type max_queue: int
+    :param queue_timeout: seconds a request can wait for a slot
+    :type queue_timeout: float
+    :param tolerance: latency over the baseline, as a ratio, that cuts the limit
+    :type tolerance: float
+    :param backoff: ratio applied to the limit when it is cut
+    :type backoff: float
+    :param short_window: requests averaged to tell the current latency, the limit
+                         is not changed until as many have been served
+    :type short_window: int
+    :param long_window: requests averaged to tell the baseline latency
+    :type long_window: int
+    :param decrease_interval: minimum seconds between two cuts of the limit
+    :type decrease_interval: float
+    :param clock: function returning the current time in seconds
+    :type clock: Callable[[], float]
+    """
+
+    def __init__(self, initial_limit: int = 20, min_limit: int = 1, max_limit: int = 200, max_queue: int = 100,
+                 queue_timeout: float = 1.0, tolerance: float = 2.0, backoff: float = 0.9,
+                 short_window: int = 50, long_window: int = 1000, decrease_interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.short_window = short_window
+        self.long_window = long_window
+        self.decrease_interval = decrease_interval
+        self.clock = clock
+        self.latency = None
+        self.baseline = None
+        self.samples = 0
+        self.in_flight = 0
+        self.stats = LimiterStats()
+        self._waiters: deque = deque()
+        self._last_decrease = -math.inf
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+    def snapshot(self) -> dict:
+        return {"limit": int(self.limit), "in_flight": self.in_flight, "queue_size": self.queue_size,
+                "latency_seconds": self.latency, "baseline_seconds": self.baseline, **self.stats.snapshot()}
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    async def acquire(self):
+        """Takes a slot, waiting in the queue if there is none
+
+        :raises ConcurrencyLimitExceeded: if the queue is full or the wait is too long
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.stats.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats.rejected += 1
+            raise ConcurrencyLimitExceeded(self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Since Python 3.12 the slot may be handed over as the wait times out, it is kept then
+            if not waiter.done() or waiter.cancelled():
+                self.stats.timeouts += 1
+                raise ConcurrencyLimitExceeded(self._retry_after())
+        except asyncio.CancelledError:
+            # The slot was handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.stats.admitted += 1
+
+    def release(self, latency: float, failed: bool = False):
+        """Gives back a slot and adapts the limit to the latency of the request
+
+        :param latency: seconds the request took
+        :type latency: float
+        :param failed: if `True` the request raised an error and its latency is not sampled
+        :type failed: bool
+        """
+        if not failed:
+            self._adapt(latency)
+        self._release_slot()
+
+    def _adapt(self, latency: float):
+        self.samples += 1
+        if self.baseline is None:
+            self.latency = self.baseline = latency
+            return
+        # Exponential moving averages, the baseline follows lasting changes slowly.
+        # Until there are enough samples they are plain averages of all of them.
+        self.latency += (latency - self.latency) * max(2 / (self.short_window + 1), 1 / self.samples)
+        self.baseline += (latency - self.baseline) * max(2 / (self.long_window + 1), 1 / self.samples)
+        if self.samples < self.short_window:
+            return
+        if self.latency > self.baseline * self.tolerance:
+            # The requests of the same burst are equally slow, they cut the limit once
+            now = self.clock()
+            if now - self._last_decrease >= self.decrease_interval:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+                self.stats.decreases += 1
+        elif self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.stats.increases += 1
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot is handed over to the waiter
+                self.in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,52 @@
+"""adds user counters
+
+Revision ID: b42e457fd7fa
+Revises: dd44a903449e
+Create Date: 2026-10-18 10:02:11.840213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from identity.adapters.db.tables.users import (
+    COUNTER_SHARDS,
+    POSTGRES_COUNTERS_TRIGGER,
+    POSTGRES_DROP_COUNTERS_TRIGGER,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = 'b42e457fd7fa'
+down_revision = 'dd44a903449e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('user_counters',
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('total', sa.BigInteger(), nullable=False),
+    sa.Column('active', sa.BigInteger(), nullable=False),
+    sa.Column('validated', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('shard')
+    )
+    create_function, *create_triggers = POSTGRES_COUNTERS_TRIGGER
+    op.execute(create_function)
+    # Blocks writes to users while the counters are seeded, so none is missed
+    op.execute("LOCK TABLE users IN SHARE MODE")
+    op.execute("""
+    INSERT INTO user_counters (shard, total, active, validated)
+    SELECT 0, count(*), count(*) FILTER (WHERE active), count(*) FILTER (WHERE validated) FROM users
+    """)
+    op.execute(f"""
+    INSERT INTO user_counters (shard, total, active, validated)
+    SELECT shard, 0, 0, 0 FROM generate_series(1, {COUNTER_SHARDS - 1}) AS shard
+    """)
+    for statement in create_triggers:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for statement in POSTGRES_DROP_COUNTERS_TRIGGER:
+        op.execute(statement)
+    op.drop_table('user_counters')
@@ -0,0 +1,110 @@
+"""Module with a connection pool that measures how long requests wait for a connection
+
+The pool is the :class:`AsyncAdaptedQueuePool` used by default for asyncio
+engines. It also records the time taken by every checkout, which includes
+opening a new connection when the pool has room for it, in a histogram.
+"""
+import bisect
+import time
+from typing import Sequence
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Upper bounds of the buckets of the histogram in seconds, the last bucket has no bound
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Counts durations in buckets, like Prometheus histograms the counts are cumulative when reported
+
+    :param buckets: upper bounds of the buckets in seconds, sorted
+    :type buckets: Sequence[float]
+    """
+
+    def __init__(self, buckets: Sequence[float] = CHECKOUT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Returns the upper bound of the bucket of the quantile, `inf` if it is in the last one"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else f"{bound:g}"] = cumulative
+        return {
+            "count": self.count,
+            "avg_seconds": self.total / self.count if self.count else 0.0,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class PoolMetrics:
+    """Counters and timings of the checkouts of an :class:`InstrumentedAsyncQueuePool`"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.checkout_wait = Histogram()
+
+    def snapshot(self) -> dict:
+        return {"checkouts": self.checkouts, "timeouts": self.timeouts,
+                "checkout_wait": self.checkout_wait.snapshot()}
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool for asyncio engines that records its checkouts in :attr:`metrics`"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.checkout_wait.record(time.perf_counter() - started)
+        self.metrics.checkouts += 1
+        return connection
+
+    def recreate(self) -> "InstrumentedAsyncQueuePool":
+        # The engine recreates its pool when it is disposed, the metrics are kept
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def snapshot(self) -> dict:
+        """Returns the connections of the pool and the metrics of the checkouts"""
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            # The overflow is negative while the pool has not opened `size` connections
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            **self.metrics.snapshot(),
+        }
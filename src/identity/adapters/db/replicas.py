@@ -0,0 +1,195 @@
+"""Module that routes read-only units of work to the replicas of the database
+
+Reads are spread over the replicas round robin, or sent to the replica with
+fewer sessions open. A connection is checked out when the session is opened,
+so a replica that cannot be reached is found before the first query. It is
+then skipped for `retry_seconds` and its reads go to another replica or to the
+primary.
+
+Replicas lag behind the primary. After a worker changes a user it reads that
+user, and the listings, from the primary for `read_your_writes_seconds`, so
+the client that made the change sees it. Other workers may serve the previous
+state until the replicas catch up.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Tuple, Union
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+REPLICA_SELECTIONS = ("round_robin", "least_loaded")
+
+
+class Replica:
+    """A replica of the database and its counters
+
+    :param name: name of the replica in the metrics, e.g. its host
+    :type name: str
+    :param session_factory: callable that returns a new `AsyncSession` bound to the replica
+    :type session_factory: class:`sqlalchemy.ext.asyncio.async_sessionmaker`
+    """
+
+    def __init__(self, name: str, session_factory):
+        self.name = name
+        self.session_factory = session_factory
+        self.in_use = 0
+        self.reads = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    def snapshot(self, now: float) -> dict:
+        return {"name": self.name, "healthy": self.unhealthy_until <= now, "in_use": self.in_use,
+                "reads": self.reads, "failures": self.failures}
+
+
+class ReplicaStats:
+    """Counters of a :class:`ReplicaRouter`
+
+    :param pinned_reads: reads sent to the primary to see a change of the worker
+    :type pinned_reads: int
+    :param fallback_reads: reads sent to the primary because no replica could be used
+    :type fallback_reads: int
+    """
+
+    def __init__(self):
+        self.pinned_reads = 0
+        self.fallback_reads = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class ReplicaRouter:
+    """Chooses the replica of each read-only unit of work, it is meant to be used from a single event loop
+
+    :param replicas: replicas of the database
+    :type replicas: List[Replica]
+    :param selection: `round_robin` or `least_loaded`, defaults to `round_robin`
+    :type selection: str, optional
+    :param retry_seconds: seconds a replica that failed is skipped
+    :type retry_seconds: float
+    :param read_your_writes_seconds: seconds the reads of a changed user run on the primary
+    :type read_your_writes_seconds: float
+    :param max_pinned: maximum number of users pinned at once, beyond it every read is pinned
+    :type max_pinned: int
+    :param clock: function returning the current time in seconds
+    :type clock: Callable[[], float]
+    :raises ValueError: if the selection is unknown
+    """
+
+    def __init__(self, replicas: List[Replica], selection: str = "round_robin", retry_seconds: float = 5.0,
+                 read_your_writes_seconds: float = 2.0, max_pinned: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        if selection not in REPLICA_SELECTIONS:
+            raise ValueError(f"Unknown replica selection {selection!r}, use one of {REPLICA_SELECTIONS}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.retry_seconds = retry_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.max_pinned = max_pinned
+        self.clock = clock
+        self.stats = ReplicaStats()
+        self._next = 0
+        # Pins expire in the order they are made, the oldest ones are first
+        self._pinned: OrderedDict = OrderedDict()
+        self._changed_until = 0.0
+        self._all_pinned_until = 0.0
+
+    def pin(self, keys: Iterable[str]):
+        """Sends the reads of the given users, and the listings, to the primary for a while
+
+        :param keys: emails of the users changed
+        :type keys: Iterable[str]
+        """
+        now = self.clock()
+        until = now + self.read_your_writes_seconds
+        for key in keys:
+            self._pinned[key] = until
+            self._pinned.move_to_end(key)
+            self._changed_until = until
+        while self._pinned:
+            key, oldest = next(iter(self._pinned.items()))
+            if oldest > now and len(self._pinned) <= self.max_pinned:
+                break
+            if oldest > now:
+                # Forgetting a pin early could serve a stale user, everything is pinned instead
+                self._all_pinned_until = oldest
+            del self._pinned[key]
+
+    def is_pinned(self, key: Union[str, None] = None) -> bool:
+        """Checks if the reads of a user, or the listings if there is no key, must run on the primary"""
+        now = self.clock()
+        if now < self._all_pinned_until:
+            return True
+        if key is None:
+            return now < self._changed_until
+        until = self._pinned.get(key)
+        return until is not None and now < until
+
+    def candidates(self, key: Union[str, None] = None) -> List[Replica]:
+        """Returns the healthy replicas in the order they should be tried, none if the primary must be used
+
+        :param key: email of the user read, `None` for listings
+        :type key: Union[str, None]
+        :return: the replicas
+        :rtype: List[Replica]
+        """
+        if not self.replicas:
+            return []
+        if self.is_pinned(key):
+            self.stats.pinned_reads += 1
+            return []
+        now = self.clock()
+        start = self._next
+        self._next = (start + 1) % len(self.replicas)
+        # Rotating the replicas also spreads the reads of least loaded replicas with the same load
+        rotated = self.replicas[start:] + self.replicas[:start]
+        healthy = [replica for replica in rotated if replica.unhealthy_until <= now]
+        if self.selection == "least_loaded":
+            healthy.sort(key=lambda replica: replica.in_use)
+        if not healthy:
+            self.stats.fallback_reads += 1
+        return healthy
+
+    def mark_unhealthy(self, replica: Replica):
+        replica.failures += 1
+        replica.unhealthy_until = self.clock() + self.retry_seconds
+
+    async def connect(self, key: Union[str, None] = None) -> Union[Tuple[Replica, AsyncSession], None]:
+        """Opens a session on a replica, it must be given back with :func:`release`
+
+        :param key: email of the user read, `None` for listings
+        :type key: Union[str, None]
+        :return: the replica and the session, `None` if the read must run on the primary
+        :rtype: Union[Tuple[Replica, AsyncSession], None]
+        """
+        candidates = self.candidates(key)
+        for replica in candidates:
+            session = replica.session_factory()
+            try:
+                await session.connection()
+            except (OSError, asyncio.TimeoutError, SQLAlchemyError):
+                await session.close()
+                self.mark_unhealthy(replica)
+                continue
+            replica.in_use += 1
+            replica.reads += 1
+            return replica, session
+        if candidates:
+            self.stats.fallback_reads += 1
+        return None
+
+    def release(self, replica: Replica):
+        """Gives back a replica returned by :func:`connect` once its session is closed"""
+        replica.in_use -= 1
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        return {
+            "selection": self.selection,
+            "pinned": len(self._pinned),
+            **self.stats.snapshot(),
+            "replicas": [replica.snapshot(now) for replica in self.replicas],
+        }
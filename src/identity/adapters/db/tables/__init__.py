@@ -5,3 +5,5 @@ class Base(DeclarativeBase):
     pass
 
 from identity.adapters.db.tables.users import *
+from identity.adapters.db.tables.tokens import *
+from identity.adapters.db.tables.service_accounts import *
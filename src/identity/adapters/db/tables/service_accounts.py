@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from identity.adapters.db.tables import Base
+
+
+class ServiceAccount(Base):
+    """Accounts of machine clients, their secrets are stored as a keyed HMAC"""
+    __tablename__ = "service_accounts"
+
+    client_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    secret_hash: Mapped[bytes] = mapped_column(LargeBinary(32))
+    scopes: Mapped[str] = mapped_column(String(1024))
+    active: Mapped[bool]
+    created_at: Mapped[datetime]
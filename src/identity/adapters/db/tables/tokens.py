@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import ForeignKey, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from identity.adapters.db.tables import Base
+
+
+class RefreshToken(Base):
+    """Refresh tokens, stored by the SHA-256 digest of the token and never in plain text
+
+    The tokens issued from the same login share a family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    token_hash: Mapped[bytes] = mapped_column(LargeBinary(32), primary_key=True)
+    family_id: Mapped[str] = mapped_column(String(32), index=True)
+    email: Mapped[str] = mapped_column(ForeignKey("users.email", ondelete="CASCADE"), index=True)
+    scopes: Mapped[str] = mapped_column(String(1024))
+    created_at: Mapped[datetime]
+    expires_at: Mapped[datetime]
+    used_at: Mapped[Optional[datetime]]
+    revoked_at: Mapped[Optional[datetime]]
+
+
+class RevokedToken(Base):
+    """Ids (`jti`) of the access tokens revoked before they expire
+
+    Rows are useless once the token has expired and can be deleted.
+    """
+    __tablename__ = "revoked_tokens"
+
+    jti: Mapped[str] = mapped_column(String(64), primary_key=True)
+    revoked_at: Mapped[datetime]
+    expires_at: Mapped[datetime] = mapped_column(index=True)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, DateTime, Table, Column, String
+from sqlalchemy import BigInteger, Boolean, DateTime, DDL, Index, Table, Column, String, event
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
@@ -9,6 +9,10 @@ from identity.domain.users import User
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Supports listing users by cursor, newest updates first
+        Index("ix_users_updated_at_email", "updated_at", "email"),
+    )
 
     email: Mapped[str] = mapped_column(primary_key=True)
     created_at: Mapped[datetime]
@@ -20,3 +24,117 @@ class User(Base):
     def __repr__(self) -> str:
         return f"User(email={self.email!r}, created_at={self.created_at.isoformat()!r}, updated_at={self.updated_at.isoformat()!r}, " \
                 f"active={self.active!r}, validated={self.validated!r}, password={self.password!r})"
+
+
+
+class UserCounters(Base):
+    """Rows with the number of users, kept up to date by triggers on `users`
+
+    The counts are spread over `COUNTER_SHARDS` rows, each change updates one of
+    them at random so concurrent writers seldom wait for the same row lock.
+    The number of users is the sum of all the rows.
+    The triggers run in the same transaction as the statements that change `users`,
+    whichever way the rows are written.
+    """
+    __tablename__ = "user_counters"
+
+    shard: Mapped[int] = mapped_column(primary_key=True)
+    total: Mapped[int] = mapped_column(BigInteger)
+    active: Mapped[int] = mapped_column(BigInteger)
+    validated: Mapped[int] = mapped_column(BigInteger)
+
+
+COUNTER_SHARDS = 16
+
+# Statement triggers with transition tables, a statement that writes many users
+# updates a single counters row, and none if the counts do not change.
+POSTGRES_COUNTERS_TRIGGER = [
+    f"""
+    CREATE OR REPLACE FUNCTION users_counters_trigger() RETURNS trigger AS $$
+    DECLARE
+        total_delta bigint := 0;
+        active_delta bigint := 0;
+        validated_delta bigint := 0;
+        shard_id int := floor(random() * {COUNTER_SHARDS})::int;
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT count(*), count(*) FILTER (WHERE active), count(*) FILTER (WHERE validated)
+            INTO total_delta, active_delta, validated_delta FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            SELECT total_delta - count(*), active_delta - count(*) FILTER (WHERE active),
+                   validated_delta - count(*) FILTER (WHERE validated)
+            INTO total_delta, active_delta, validated_delta FROM old_rows;
+        END IF;
+        IF total_delta <> 0 OR active_delta <> 0 OR validated_delta <> 0 THEN
+            UPDATE user_counters SET total = total + total_delta,
+                                     active = active + active_delta,
+                                     validated = validated + validated_delta
+            WHERE shard = shard_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER users_counters_insert AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_trigger()
+    """,
+    """
+    CREATE TRIGGER users_counters_delete AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_trigger()
+    """,
+    """
+    CREATE TRIGGER users_counters_update AFTER UPDATE ON users REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_trigger()
+    """,
+]
+
+POSTGRES_DROP_COUNTERS_TRIGGER = [
+    "DROP TRIGGER IF EXISTS users_counters_insert ON users",
+    "DROP TRIGGER IF EXISTS users_counters_delete ON users",
+    "DROP TRIGGER IF EXISTS users_counters_update ON users",
+    "DROP FUNCTION IF EXISTS users_counters_trigger()",
+]
+
+# The subquery picks the shard once per row written
+_SQLITE_SHARD = f"(SELECT abs(random()) % {COUNTER_SHARDS})"
+
+SQLITE_COUNTERS_TRIGGER = [
+    f"""
+    CREATE TRIGGER users_counters_insert AFTER INSERT ON users BEGIN
+        UPDATE user_counters SET total = total + 1,
+                                 active = active + NEW.active,
+                                 validated = validated + NEW.validated
+        WHERE shard = {_SQLITE_SHARD};
+    END
+    """,
+    f"""
+    CREATE TRIGGER users_counters_delete AFTER DELETE ON users BEGIN
+        UPDATE user_counters SET total = total - 1,
+                                 active = active - OLD.active,
+                                 validated = validated - OLD.validated
+        WHERE shard = {_SQLITE_SHARD};
+    END
+    """,
+    f"""
+    CREATE TRIGGER users_counters_update AFTER UPDATE OF active, validated ON users BEGIN
+        UPDATE user_counters SET active = active + NEW.active - OLD.active,
+                                 validated = validated + NEW.validated - OLD.validated
+        WHERE shard = {_SQLITE_SHARD};
+    END
+    """,
+]
+
+INSERT_COUNTER_SHARDS = "INSERT INTO user_counters (shard, total, active, validated) VALUES " + ", ".join(
+    f"({shard}, 0, 0, 0)" for shard in range(COUNTER_SHARDS)
+)
+
+for statement in POSTGRES_COUNTERS_TRIGGER:
+    event.listen(User.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_COUNTERS_TRIGGER:
+    # DDL formats the statement, the modulo is escaped
+    event.listen(User.__table__, "after_create", DDL(statement.replace("%", "%%")).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "after_drop",
+             DDL("DROP FUNCTION IF EXISTS users_counters_trigger()").execute_if(dialect="postgresql"))
+event.listen(UserCounters.__table__, "after_create", DDL(INSERT_COUNTER_SHARDS))
@@ -0,0 +1,166 @@
+"""Module with readers of files of users to be imported
+
+Readers yield the email and the plain text password of each row, `None` for the
+values that are missing or cannot be read, so that the service layer reports the
+row instead of failing the whole import.
+
+The files are parsed one line at a time, so a request body is read as it is
+received, see :func:`stream_users`, instead of being held in memory.
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+UserRow = Tuple[Union[str, None], Union[str, None]]
+
+CSV_MEDIA_TYPE = "text/csv"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _text(value) -> Union[str, None]:
+    return value if isinstance(value, str) else None
+
+
+def _email_of(record: dict) -> Union[str, None]:
+    return _text(record.get("email") or record.get("username"))
+
+
+class UsersCsvParser:
+    """Parses a CSV with a header containing `email` (or `username`) and `password` columns
+
+    Lines are fed one at a time. A quoted value may span several lines, the record
+    is parsed once its quotes are balanced.
+    """
+
+    def __init__(self):
+        self._header: Union[List[str], None] = None
+        self._record: List[str] = []
+        self._quotes = 0
+
+    def feed(self, line: str) -> Iterator[UserRow]:
+        self._record.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2 == 0:
+            yield from self._parse()
+
+    def close(self) -> Iterator[UserRow]:
+        if self._record:
+            yield from self._parse()
+
+    def _parse(self) -> Iterator[UserRow]:
+        record, self._record, self._quotes = self._record, [], 0
+        values = next(csv.reader(record), None)
+        if not values:
+            return
+        if self._header is None:
+            self._header = values
+            return
+        fields = dict(zip(self._header, values))
+        yield _email_of(fields), _text(fields.get("password"))
+
+
+class UsersNdjsonParser:
+    """Parses one JSON object per line with `email` (or `username`) and `password` keys.
+
+    Blank lines are skipped.
+    """
+
+    def feed(self, line: str) -> Iterator[UserRow]:
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, None
+            return
+        if not isinstance(record, dict):
+            yield None, None
+            return
+        yield _email_of(record), _text(record.get("password"))
+
+    def close(self) -> Iterator[UserRow]:
+        return iter(())
+
+
+def read_users_csv(lines: Iterable[str]) -> Iterator[UserRow]:
+    """Reads a CSV with a header containing `email` (or `username`) and `password` columns
+
+    :param lines: lines of the file
+    :type lines: Iterable[str]
+    :return: email and password of each row
+    :rtype: Iterator[UserRow]
+    """
+    parser = UsersCsvParser()
+    for line in lines:
+        yield from parser.feed(line)
+    yield from parser.close()
+
+
+def read_users_ndjson(lines: Iterable[str]) -> Iterator[UserRow]:
+    """Reads one JSON object per line with `email` (or `username`) and `password` keys.
+
+    Blank lines are skipped.
+
+    :param lines: lines of the file
+    :type lines: Iterable[str]
+    :return: email and password of each row
+    :rtype: Iterator[UserRow]
+    """
+    parser = UsersNdjsonParser()
+    for line in lines:
+        yield from parser.feed(line)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """Splits a stream of bytes into lines, line endings are kept
+
+    A line, or a character, may be split across chunks.
+
+    :param chunks: bytes of the file as they are received
+    :type chunks: AsyncIterable[bytes]
+    :param encoding: encoding of the file, defaults to `utf-8`
+    :type encoding: str, optional
+    :return: lines of the file
+    :rtype: AsyncIterator[str]
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).splitlines(keepends=True)
+        # The last line goes on in the next chunk, a `\r` may be followed by its `\n`
+        pending = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def stream_users(parser: Union[UsersCsvParser, UsersNdjsonParser],
+                       chunks: AsyncIterable[bytes]) -> AsyncIterator[UserRow]:
+    """Reads the users of a file as its bytes are received
+
+    :param parser: parser of the format of the file, e.g. `UsersCsvParser()`
+    :type parser: Union[UsersCsvParser, UsersNdjsonParser]
+    :param chunks: bytes of the file, e.g. `request.stream()`
+    :type chunks: AsyncIterable[bytes]
+    :return: email and password of each row
+    :rtype: AsyncIterator[UserRow]
+    """
+    async for line in iter_lines(chunks):
+        for row in parser.feed(line):
+            yield row
+    for row in parser.close():
+        yield row
+
+
+READERS = {
+    CSV_MEDIA_TYPE: read_users_csv,
+    NDJSON_MEDIA_TYPE: read_users_ndjson,
+}
+
+PARSERS: Dict[str, Callable[[], Union[UsersCsvParser, UsersNdjsonParser]]] = {
+    CSV_MEDIA_TYPE: UsersCsvParser,
+    NDJSON_MEDIA_TYPE: UsersNdjsonParser,
+}
@@ -0,0 +1,94 @@
+"""Module that contains classes for managing serialization of service accounts"""
+
+import abc
+from typing import Any, Mapping, Union
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from identity.domain.service_accounts import ServiceAccount
+from identity.adapters.db.tables import service_accounts as db_service_accounts
+
+
+def _account_from_row(row: Mapping[str, Any]) -> ServiceAccount:
+    return ServiceAccount(**{**row, "scopes": row["scopes"].split()})
+
+
+class ServiceAccountsAbstractRepository(abc.ABC):
+    """Abstract class that provides methods for managing service accounts"""
+
+    @abc.abstractmethod
+    async def add(self, account: ServiceAccount) -> Union[ServiceAccount, None]:
+        """Stores a new service account
+
+        :param account: service account to be added
+        :type account: ServiceAccount
+        :return: the account added, `None` if there is already an account with the same client id
+        :rtype: Union[ServiceAccount, None]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get(self, client_id: str) -> Union[ServiceAccount, None]:
+        """Gets a service account by the id of its client
+
+        :param client_id: id of the client
+        :type client_id: str
+        :return: the account or `None` if it does not exist
+        :rtype: Union[ServiceAccount, None]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def update_active(self, client_id: str, active: bool) -> Union[ServiceAccount, None]:
+        """Enables or disables a service account
+
+        :param client_id: id of the client
+        :type client_id: str
+        :param active: new state of the account
+        :type active: bool
+        :return: the account changed or `None` if it does not exist
+        :rtype: Union[ServiceAccount, None]
+        """
+        pass
+
+
+class ServiceAccountsSqlAlchemyRepository(ServiceAccountsAbstractRepository):
+    """Repository for managing service accounts in a database using sqlalchemy
+
+    :param session: database session
+    :type session: class:`sqlalchemy.ext.asyncio.AsyncSession`
+    """
+    def __init__(self, session):
+        self.session = session
+
+    def _insert(self):
+        if self.session.bind.dialect.name == "postgresql":
+            return postgresql.insert(db_service_accounts.ServiceAccount)
+        return sqlite.insert(db_service_accounts.ServiceAccount)
+
+    async def add(self, account: ServiceAccount) -> Union[ServiceAccount, None]:
+        stmt = (self._insert()
+                .values(client_id=account.client_id, secret_hash=account.secret_hash,
+                        scopes=" ".join(account.scopes), active=account.active, created_at=account.created_at)
+                .on_conflict_do_nothing(index_elements=[db_service_accounts.ServiceAccount.client_id])
+                .returning(*db_service_accounts.ServiceAccount.__table__.c))
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return _account_from_row(row)
+
+    async def get(self, client_id: str) -> Union[ServiceAccount, None]:
+        stmt = (select(*db_service_accounts.ServiceAccount.__table__.c)
+                .where(db_service_accounts.ServiceAccount.client_id == client_id))
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return _account_from_row(row)
+
+    async def update_active(self, client_id: str, active: bool) -> Union[ServiceAccount, None]:
+        stmt = (update(db_service_accounts.ServiceAccount)
+                .where(db_service_accounts.ServiceAccount.client_id == client_id)
+                .values(active=active)
+                .returning(*db_service_accounts.ServiceAccount.__table__.c)
+                .execution_options(synchronize_session=False))
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return _account_from_row(row)
@@ -0,0 +1,232 @@
+"""Module that contains classes for managing serialization of refresh tokens"""
+
+import abc
+from datetime import datetime
+from typing import Any, List, Mapping, Union
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from identity.domain.tokens import RefreshToken
+from identity.adapters.db.tables import tokens as db_tokens
+
+
+def _token_from_row(row: Mapping[str, Any]) -> RefreshToken:
+    return RefreshToken(**{**row, "scopes": row["scopes"].split()})
+
+
+class RefreshTokensAbstractRepository(abc.ABC):
+    """Abstract class that provides methods for managing refresh tokens"""
+
+    @abc.abstractmethod
+    async def add(self, token: RefreshToken):
+        """Stores a new refresh token
+
+        :param token: refresh token to be added
+        :type token: RefreshToken
+        """
+        pass
+
+    @abc.abstractmethod
+    async def use(self, token_hash: bytes, now: datetime) -> Union[RefreshToken, None]:
+        """Marks a token as used if it has not been used, revoked or expired
+
+        :param token_hash: digest of the token
+        :type token_hash: bytes
+        :param now: utc datetime of the use
+        :type now: datetime
+        :return: the token or `None` if it cannot be used
+        :rtype: Union[RefreshToken, None]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get(self, token_hash: bytes) -> Union[RefreshToken, None]:
+        """Gets a token by its digest
+
+        :param token_hash: digest of the token
+        :type token_hash: bytes
+        :return: the token or `None` if it does not exist
+        :rtype: Union[RefreshToken, None]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def revoke_family(self, family_id: str, now: datetime) -> int:
+        """Revokes all the tokens of a family
+
+        :param family_id: id of the family
+        :type family_id: str
+        :param now: utc datetime of the revocation
+        :type now: datetime
+        :return: number of tokens revoked
+        :rtype: int
+        """
+        pass
+
+
+class RefreshTokensSqlAlchemyRepository(RefreshTokensAbstractRepository):
+    """Repository for managing refresh tokens in a database using sqlalchemy
+
+    :param session: database session
+    :type session: class:`sqlalchemy.ext.asyncio.AsyncSession`
+    """
+    def __init__(self, session):
+        self.session = session
+
+    async def add(self, token: RefreshToken):
+        await self.session.execute(insert(db_tokens.RefreshToken).values(
+            token_hash=token.token_hash, family_id=token.family_id, email=token.email,
+            scopes=" ".join(token.scopes), created_at=token.created_at, expires_at=token.expires_at,
+            used_at=token.used_at, revoked_at=token.revoked_at,
+        ))
+
+    async def use(self, token_hash: bytes, now: datetime) -> Union[RefreshToken, None]:
+        # A single UPDATE ... RETURNING by primary key, concurrent uses of a token cannot both succeed
+        stmt = (update(db_tokens.RefreshToken)
+                .where(db_tokens.RefreshToken.token_hash == token_hash,
+                       db_tokens.RefreshToken.used_at.is_(None),
+                       db_tokens.RefreshToken.revoked_at.is_(None),
+                       db_tokens.RefreshToken.expires_at > now)
+                .values(used_at=now)
+                .returning(*db_tokens.RefreshToken.__table__.c)
+                .execution_options(synchronize_session=False))
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return _token_from_row(row)
+
+    async def get(self, token_hash: bytes) -> Union[RefreshToken, None]:
+        stmt = select(*db_tokens.RefreshToken.__table__.c).where(db_tokens.RefreshToken.token_hash == token_hash)
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return _token_from_row(row)
+
+    async def revoke_family(self, family_id: str, now: datetime) -> int:
+        stmt = (update(db_tokens.RefreshToken)
+                .where(db_tokens.RefreshToken.family_id == family_id, db_tokens.RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=now)
+                .execution_options(synchronize_session=False))
+        return (await self.session.execute(stmt)).rowcount
+
+
+class RevokedTokensAbstractRepository(abc.ABC):
+    """Abstract class that provides methods for managing the ids of revoked access tokens"""
+
+    @abc.abstractmethod
+    async def add(self, jti: str, expires_at: datetime, now: datetime):
+        """Revokes an access token, revoking it again does nothing
+
+        :param jti: id of the token
+        :type jti: str
+        :param expires_at: utc datetime when the token expires
+        :type expires_at: datetime
+        :param now: utc datetime of the revocation
+        :type now: datetime
+        """
+        pass
+
+    @abc.abstractmethod
+    async def add_many(self, jtis: List[str], expires_at: datetime, now: datetime):
+        """Revokes many ids at once, those already revoked keep the latest expiry
+
+        :param jtis: ids of the tokens
+        :type jtis: List[str]
+        :param expires_at: utc datetime when the revocations can be forgotten
+        :type expires_at: datetime
+        :param now: utc datetime of the revocation
+        :type now: datetime
+        """
+        pass
+
+    @abc.abstractmethod
+    async def is_revoked(self, jti: str) -> bool:
+        """Checks if an access token has been revoked
+
+        :param jti: id of the token
+        :type jti: str
+        :return: `True` if it has been revoked
+        :rtype: bool
+        """
+        pass
+
+    @abc.abstractmethod
+    async def list_unexpired(self, now: datetime) -> List[str]:
+        """Lists the ids of the revoked tokens that have not expired yet
+
+        :param now: utc datetime
+        :type now: datetime
+        :return: ids of the tokens
+        :rtype: List[str]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def list_revoked_since(self, since: datetime, now: datetime) -> List[str]:
+        """Lists the ids revoked, or revoked again, after a time that have not expired yet
+
+        :param since: utc datetime
+        :type since: datetime
+        :param now: utc datetime
+        :type now: datetime
+        :return: ids of the tokens
+        :rtype: List[str]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def delete_expired(self, now: datetime) -> int:
+        """Forgets the revoked tokens that have expired
+
+        :param now: utc datetime
+        :type now: datetime
+        :return: number of tokens deleted
+        :rtype: int
+        """
+        pass
+
+
+class RevokedTokensSqlAlchemyRepository(RevokedTokensAbstractRepository):
+    """Repository for managing revoked access tokens in a database using sqlalchemy
+
+    :param session: database session
+    :type session: class:`sqlalchemy.ext.asyncio.AsyncSession`
+    """
+    def __init__(self, session):
+        self.session = session
+
+    def _insert(self):
+        if self.session.bind.dialect.name == "postgresql":
+            return postgresql.insert(db_tokens.RevokedToken)
+        return sqlite.insert(db_tokens.RevokedToken)
+
+    async def add(self, jti: str, expires_at: datetime, now: datetime):
+        stmt = (self._insert()
+                .values(jti=jti, expires_at=expires_at, revoked_at=now)
+                .on_conflict_do_nothing(index_elements=[db_tokens.RevokedToken.jti]))
+        await self.session.execute(stmt)
+
+    async def add_many(self, jtis: List[str], expires_at: datetime, now: datetime):
+        if not jtis:
+            return
+        stmt = self._insert().values([{"jti": jti, "expires_at": expires_at, "revoked_at": now} for jti in jtis])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[db_tokens.RevokedToken.jti],
+            set_={"expires_at": stmt.excluded.expires_at, "revoked_at": stmt.excluded.revoked_at},
+        )
+        await self.session.execute(stmt)
+
+    async def is_revoked(self, jti: str) -> bool:
+        stmt = select(db_tokens.RevokedToken.jti).where(db_tokens.RevokedToken.jti == jti)
+        return (await self.session.execute(stmt)).first() is not None
+
+    async def list_unexpired(self, now: datetime) -> List[str]:
+        stmt = select(db_tokens.RevokedToken.jti).where(db_tokens.RevokedToken.expires_at > now)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def list_revoked_since(self, since: datetime, now: datetime) -> List[str]:
+        stmt = (select(db_tokens.RevokedToken.jti)
+                .where(db_tokens.RevokedToken.revoked_at >= since, db_tokens.RevokedToken.expires_at > now))
+        return list((await self.session.scalars(stmt)).all())
+
+    async def delete_expired(self, now: datetime) -> int:
+        stmt = delete(db_tokens.RevokedToken).where(db_tokens.RevokedToken.expires_at <= now)
+        return (await self.session.execute(stmt)).rowcount
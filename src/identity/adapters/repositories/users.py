@@ -1,26 +1,44 @@
 """Module that contains classes for managing serialization of users"""
 
 import abc
-from typing import List, Union
-from pydantic import parse_obj_as
-from sqlalchemy import select, func
+from dataclasses import asdict, replace
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, List, Mapping, Set, Tuple, Union
+from sqlalchemy import func, select, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 
-from identity.domain.users import User
-from identity.domain.pagination import Page
+from identity.domain.users import USER_FIELDS, User, UserFilter, UserProfile, UserStats
+from identity.domain.utils import utcnow
+from identity.domain.pagination import Page, encode_cursor
+from identity.adapters.cache import LRUCache
 from identity.adapters.db.tables import users as db_users
 
 
+# Columns returned by listings and lookups, the password hash is only read to authenticate
+PROFILE_COLUMNS = [column for column in db_users.User.__table__.c if column.name != "password"]
+
+
+def user_from_row(row: Mapping[str, Any]) -> User:
+    """Maps a database row to a user"""
+    return User(**row)
+
+
+def profile_from_row(row: Mapping[str, Any]) -> UserProfile:
+    """Maps a database row of the :data:`PROFILE_COLUMNS` to the profile of a user"""
+    return UserProfile(**row)
+
+
 class UsersAbstractRepository(abc.ABC):
     """Abstract class that provides methods for managing users"""
 
     @abc.abstractmethod
-    async def add_user(self, user: User) -> User:
-        """Adds a new user
+    async def add_user(self, user: User) -> Union[User, None]:
+        """Adds a new user if there is no user with the same email
 
         :param user: user entity to be added
         :type user: User
-        :return: the user added
-        :rtype: User
+        :return: the user added or `None` if the email is already registered
+        :rtype: Union[User, None]
         """
         pass
 
@@ -35,6 +53,88 @@ class UsersAbstractRepository(abc.ABC):
         """
         pass
 
+    @abc.abstractmethod
+    async def update_password(self, email: str, old_password: str, new_password: str) -> bool:
+        """Replaces the password hash of a user if it has not changed since it was read
+
+        Nothing else is written, not even the last update time, so a stale copy of
+        the user cannot undo the changes made meanwhile.
+
+        :param email: email address of the user
+        :type email: str
+        :param old_password: hashed password read
+        :type old_password: str
+        :param new_password: new hashed password
+        :type new_password: str
+        :return: `True` if it was replaced
+        :rtype: bool
+        """
+        pass
+
+    @abc.abstractmethod
+    async def bulk_add_users(self, users: List[User]) -> Set[str]:
+        """Adds many users at once skipping the emails already registered
+
+        :param users: user entities to be added, their emails must be different.
+        :type users: List[User]
+        :return: the emails of the users that already existed and were not added
+        :rtype: Set[str]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def update_user_status(self, email: str, active: Union[bool, None] = None,
+                                 validated: Union[bool, None] = None) -> Union[User, None]:
+        """Changes the state of a user without reading it first and sets its last update time
+
+        :param email: email address of the user
+        :type email: str
+        :param active: new value of `active`, `None` keeps the current one
+        :type active: Union[bool, None]
+        :param validated: new value of `validated`, `None` keeps the current one
+        :type validated: Union[bool, None]
+        :return: the updated user or `None` if it does not exist
+        :rtype: Union[User, None]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def update_users_status(self, emails: List[str], active: Union[bool, None] = None,
+                                  validated: Union[bool, None] = None) -> List[User]:
+        """Changes the state of many users at once and sets their last update time
+
+        :param emails: email addresses of the users
+        :type emails: List[str]
+        :param active: new value of `active`, `None` keeps the current one
+        :type active: Union[bool, None]
+        :param validated: new value of `validated`, `None` keeps the current one
+        :type validated: Union[bool, None]
+        :return: the updated users, emails that do not exist are skipped
+        :rtype: List[User]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def update_filtered_users_status(self, user_filter: UserFilter, limit: int,
+                                           active: Union[bool, None] = None,
+                                           validated: Union[bool, None] = None) -> List[User]:
+        """Changes the state of up to `limit` users selected by a filter that are not in the new state yet
+
+        Calling it until it returns less than `limit` users changes all of them.
+
+        :param user_filter: criteria to select the users
+        :type user_filter: UserFilter
+        :param limit: maximum number of users changed
+        :type limit: int
+        :param active: new value of `active`, `None` keeps the current one
+        :type active: Union[bool, None]
+        :param validated: new value of `validated`, `None` keeps the current one
+        :type validated: Union[bool, None]
+        :return: the updated users
+        :rtype: List[User]
+        """
+        pass
+
     @abc.abstractmethod
     async def get_user(self, email: str) -> User:
         """Gets a user by email
@@ -47,56 +147,392 @@ class UsersAbstractRepository(abc.ABC):
         pass
 
     @abc.abstractmethod
-    async def list_users(self) -> List[User]:
+    async def get_users(self, emails: List[str]) -> List[UserProfile]:
+        """Gets many users by email at once
+
+        :param emails: email addresses of the users
+        :type emails: List[str]
+        :return: the profiles of the users found, in no particular order.
+                 Emails that do not exist are skipped.
+        :rtype: List[UserProfile]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def list_users(self) -> List[UserProfile]:
         """List all users
 
-        :return: a list with all users stored
-        :rtype: List[User]
+        :return: a list with the profiles of all users stored
+        :rtype: List[UserProfile]
         """
         pass
 
     @abc.abstractmethod
-    async def list_paginated_users(page: int, page_size: int) -> Page[User]:
+    def stream_users(self, batch_size: int) -> AsyncIterator[UserProfile]:
+        """Iterates over all users, most recently updated first.
+
+        Users are fetched from the storage in batches, so memory does not grow
+        with the number of users.
+
+        :param batch_size: number of users fetched at once
+        :type batch_size: int
+        :return: an async iterator of the profiles of the users
+        :rtype: AsyncIterator[UserProfile]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def list_paginated_users(self, page: int, page_size: int) -> Page[UserProfile]:
         """Gets users by chunks
 
         :param page: number of page, min valid value is 1.
         :type page: int
         :param page_size: Number of users per page, min valid value is 1.
         :type page_size: int
-        :return: a Page object that contains a list of users
-        :rtype: Page[User]
+        :return: a Page object that contains the profiles of the users
+        :rtype: Page[UserProfile]
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_user_stats(self) -> UserStats:
+        """Gets the number of users without scanning them
+
+        :return: the number of users, active users and validated users
+        :rtype: UserStats
+        """
+        pass
+
+    @abc.abstractmethod
+    async def list_users_by_cursor(self, after: Union[Tuple[datetime, str], None],
+                                   page_size: int) -> Page[UserProfile]:
+        """Gets the users that follow a position of the listing, newest updates first.
+
+        The cost does not depend on how deep the page is and the total is not computed.
+
+        :param after: `updated_at` and `email` of the last user of the previous page,
+                      `None` for the first page.
+        :type after: Union[Tuple[datetime, str], None]
+        :param page_size: Number of users per page, min valid value is 1.
+        :type page_size: int
+        :return: a Page object with the profiles of the users and the cursor of the next page
+        :rtype: Page[UserProfile]
         """
         pass
 
 
 class UsersSqlAlchemyRepository(UsersAbstractRepository):
-    """Repository for managing users in a database using sqlalchemy"""
-    def __init__(self, session):
+    """Repository for managing users in a database using sqlalchemy
+
+    The number of users is the sum of the `user_counters` rows maintained by triggers.
+
+    :param session: database session
+    :type session: class:`sqlalchemy.ext.asyncio.AsyncSession`
+    :param approximate_counts: on Postgres, the total of paginated listings is estimated
+                               from the table statistics instead of the counters row.
+    :type approximate_counts: bool
+
+    The emails of the users written through the repository are kept in `changed`.
+    """
+    def __init__(self, session, approximate_counts: bool = False):
         self.session = session
+        self.approximate_counts = approximate_counts
+        self.changed = set()
 
-    async def add_user(self, user: User) -> User:
-        db_user = db_users.User(**user.dict())
-        self.session.add(db_user)
-        return User.from_orm(db_user)
+    def _insert(self):
+        if self.session.bind.dialect.name == "postgresql":
+            return postgresql.insert(db_users.User)
+        return sqlite.insert(db_users.User)
+
+    async def add_user(self, user: User) -> Union[User, None]:
+        self.changed.add(user.email)
+        # A single INSERT ... ON CONFLICT DO NOTHING RETURNING, no previous read and no race
+        stmt = (self._insert()
+                .values(**asdict(user))
+                .on_conflict_do_nothing(index_elements=[db_users.User.email])
+                .returning(*db_users.User.__table__.c))
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return user_from_row(row)
+
+    async def bulk_add_users(self, users: List[User]) -> Set[str]:
+        if not users:
+            return set()
+        self.changed.update(user.email for user in users)
+        if self.session.bind.dialect.name == "postgresql":
+            added = await self._copy_users(users)
+        else:
+            stmt = (self._insert()
+                    .values([asdict(user) for user in users])
+                    .on_conflict_do_nothing(index_elements=[db_users.User.email])
+                    .returning(db_users.User.email))
+            added = set((await self.session.scalars(stmt)).all())
+        return {user.email for user in users} - added
+
+    async def _copy_users(self, users: List[User]) -> Set[str]:
+        """Loads the users with COPY into a temporary table and moves the new ones to `users`"""
+        columns = [column.name for column in db_users.User.__table__.c]
+        column_list = ", ".join(columns)
+        connection = await self.session.connection()
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        await driver_connection.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS users_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        await driver_connection.copy_records_to_table(
+            "users_import",
+            records=[tuple(getattr(user, column) for column in columns) for user in users],
+            columns=columns,
+        )
+        rows = await driver_connection.fetch(
+            f"INSERT INTO users ({column_list}) SELECT {column_list} FROM users_import "
+            "ON CONFLICT (email) DO NOTHING RETURNING email"
+        )
+        await driver_connection.execute("TRUNCATE users_import")
+        return {row["email"] for row in rows}
+
+    def _update_status(self, active: Union[bool, None], validated: Union[bool, None]):
+        values = {"updated_at": utcnow()}
+        if active is not None:
+            values["active"] = active
+        if validated is not None:
+            values["validated"] = validated
+        return (update(db_users.User)
+                .values(**values)
+                .returning(*db_users.User.__table__.c)
+                .execution_options(synchronize_session=False))
+
+    async def update_user_status(self, email: str, active: Union[bool, None] = None,
+                                 validated: Union[bool, None] = None) -> Union[User, None]:
+        self.changed.add(email)
+        stmt = self._update_status(active, validated).where(db_users.User.email == email)
+        row = (await self.session.execute(stmt)).mappings().first()
+        if row is not None:
+            return user_from_row(row)
+
+    async def update_users_status(self, emails: List[str], active: Union[bool, None] = None,
+                                  validated: Union[bool, None] = None) -> List[User]:
+        if not emails:
+            return []
+        self.changed.update(emails)
+        stmt = self._update_status(active, validated).where(db_users.User.email.in_(emails))
+        return [user_from_row(row) for row in (await self.session.execute(stmt)).mappings()]
+
+    async def update_filtered_users_status(self, user_filter: UserFilter, limit: int,
+                                           active: Union[bool, None] = None,
+                                           validated: Union[bool, None] = None) -> List[User]:
+        selected = select(db_users.User.email)
+        if user_filter.email_domain is not None:
+            selected = selected.where(db_users.User.email.endswith(f"@{user_filter.email_domain}", autoescape=True))
+        if user_filter.active is not None:
+            selected = selected.where(db_users.User.active == user_filter.active)
+        if user_filter.validated is not None:
+            selected = selected.where(db_users.User.validated == user_filter.validated)
+        # Users already in the new state are skipped, so every call makes progress
+        if active is not None:
+            selected = selected.where(db_users.User.active != active)
+        if validated is not None:
+            selected = selected.where(db_users.User.validated != validated)
+        selected = selected.order_by(db_users.User.email).limit(limit)
+        stmt = self._update_status(active, validated).where(db_users.User.email.in_(selected.scalar_subquery()))
+        users = [user_from_row(row) for row in (await self.session.execute(stmt)).mappings()]
+        self.changed.update(user.email for user in users)
+        return users
 
     async def update_user(self, user: User) -> User:
+        self.changed.add(user.email)
         db_user = await self.session.get(db_users.User, user.email)
-        for field_name in user.__fields_set__:
+        for field_name in USER_FIELDS:
             setattr(db_user, field_name, getattr(user, field_name))
         return User.from_orm(db_user)
 
+    async def update_password(self, email: str, old_password: str, new_password: str) -> bool:
+        self.changed.add(email)
+        stmt = (update(db_users.User)
+                .where(db_users.User.email == email, db_users.User.password == old_password)
+                .values(password=new_password)
+                .execution_options(synchronize_session=False))
+        return (await self.session.execute(stmt)).rowcount == 1
+
     async def get_user(self,  email: str) -> Union[User, None]:
         db_user = await self.session.get(db_users.User, email)
         if db_user:
             return User.from_orm(db_user)
 
-    async def list_users(self) -> List[User]:
-        stmt = select(db_users.User).order_by(db_users.User.updated_at.desc())
-        result = await self.session.execute(stmt)
-        return [User.from_orm(db_user[0]) for db_user in result]
+    async def get_users(self, emails: List[str]) -> List[UserProfile]:
+        if not emails:
+            return []
+        stmt = select(*PROFILE_COLUMNS).where(db_users.User.email.in_(emails))
+        return [profile_from_row(row) for row in (await self.session.execute(stmt)).mappings()]
+
+    async def list_users(self) -> List[UserProfile]:
+        stmt = select(*PROFILE_COLUMNS).order_by(db_users.User.updated_at.desc(), db_users.User.email.desc())
+        return [profile_from_row(row) for row in (await self.session.execute(stmt)).mappings()]
 
-    async def list_paginated_users(self, page:int, page_size:int) -> Page[User]:
-        stmt = select(db_users.User).order_by(db_users.User.updated_at.desc())
-        items = (await self.session.execute(stmt.limit(page_size).offset((page - 1) * page_size))).all()
-        total = (await self.session.execute(select(func.count()).select_from(db_users.User))).scalar()
+    async def stream_users(self, batch_size: int) -> AsyncIterator[UserProfile]:
+        stmt = select(*PROFILE_COLUMNS).order_by(db_users.User.updated_at.desc(), db_users.User.email.desc())
+        # Server side cursor, rows are buffered batch_size at a time
+        result = await self.session.stream(stmt.execution_options(yield_per=batch_size))
+        async for row in result.mappings():
+            yield profile_from_row(row)
+
+    async def list_paginated_users(self, page:int, page_size:int) -> Page[UserProfile]:
+        stmt = select(*PROFILE_COLUMNS).order_by(db_users.User.updated_at.desc())
+        rows = (await self.session.execute(stmt.limit(page_size).offset((page - 1) * page_size))).mappings().all()
+        items = [profile_from_row(row) for row in rows]
+        total = await self._count_users()
         return Page(items, page, page_size, total)
+
+    async def _count_users(self) -> int:
+        if self.approximate_counts and self.session.bind.dialect.name == "postgresql":
+            estimate = (await self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass")
+            )).scalar()
+            # reltuples is -1 until the table has been analyzed
+            if estimate is not None and estimate >= 0:
+                return estimate
+        return (await self.get_user_stats()).total
+
+    async def get_user_stats(self) -> UserStats:
+        counters = db_users.UserCounters
+        stmt = select(func.sum(counters.total), func.sum(counters.active), func.sum(counters.validated))
+        total, active, validated = (await self.session.execute(stmt)).one()
+        return UserStats(total=total or 0, active=active or 0, validated=validated or 0)
+
+    async def list_users_by_cursor(self, after: Union[Tuple[datetime, str], None],
+                                   page_size: int) -> Page[UserProfile]:
+        # Uses the index on (updated_at, email), ties of updated_at are sorted by email
+        stmt = select(*PROFILE_COLUMNS).order_by(db_users.User.updated_at.desc(), db_users.User.email.desc())
+        if after is not None:
+            stmt = stmt.where(tuple_(db_users.User.updated_at, db_users.User.email) < tuple_(*after))
+        rows = (await self.session.execute(stmt.limit(page_size + 1))).mappings().all()
+        items = [profile_from_row(row) for row in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = encode_cursor(items[-1].updated_at, items[-1].email)
+        return Page(items, None, page_size, None, next_cursor=next_cursor)
+
+
+class UsersCachedRepository(UsersAbstractRepository):
+    """Repository that keeps the users returned by :func:`get_user` and :func:`get_users` in a cache.
+
+    It wraps another repository that is used when a user is not cached.
+    Concurrent misses of the same email make a single query, the users missing
+    from a :func:`get_users` call are read with a single query too.
+    Users added or updated through this repository are never read from the cache
+    and their entries are invalidated, the unit of work invalidates them again
+    after committing with :func:`invalidate_changes`.
+
+    :param repository: repository that reads and writes the users
+    :type repository: UsersAbstractRepository
+    :param cache: cache of users by email shared by all the repositories
+    :type cache: LRUCache
+    """
+    def __init__(self, repository: UsersAbstractRepository, cache: LRUCache):
+        self.repository = repository
+        self.cache = cache
+        self.changed = set()
+
+    @staticmethod
+    def _profile_key(email: str) -> tuple:
+        # Profiles returned by get_users, get_user needs the whole user
+        return ("profile", email)
+
+    def _invalidate(self, email: str):
+        self.cache.invalidate(email)
+        self.cache.invalidate(self._profile_key(email))
+
+    @staticmethod
+    def invalidate_emails(cache: LRUCache, predicate: Callable[[str], bool]) -> int:
+        """Removes from a cache of users the entries of the emails for which `predicate(email)` is true"""
+        return cache.invalidate_matching(lambda key: predicate(key[1] if isinstance(key, tuple) else key))
+
+    def _changing(self, email: str):
+        self.changed.add(email)
+        self._invalidate(email)
+
+    def invalidate_changes(self):
+        """Removes from the cache the users changed through this repository"""
+        for email in self.changed:
+            self._invalidate(email)
+        self.changed.clear()
+
+    async def add_user(self, user: User) -> Union[User, None]:
+        self._changing(user.email)
+        return await self.repository.add_user(user)
+
+    async def update_user(self, user: User) -> User:
+        self._changing(user.email)
+        return await self.repository.update_user(user)
+
+    async def update_password(self, email: str, old_password: str, new_password: str) -> bool:
+        self._changing(email)
+        return await self.repository.update_password(email, old_password, new_password)
+
+    async def bulk_add_users(self, users: List[User]) -> Set[str]:
+        for user in users:
+            self._changing(user.email)
+        return await self.repository.bulk_add_users(users)
+
+    async def update_user_status(self, email: str, active: Union[bool, None] = None,
+                                 validated: Union[bool, None] = None) -> Union[User, None]:
+        self._changing(email)
+        return await self.repository.update_user_status(email, active=active, validated=validated)
+
+    async def update_users_status(self, emails: List[str], active: Union[bool, None] = None,
+                                  validated: Union[bool, None] = None) -> List[User]:
+        for email in emails:
+            self._changing(email)
+        return await self.repository.update_users_status(emails, active=active, validated=validated)
+
+    async def update_filtered_users_status(self, user_filter: UserFilter, limit: int,
+                                           active: Union[bool, None] = None,
+                                           validated: Union[bool, None] = None) -> List[User]:
+        users = await self.repository.update_filtered_users_status(
+            user_filter, limit, active=active, validated=validated
+        )
+        for user in users:
+            self._changing(user.email)
+        return users
+
+    async def get_user(self, email: str) -> Union[User, None]:
+        if email in self.changed:
+            return await self.repository.get_user(email)
+        user = await self.cache.get_or_load(email, lambda: self.repository.get_user(email))
+        # Callers may modify the user, the cached one must not change
+        return replace(user) if user else None
+
+    async def get_users(self, emails: List[str]) -> List[UserProfile]:
+        profiles = await self.repository.get_users([email for email in emails if email in self.changed])
+        keys = []
+        for email in emails:
+            if email in self.changed:
+                continue
+            # Users cached by get_user are not read again
+            user = self.cache.get(email)
+            if user is not None:
+                profiles.append(user.profile())
+            else:
+                keys.append(self._profile_key(email))
+
+        async def load(keys: List[tuple]) -> dict:
+            found = await self.repository.get_users([email for _, email in keys])
+            return {self._profile_key(profile.email): profile for profile in found}
+
+        cached = await self.cache.get_many_or_load(keys, load)
+        return profiles + [replace(profile) for profile in cached.values()]
+
+    async def list_users(self) -> List[UserProfile]:
+        return await self.repository.list_users()
+
+    def stream_users(self, batch_size: int) -> AsyncIterator[UserProfile]:
+        return self.repository.stream_users(batch_size)
+
+    async def list_paginated_users(self, page: int, page_size: int) -> Page[UserProfile]:
+        return await self.repository.list_paginated_users(page, page_size)
+
+    async def list_users_by_cursor(self, after: Union[Tuple[datetime, str], None],
+                                   page_size: int) -> Page[UserProfile]:
+        return await self.repository.list_users_by_cursor(after, page_size)
+
+    async def get_user_stats(self) -> UserStats:
+        return await self.repository.get_user_stats()
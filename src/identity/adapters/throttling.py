@@ -0,0 +1,148 @@
+"""Module with rate limiters that count attempts by key, e.g. logins by account
+
+A limiter admits `attempts` per `period_seconds` for each key. When an attempt
+is rejected it returns the seconds to wait before trying again.
+
+:class:`ShardedTokenBucket` keeps the counters in the memory of the worker, so
+each worker admits its own share. :class:`RedisFixedWindow` keeps them in Redis
+and is shared by all the workers.
+"""
+import abc
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, List
+
+
+class RateLimiter(abc.ABC):
+    """Base class of the rate limiters
+
+    :param attempts: attempts admitted per period for each key
+    :type attempts: int
+    :param period_seconds: seconds of the period
+    :type period_seconds: float
+    """
+
+    def __init__(self, attempts: int, period_seconds: float):
+        self.attempts = attempts
+        self.period_seconds = period_seconds
+
+    @abc.abstractmethod
+    async def acquire(self, key: str) -> float:
+        """Counts an attempt of the key
+
+        :param key: key of the attempt, e.g. `account:potato@version1.com`
+        :type key: str
+        :return: `0` if the attempt is admitted, otherwise the seconds to wait
+        :rtype: float
+        """
+        pass
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: OrderedDict = OrderedDict()
+
+
+class ShardedTokenBucket(RateLimiter):
+    """Token buckets of the keys kept in memory
+
+    A bucket holds up to `attempts` tokens, every attempt takes one and they
+    are refilled at `attempts / period_seconds` per second. Buckets are split
+    in shards by the hash of their key, each with its own lock, and each shard
+    keeps at most `max_keys_per_shard` buckets, dropping the least recently used.
+    A dropped bucket is full again, which only favours the attempts of that key.
+
+    :param attempts: size of the buckets
+    :type attempts: int
+    :param period_seconds: seconds to refill an empty bucket
+    :type period_seconds: float
+    :param shards: number of shards
+    :type shards: int
+    :param max_keys_per_shard: maximum number of buckets of a shard
+    :type max_keys_per_shard: int
+    :param clock: function returning the current time in seconds
+    :type clock: Callable[[], float]
+    """
+
+    def __init__(self, attempts: int, period_seconds: float, shards: int = 16,
+                 max_keys_per_shard: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        super().__init__(attempts, period_seconds)
+        self.rate = attempts / period_seconds
+        self.max_keys_per_shard = max_keys_per_shard
+        self.clock = clock
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+
+    def __len__(self):
+        return sum(len(shard.buckets) for shard in self._shards)
+
+    def _shard(self, key: str) -> _Shard:
+        # crc32 is stable across workers and cheap
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def take(self, key: str) -> float:
+        """Same as :func:`acquire`, it does not block"""
+        shard = self._shard(key)
+        now = self.clock()
+        with shard.lock:
+            tokens, updated_at = shard.buckets.pop(key, (self.attempts, now))
+            tokens = min(self.attempts, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / self.rate
+            shard.buckets[key] = (tokens, now)
+            if len(shard.buckets) > self.max_keys_per_shard:
+                shard.buckets.popitem(last=False)
+        return retry_after
+
+    async def acquire(self, key: str) -> float:
+        return self.take(key)
+
+
+class RedisFixedWindow(RateLimiter):
+    """Counters of the keys kept in Redis, shared by all the workers
+
+    Attempts are counted in fixed windows of `period_seconds`, with one `INCR`
+    per attempt. The counter of a window expires with it.
+
+    :param client: asyncio Redis client, e.g. `redis.asyncio.Redis`, only `incr` and `expire` are used
+    :type client: Any
+    :param attempts: attempts admitted per window for each key
+    :type attempts: int
+    :param period_seconds: seconds of a window
+    :type period_seconds: float
+    :param prefix: prefix of the Redis keys
+    :type prefix: str
+    :param clock: function returning the current unix time in seconds
+    :type clock: Callable[[], float]
+    """
+
+    def __init__(self, client: Any, attempts: int, period_seconds: float, prefix: str = "throttle",
+                 clock: Callable[[], float] = time.time):
+        super().__init__(attempts, period_seconds)
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    @classmethod
+    def from_url(cls, url: str, attempts: int, period_seconds: float, prefix: str = "throttle") -> "RedisFixedWindow":
+        """Connects to Redis, it needs the `redis` package"""
+        import redis.asyncio
+
+        return cls(redis.asyncio.Redis.from_url(url), attempts, period_seconds, prefix=prefix)
+
+    async def acquire(self, key: str) -> float:
+        now = self.clock()
+        window = int(now // self.period_seconds)
+        redis_key = f"{self.prefix}:{key}:{window}"
+        count = await self.client.incr(redis_key)
+        if count == 1:
+            await self.client.expire(redis_key, max(1, math.ceil(self.period_seconds)))
+        if count <= self.attempts:
+            return 0.0
+        return (window + 1) * self.period_seconds - now
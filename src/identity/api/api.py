@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
-from identity.api.routers import tokens, users
+from identity.api.routers import admin, tokens, users
 
 api_router = APIRouter()
 
 api_router.include_router(tokens.router, prefix="/token", tags=["SignIn"])
-api_router.include_router(users.router, prefix="/users", tags=["Identities"])
\ No newline at end of file
+api_router.include_router(users.router, prefix="/users", tags=["Identities"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
@@ -0,0 +1,83 @@
+"""Address of the clients of the API behind proxies
+
+Behind a load balancer the peer of every request is the balancer. The address
+of the client is taken from the `Forwarded` (RFC 7239) or `X-Forwarded-For`
+headers, but only if the peer is one of the trusted proxies, otherwise any
+client could pick its own address. The addresses are read from the right, the
+first one that is not a trusted proxy is the client.
+"""
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import List, Tuple, Union
+
+from fastapi import Request
+
+from identity import config
+
+Network = Union[IPv4Network, IPv6Network]
+
+
+@lru_cache
+def _networks(proxies: Tuple[str, ...]) -> Tuple[Network, ...]:
+    return tuple(ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted(address: str, networks: Tuple[Network, ...]) -> bool:
+    try:
+        parsed = ip_address(address)
+    except ValueError:
+        # `unknown`, obfuscated identifiers or garbage
+        return False
+    return any(parsed in network for network in networks)
+
+
+def _without_port(node: str) -> str:
+    node = node.strip().strip('"')
+    if node.startswith("["):
+        return node[1:node.find("]")]
+    if node.count(":") == 1:
+        return node.split(":")[0]
+    return node
+
+
+def forwarded_addresses(request: Request) -> List[str]:
+    """Returns the addresses of the client and the proxies, from the furthest to the nearest
+
+    :param request: the request
+    :type request: Request
+    :return: addresses of the `Forwarded` header, or else of the `X-Forwarded-For` header
+    :rtype: List[str]
+    """
+    forwarded = request.headers.get("forwarded")
+    if forwarded:
+        addresses = []
+        for element in forwarded.split(","):
+            for pair in element.split(";"):
+                name, _, value = pair.partition("=")
+                if name.strip().lower() == "for":
+                    addresses.append(_without_port(value))
+        return addresses
+    forwarded_for = request.headers.get("x-forwarded-for", "")
+    return [_without_port(node) for node in forwarded_for.split(",") if node.strip()]
+
+
+def client_address(request: Request) -> str:
+    """Returns the address of the client, read from the forwarding headers set by trusted proxies
+
+    The proxies are set with `LOGIN_THROTTLE_TRUSTED_PROXIES`. With uvicorn
+    `--forwarded-allow-ips` the peer is already the client and it can be left empty.
+
+    :param request: the request
+    :type request: Request
+    :return: the address of the client, empty if it is unknown
+    :rtype: str
+    """
+    host = request.client.host if request.client else ""
+    networks = _networks(config.get_login_throttle_trusted_proxies())
+    if not _is_trusted(host, networks):
+        return host
+    for address in reversed(forwarded_addresses(request)):
+        host = address
+        if not _is_trusted(address, networks):
+            break
+    return host
@@ -0,0 +1,97 @@
+"""ASGI middleware that limits the requests served at the same time by route class
+
+Routes are grouped in classes that cost alike: `auth` routes hash passwords,
+`admin` routes change or count many users and `default` are cheap reads. Each
+class has its own :class:`AdaptiveLimiter`, so a spike of logins cannot take
+the slots of the reads. Requests over the limit get a 503 with `Retry-After`.
+"""
+import re
+import time
+from typing import Callable, Dict, Iterable, Tuple, Union
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from identity import config
+from identity.adapters.concurrency import AdaptiveLimiter, ConcurrencyLimitExceeded
+
+ROUTE_CLASSES = ("auth", "admin", "default")
+
+# (route class, method or `None` for any, path pattern), the first match wins
+ROUTE_RULES: Tuple[Tuple[str, Union[str, None], re.Pattern], ...] = (
+    ("auth", "POST", re.compile(r"^/v1/token")),
+    ("auth", "POST", re.compile(r"^/v1/users(:import)?$")),
+    ("admin", None, re.compile(r"^/v1/admin/")),
+    ("admin", "GET", re.compile(r"^/v1/users/stats$")),
+    ("admin", "POST", re.compile(r"^/v1/users(:validate|:enable|:disable|/[^/]+/(validate|disable|enable))$")),
+)
+
+
+def classify_route(method: str, path: str) -> str:
+    """Returns the class of the route of a request"""
+    for route_class, rule_method, pattern in ROUTE_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return route_class
+    return "default"
+
+
+def build_limiters(route_classes: Iterable[str] = ROUTE_CLASSES) -> Dict[str, AdaptiveLimiter]:
+    """Returns a limiter for each route class with the settings, none if limits are disabled"""
+    if not config.get_concurrency_limits_enabled():
+        return {}
+    limiters = {}
+    for route_class in route_classes:
+        settings = config.get_concurrency_limit_settings(route_class)
+        limiters[route_class] = AdaptiveLimiter(
+            initial_limit=settings.initial_limit,
+            min_limit=settings.min_limit,
+            max_limit=settings.max_limit,
+            max_queue=settings.max_queue,
+            queue_timeout=settings.queue_timeout_seconds,
+        )
+    return limiters
+
+
+class ConcurrencyLimitMiddleware:
+    """Limits the requests in flight of each route class
+
+    :param app: ASGI application
+    :param limiters: limiter of each route class, classes without limiter are not limited
+    :type limiters: Dict[str, AdaptiveLimiter]
+    :param classify: function returning the class of a request from its method and path
+    :type classify: Callable[[str, str], str]
+    """
+
+    def __init__(self, app, limiters: Dict[str, AdaptiveLimiter],
+                 classify: Callable[[str, str], str] = classify_route):
+        self.app = app
+        self.limiters = limiters
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limiter = self.limiters.get(self.classify(scope["method"], scope["path"]))
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await limiter.acquire()
+        except ConcurrencyLimitExceeded as ex:
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Service is busy, try again later"},
+                headers={"Retry-After": str(ex.retry_after)},
+            )
+            return await response(scope, receive, send)
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            await self.app(scope, receive, send)
+            failed = False
+        finally:
+            limiter.release(time.perf_counter() - started, failed=failed)
+
+
+limiters = build_limiters()
@@ -0,0 +1,69 @@
+"""Dependencies shared by the routers"""
+from functools import partial
+from typing import Annotated, Union
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from identity import config
+from identity.adapters.cache import LRUCache
+from identity.adapters.db.replicas import Replica, ReplicaRouter
+from identity.adapters.db.session import async_session, replica_engines
+from identity.services.revocation import revocation_list
+from identity.services.service_accounts import client_tokens, forget_disabled_clients
+from identity.services.throttling import LoginThrottle, login_throttle
+from identity.services.tokens import forget_changed_users
+from identity.services.uow.users import UsersAbstractUnitOfWork, UsersSqlAlchemyUnitOfWork
+
+
+def _new_users_cache() -> Union[LRUCache, None]:
+    max_size = config.get_user_cache_max_size()
+    if max_size <= 0:
+        return None
+    return LRUCache(max_size=max_size, ttl=config.get_user_cache_ttl_seconds())
+
+
+users_cache = _new_users_cache()
+if users_cache is not None:
+    # Users changed by other workers are forgotten when the filter of revoked tokens is rebuilt
+    revocation_list.subscribe(partial(forget_changed_users, users_cache))
+if client_tokens is not None:
+    # So do the tokens reused for the service accounts disabled by other workers
+    revocation_list.subscribe(partial(forget_disabled_clients, client_tokens))
+
+
+def _new_replica_router() -> Union[ReplicaRouter, None]:
+    if not replica_engines:
+        return None
+    settings = config.get_replica_settings()
+    replicas = [Replica(host, async_sessionmaker(replica_engine, expire_on_commit=False))
+                for host, replica_engine in zip(settings.hosts, replica_engines)]
+    return ReplicaRouter(replicas, selection=settings.selection, retry_seconds=settings.retry_seconds,
+                         read_your_writes_seconds=settings.read_your_writes_seconds)
+
+
+replica_router = _new_replica_router()
+
+
+def get_users_uow() -> UsersAbstractUnitOfWork:
+    """Returns a new unit of work for each request.
+
+    Every unit of work opens its own session from the engine pool,
+    so concurrent requests never share a connection or a transaction.
+    All of them share the cache of users and the replicas of the worker.
+    """
+    return UsersSqlAlchemyUnitOfWork(
+        async_session, cache=users_cache, approximate_counts=config.get_user_counts_approximate(),
+        replicas=replica_router,
+    )
+
+
+UsersUnitOfWork = Annotated[UsersAbstractUnitOfWork, Depends(get_users_uow)]
+
+
+def get_login_throttle() -> Union[LoginThrottle, None]:
+    """Returns the throttle of the logins of the worker, `None` if logins are not throttled"""
+    return login_throttle
+
+
+LoginThrottleDependency = Annotated[Union[LoginThrottle, None], Depends(get_login_throttle)]
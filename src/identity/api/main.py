@@ -1,11 +1,103 @@
-from fastapi import FastAPI
+import math
 
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+
+from identity.adapters.db.session import async_session
+from identity.api import concurrency
 from identity.api.api import api_router
+from identity.api.responses import JSON_RESPONSE_CLASS
+from identity.api.routers import jwks
+from identity.services.exceptions import (
+    InvalidCursorException,
+    InvalidEmailFormatException,
+    InvalidUserSelectionException,
+    LoginThrottledException,
+    PasswordHashingBusyException,
+    PasswordHashingTimeoutException,
+    ServiceAccountAlreadyExistsException,
+    ServiceAccountDoesNotExistException,
+    UserAlreadyExistsException,
+    UserDoesNotExistException,
+)
+from identity.services.hashing import shutdown_hashing_executor
+from identity.services.revocation import revocation_list
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
 
-app = FastAPI()
+app = FastAPI(default_response_class=JSON_RESPONSE_CLASS)
+app.add_middleware(concurrency.ConcurrencyLimitMiddleware, limiters=concurrency.limiters)
 
 app.include_router(api_router, prefix="/v1")
+app.include_router(jwks.router, tags=["SignIn"])
+
+
+@app.on_event("startup")
+async def startup():
+    # The filter of revoked tokens is rebuilt from the primary, out of the requests
+    revocation_list.start(lambda: UsersSqlAlchemyUnitOfWork(async_session))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await revocation_list.stop()
+    shutdown_hashing_executor()
+
+
+@app.exception_handler(PasswordHashingBusyException)
+@app.exception_handler(PasswordHashingTimeoutException)
+async def password_hashing_unavailable(request: Request, exc: Exception):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service is busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(LoginThrottledException)
+async def login_throttled(request: Request, exc: LoginThrottledException):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many login attempts, try again later"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+@app.exception_handler(UserAlreadyExistsException)
+async def user_already_exists(request: Request, exc: UserAlreadyExistsException):
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": "User already exists"})
+
+
+@app.exception_handler(UserDoesNotExistException)
+async def user_does_not_exist(request: Request, exc: UserDoesNotExistException):
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "User does not exist"})
+
+
+@app.exception_handler(InvalidEmailFormatException)
+async def invalid_email_format(request: Request, exc: InvalidEmailFormatException):
+    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={"detail": "Invalid email"})
+
+
+@app.exception_handler(InvalidUserSelectionException)
+async def invalid_user_selection(request: Request, exc: InvalidUserSelectionException):
+    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        content={"detail": "Select users either by emails or by a non empty filter"})
+
+
+@app.exception_handler(InvalidCursorException)
+async def invalid_cursor(request: Request, exc: InvalidCursorException):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid cursor"})
+
+
+@app.exception_handler(ServiceAccountAlreadyExistsException)
+async def service_account_already_exists(request: Request, exc: ServiceAccountAlreadyExistsException):
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": "Service account already exists"})
+
+
+@app.exception_handler(ServiceAccountDoesNotExistException)
+async def service_account_does_not_exist(request: Request, exc: ServiceAccountDoesNotExistException):
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Service account does not exist"})
+
 
 @app.get("/")
 async def root():
-    return {"alive": True}
\ No newline at end of file
+    return {"alive": True}
@@ -0,0 +1,78 @@
+"""JSON responses of the API
+
+Routes that already hold trusted objects, e.g. users read from the database,
+return them through :func:`trusted_response`. The fields of the schema are
+picked from the objects and rendered directly, FastAPI does not validate them
+again against the `response_model`, which is still used by the OpenAPI docs.
+"""
+import json
+from typing import Any, Type
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+from identity import config
+
+RESPONSE_CLASSES = {"orjson": ORJSONResponse, "json": JSONResponse}
+
+
+def get_response_class() -> Type[JSONResponse]:
+    """Returns the class of the JSON responses chosen by the `JSON_RESPONSE` setting
+
+    :raises ValueError: if the setting is not one of :data:`RESPONSE_CLASSES`
+    """
+    name = config.get_json_response()
+    if name not in RESPONSE_CLASSES:
+        raise ValueError(f"Unknown JSON response: {name!r}, use one of {', '.join(RESPONSE_CLASSES)}")
+    return RESPONSE_CLASSES[name]
+
+
+JSON_RESPONSE_CLASS = get_response_class()
+
+
+def dump(schema: Type[BaseModel], obj: Any) -> Any:
+    """Picks the fields of a schema from a trusted object, or a list of them, without validating them
+
+    :param schema: schema of the response
+    :type schema: Type[BaseModel]
+    :param obj: object, or dict, with an attribute (or key) for each field of the schema
+    :type obj: Any
+    :return: a dict, or a list of dicts, with the values of the fields
+    :rtype: Any
+    """
+    if isinstance(obj, list):
+        return [dump(schema, item) for item in obj]
+    content = {}
+    for name, model_field in schema.__fields__.items():
+        value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+        if value is not None and isinstance(model_field.type_, type) and issubclass(model_field.type_, BaseModel):
+            value = dump(model_field.type_, value)
+        content[name] = value
+    return content
+
+
+def render(content: Any) -> bytes:
+    """Renders content made of dicts, lists and simple values as JSON"""
+    if JSON_RESPONSE_CLASS is ORJSONResponse:
+        return orjson.dumps(content)
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+
+
+def trusted_response(schema: Type[BaseModel], obj: Any, status_code: int = 200) -> JSONResponse:
+    """Returns the response of a trusted object serialized with the fields of a schema
+
+    :param schema: schema of the response, it should be the `response_model` of the route
+    :type schema: Type[BaseModel]
+    :param obj: object, or dict, with an attribute (or key) for each field of the schema, or a list of them
+    :type obj: Any
+    :param status_code: status code of the response, defaults to 200
+    :type status_code: int, optional
+    :return: a response of the configured JSON class
+    :rtype: JSONResponse
+    """
+    content = dump(schema, obj)
+    if JSON_RESPONSE_CLASS is not ORJSONResponse:
+        content = jsonable_encoder(content)
+    return JSON_RESPONSE_CLASS(content, status_code=status_code)
@@ -0,0 +1,87 @@
+from typing import Annotated, Union
+
+from fastapi import APIRouter, Security, status
+
+from identity.adapters.cache import LRUCache
+from identity.adapters.db.session import engine, replica_engines
+from identity.api import concurrency
+from identity.api.dependencies import LoginThrottleDependency, UsersUnitOfWork, replica_router, users_cache
+from identity.api.routers.tokens import get_current_active_user
+from identity.api.schemas.service_accounts import NewServiceAccount, ServiceAccount, ServiceAccountCredentials
+from identity.api.schemas.users import User
+from identity.services import service_accounts as service_account_services
+from identity.services.hashing import get_hashing_executor
+from identity.services.revocation import revocation_list
+from identity.services.security import verified_tokens
+
+
+router = APIRouter()
+
+
+def _cache_metrics(cache: Union[LRUCache, None]) -> Union[dict, None]:
+    if cache is None:
+        return None
+    return {"size": len(cache), "max_size": cache.max_size, **cache.stats.snapshot()}
+
+
+def _pool_metrics(pool) -> Union[dict, None]:
+    # Pools of other kinds, e.g. NullPool, keep no connections
+    snapshot = getattr(pool, "snapshot", None)
+    return snapshot() if snapshot is not None else None
+
+
+def _replica_metrics() -> Union[dict, None]:
+    if replica_router is None:
+        return None
+    return {**replica_router.snapshot(), "pools": [_pool_metrics(replica_engine.pool) for replica_engine in replica_engines]}
+
+
+@router.get("/metrics")
+async def get_metrics(
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    login_throttle: LoginThrottleDependency,
+    status_code=status.HTTP_200_OK
+    ) -> dict:
+    hashing = get_hashing_executor()
+    return {
+        "password_hashing": {
+            "executor": hashing.kind,
+            "workers": hashing.workers,
+            "pending": hashing.pending,
+            "max_pending": hashing.max_pending,
+            **hashing.metrics.snapshot(),
+        },
+        "user_cache": _cache_metrics(users_cache),
+        "token_cache": _cache_metrics(verified_tokens),
+        "token_revocation": {"size": len(revocation_list), **revocation_list.stats.snapshot()},
+        "client_token_cache": _cache_metrics(service_account_services.client_tokens),
+        "login_throttle": login_throttle.stats.snapshot() if login_throttle is not None else None,
+        "database_pool": _pool_metrics(engine.pool),
+        "database_replicas": _replica_metrics(),
+        "concurrency_limits": {route_class: limiter.snapshot()
+                               for route_class, limiter in concurrency.limiters.items()},
+    }
+
+
+@router.post("/service-accounts", response_model=ServiceAccountCredentials)
+async def create_service_account(
+    new_account: NewServiceAccount,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> ServiceAccountCredentials:
+    """Creates a service account, its secret is returned only once"""
+    account, secret = await service_account_services.new_service_account(
+        new_account.client_id, new_account.scopes, uow
+    )
+    return ServiceAccountCredentials(**ServiceAccount.from_orm(account).dict(), client_secret=secret)
+
+
+@router.post("/service-accounts/{client_id}/disable", response_model=ServiceAccount)
+async def disable_service_account(
+    client_id: str,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> ServiceAccount:
+    return await service_account_services.disable_service_account(client_id, uow)
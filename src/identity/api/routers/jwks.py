@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from identity.config import get_jwt_settings
+from identity.services import keys
+
+
+router = APIRouter()
+
+
+@router.get("/.well-known/jwks.json")
+async def get_jwks(response: Response) -> dict:
+    """Public keys that verify the access tokens, empty when tokens are signed with a shared secret"""
+    response.headers["Cache-Control"] = f"public, max-age={get_jwt_settings().jwks_max_age_seconds}"
+    key_ring = keys.get_key_ring()
+    return key_ring.jwks() if key_ring is not None else {"keys": []}
@@ -1,23 +1,32 @@
 from datetime import timedelta
 from typing import Annotated
-from jose import JWTError, jwt
+from jose import JWTError
 from fastapi import APIRouter
-from fastapi import Depends, FastAPI, HTTPException, Security, status
+from fastapi import Depends, FastAPI, Form, HTTPException, Request, Security, status
 from fastapi.security import (
     OAuth2PasswordBearer,
-    OAuth2PasswordRequestForm,
     SecurityScopes,
 )
 from pydantic import ValidationError
 
-from identity.config import get_jwt_algorithm, get_jwt_secret_key
-from identity.api.schemas.tokens import Token, TokenData
-from identity.config import get_jwt_access_tocken_expire_minutes
+from identity.api.clients import client_address
+from identity.api.schemas.tokens import Token, TokenData, TokenRequestForm
+from identity.config import get_jwt_settings
 from identity.domain.users import User
-from identity.services.security import authenticate_user, create_access_token
-from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
-from identity.adapters.db.session import async_session
+from identity.services.security import authenticate_user, create_access_token, decode_access_token
 from identity.services import users as user_services
+from identity.services.exceptions import InvalidRefreshTokenException, UserDoesNotExistException
+from identity.services.revocation import revocation_list
+from identity.services.service_accounts import issue_client_token, service_account_user
+from identity.services.tokens import (
+    issue_refresh_token,
+    revoke_token,
+    rotate_refresh_token,
+    read_user_claims,
+    trusted_user,
+    user_claims,
+)
+from identity.api.dependencies import LoginThrottleDependency, UsersUnitOfWork
 
 router = APIRouter()
 
@@ -30,10 +39,10 @@ oauth2_scheme = OAuth2PasswordBearer(
     },
 )
 
-uow = UsersSqlAlchemyUnitOfWork(async_session)
 
 async def get_current_user(
-    security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_scheme)]
+    security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_scheme)],
+    uow: UsersUnitOfWork
 ):
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
@@ -45,17 +54,29 @@ async def get_current_user(
         headers={"WWW-Authenticate": authenticate_value},
     )
     try:
-        payload = jwt.decode(token, get_jwt_secret_key(), algorithms=[get_jwt_algorithm()])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_scopes = payload.get("scopes", [])
-        token_data = TokenData(scopes=token_scopes, username=username)
+        # The claims were signed by us, there is nothing to validate
+        token_data = TokenData.construct(scopes=token_scopes, username=username)
     except (JWTError, ValidationError):
         raise credentials_exception
-    user = await user_services.get_user(token_data.username, uow)
-    if user is None:
+    if await revocation_list.is_revoked(payload.get("jti"), uow):
         raise credentials_exception
+    if payload.get("client_id") is not None:
+        user = await service_account_user(payload, uow)
+        if user is None:
+            raise credentials_exception
+    else:
+        # In stateless mode recent claims are trusted and the user is not read
+        user = await trusted_user(payload, uow)
+    if user is None:
+        try:
+            user = await user_services.get_user(token_data.username, uow)
+        except UserDoesNotExistException:
+            raise credentials_exception
     for scope in security_scopes.scopes:
         if scope not in token_data.scopes:
             raise HTTPException(
@@ -74,10 +95,44 @@ async def get_current_active_user(
     return current_user
 
 
+def _access_token(email: str, scopes: list, claims: dict) -> dict:
+    expires_minutes = get_jwt_settings().access_token_expire_minutes
+    access_token = create_access_token(
+        data={"sub": email, "scopes": scopes, **claims},
+        expires_delta=timedelta(minutes=expires_minutes)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "expires_in": expires_minutes * 60}
+
+
 @router.post("", response_model=Token)
 async def login_for_access_token(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+    request: Request,
+    form_data: Annotated[TokenRequestForm, Depends()],
+    uow: UsersUnitOfWork,
+    login_throttle: LoginThrottleDependency
 ):
+    """Issues an access token and a refresh token.
+
+    Use `grant_type=password` with `username` and `password` to log in, and
+    `grant_type=refresh_token` with `refresh_token` to renew the access token
+    without sending the password again. Refresh tokens can be used only once,
+    each renewal returns a new one.
+
+    Service accounts use `grant_type=client_credentials` with `client_id` and
+    `client_secret`, they get no refresh token. The same token is returned to
+    repeated requests while it is fresh.
+
+    Password logins are throttled by account and by client address, throttled
+    attempts get a 429 with `Retry-After` before the password is checked. Behind
+    proxies listed in `LOGIN_THROTTLE_TRUSTED_PROXIES` the client address is
+    read from the `Forwarded` or `X-Forwarded-For` headers.
+    """
+    if form_data.grant_type == "refresh_token":
+        return await _refresh_access_token(form_data, uow)
+    if form_data.grant_type == "client_credentials":
+        return await _client_access_token(form_data, uow)
+    if login_throttle is not None:
+        await login_throttle.check(form_data.username, client_address(request))
     user = await authenticate_user(form_data.username, form_data.password, uow)
     if not user:
         raise HTTPException(
@@ -85,9 +140,52 @@ async def login_for_access_token(
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=get_jwt_access_tocken_expire_minutes())
-    access_token = create_access_token(
-        data={"sub": user.email, "scopes": form_data.scopes}, 
-        expires_delta=access_token_expires
+    refresh_token = await issue_refresh_token(user.email, form_data.scopes, uow)
+    access_token = _access_token(user.email, form_data.scopes, user_claims(user))
+    return {**access_token, "refresh_token": refresh_token}
+
+
+async def _refresh_access_token(form_data: TokenRequestForm, uow: UsersUnitOfWork) -> dict:
+    invalid_grant = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    try:
+        refresh_token, used = await rotate_refresh_token(form_data.refresh_token, uow)
+    except InvalidRefreshTokenException:
+        raise invalid_grant
+    # The access token may be given fewer scopes than the login granted, never more
+    scopes = form_data.scopes or used.scopes
+    if not set(scopes) <= set(used.scopes):
+        raise invalid_grant
+    try:
+        claims = await read_user_claims(used.email, uow)
+    except UserDoesNotExistException:
+        raise invalid_grant
+    return {**_access_token(used.email, scopes, claims), "refresh_token": refresh_token}
+
+
+async def _client_access_token(form_data: TokenRequestForm, uow: UsersUnitOfWork) -> dict:
+    issued = await issue_client_token(form_data.client_id, form_data.client_secret, form_data.scopes, uow)
+    if issued is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid client",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token, expires_in = issued
+    return {"access_token": access_token, "token_type": "bearer", "expires_in": expires_in}
+
+
+@router.post("/revoke")
+async def revoke_access_or_refresh_token(
+    token: Annotated[str, Form()],
+    uow: UsersUnitOfWork
+) -> dict:
+    """Revokes an access token or a refresh token and the ones renewed from it.
+
+    As in RFC 7009 the response does not tell if the token was valid.
+    """
+    await revoke_token(token, uow)
+    return {}
@@ -1,62 +1,178 @@
-from typing import Annotated, List
+from typing import Annotated, AsyncIterator, List, Union
 
-from fastapi import APIRouter, Security, status
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Security, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import EmailStr
+from identity import config
+from identity.adapters.importers import PARSERS, stream_users
 from identity.api.routers.tokens import get_current_active_user
-from identity.api.schemas.users import NewUser, User
-from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.api.dependencies import UsersUnitOfWork
+from identity.api.responses import dump, render, trusted_response
+from identity.api.schemas.users import (
+    NewUser,
+    User,
+    UserImportReport,
+    UsersBatchGet,
+    UsersLookup,
+    UsersPage,
+    UsersSelection,
+    UserStats,
+    UsersUpdateReport,
+)
+from identity.domain.users import UserFilter, UserUpdateOutcome
 from identity.services import users as user_services
-from identity.adapters.db.session import async_session
 
 
 router = APIRouter()
 
-uow = UsersSqlAlchemyUnitOfWork(async_session)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 
-@router.get("", response_model=List[User])
+async def _ndjson_lines(users: AsyncIterator) -> AsyncIterator[bytes]:
+    async for user in users:
+        yield render(dump(User, user)) + b"\n"
+
+
+@router.get("", response_model=Union[UsersPage, List[User]])
 async def list_all_users(
     current_user: Annotated[User, Security(get_current_active_user, scopes=["users:read"])], 
+    uow: UsersUnitOfWork,
+    cursor: Annotated[Union[str, None], Query(description="`next_cursor` of the previous page")] = None,
+    limit: Annotated[Union[int, None], Query(ge=1, le=1000, description="Page size, enables paging by cursor")] = None,
+    accept: Annotated[Union[str, None], Header()] = None,
     status_code=status.HTTP_200_OK
-    ) -> List[User]:
-    return await user_services.list_users(uow)
+    ) -> Union[UsersPage, List[User]]:
+    """Lists users. Send `Accept: application/x-ndjson` to stream all of them one per line."""
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        users = user_services.stream_users(uow, batch_size=config.get_users_stream_batch_size())
+        return StreamingResponse(_ndjson_lines(users), media_type=NDJSON_MEDIA_TYPE)
+    if cursor is None and limit is None:
+        return trusted_response(User, await user_services.list_users(uow))
+    page = await user_services.list_users_by_cursor(uow, cursor=cursor, page_size=limit or 100)
+    return trusted_response(UsersPage, page)
 
 
 @router.post("", response_model=User)
 async def register_new_user(
     new_user_data: NewUser, 
+    uow: UsersUnitOfWork,
     status_code=status.HTTP_201_CREATED
     ) -> User:
-    return await user_services.new_user(new_user_data.username, new_user_data.password, uow)
+    return trusted_response(User, await user_services.new_user(new_user_data.username, new_user_data.password, uow))
+
+
+@router.post(":batchGet", response_model=UsersLookup)
+async def get_many_users(
+    batch: UsersBatchGet,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["me"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> UsersLookup:
+    """Gets up to 1000 users by email at once, emails not registered are listed in `missing`"""
+    return trusted_response(UsersLookup, await user_services.get_users(batch.emails, uow))
+
+
+@router.post(":import", response_model=UserImportReport,
+             openapi_extra={"requestBody": {"content": {media_type: {} for media_type in PARSERS}}})
+async def import_users(
+    request: Request,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    content_type: Annotated[str, Header()] = "",
+    status_code=status.HTTP_200_OK
+    ) -> UserImportReport:
+    """Registers many users from a CSV (`text/csv`) or NDJSON (`application/x-ndjson`) body"""
+    parser = PARSERS.get(content_type.split(";")[0].strip())
+    if parser is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Content type must be one of: {', '.join(PARSERS)}")
+    # The body is parsed as it is received, each batch is inserted before the next one is read
+    rows = stream_users(parser(), request.stream())
+    report = await user_services.bulk_new_users(rows, uow, batch_size=config.get_users_import_batch_size())
+    return trusted_response(UserImportReport, report)
+
+
+def _update_report(outcomes: List[UserUpdateOutcome]) -> JSONResponse:
+    updated = sum(outcome.result == "updated" for outcome in outcomes)
+    return trusted_response(UsersUpdateReport, {"updated": updated, "results": outcomes})
+
+
+def _selection_args(selection: UsersSelection) -> dict:
+    user_filter = UserFilter(**selection.filter.dict()) if selection.filter is not None else None
+    return {"emails": selection.emails, "user_filter": user_filter,
+            "batch_size": config.get_users_bulk_update_batch_size()}
+
+
+@router.post(":validate", response_model=UsersUpdateReport)
+async def validate_users(
+    selection: UsersSelection,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> UsersUpdateReport:
+    return _update_report(await user_services.bulk_validate_users(uow, **_selection_args(selection)))
+
+
+@router.post(":enable", response_model=UsersUpdateReport)
+async def enable_users(
+    selection: UsersSelection,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> UsersUpdateReport:
+    return _update_report(await user_services.bulk_enable_users(uow, **_selection_args(selection)))
+
+
+@router.post(":disable", response_model=UsersUpdateReport)
+async def disable_users(
+    selection: UsersSelection,
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> UsersUpdateReport:
+    return _update_report(await user_services.bulk_disable_users(uow, **_selection_args(selection)))
+
+
+@router.get("/stats", response_model=UserStats)
+async def get_user_stats(
+    current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])],
+    uow: UsersUnitOfWork,
+    status_code=status.HTTP_200_OK
+    ) -> UserStats:
+    return trusted_response(UserStats, await user_services.get_user_stats(uow))
 
 
 @router.get("/{email}", response_model=User)
 async def get_a_user(email: EmailStr, 
                      current_user: Annotated[User, Security(get_current_active_user, scopes=["me"])], 
+                     uow: UsersUnitOfWork,
                      status_code=status.HTTP_200_OK
                      ) -> User:
-    return await user_services.get_user(email, uow)
+    return trusted_response(User, await user_services.get_user(email, uow))
 
 
 @router.post("/{email}/validate", response_model=User)
 async def validate_user_email(email: EmailStr, 
                         current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])], 
+                        uow: UsersUnitOfWork,
                         status_code=status.HTTP_200_OK
                         ) -> User:
-    return await user_services.validate_user(email, uow)
+    return trusted_response(User, await user_services.validate_user(email, uow))
 
 
 @router.post("/{email}/disable", response_model=User)
 async def disable_user(email: EmailStr, 
                        current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])], 
+                       uow: UsersUnitOfWork,
                        status_code=status.HTTP_200_OK
                        ) -> User:
-    return await user_services.disable_user(email, uow)
+    return trusted_response(User, await user_services.disable_user(email, uow))
 
 
 @router.post("{email}/enable", response_model=User)
 async def enable_user(email: EmailStr, 
                       current_user: Annotated[User, Security(get_current_active_user, scopes=["admin"])], 
+                      uow: UsersUnitOfWork,
                       status_code=status.HTTP_200_OK
                       ) -> User:
-    return await user_services.enable_user(email, uow)
+    return trusted_response(User, await user_services.enable_user(email, uow))
@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import List
+from pydantic import BaseModel, Field
+
+
+class ServiceAccountBase(BaseModel):
+    class Config:
+        orm_mode = True
+
+
+class NewServiceAccount(ServiceAccountBase):
+    # Client ids cannot be emails, so they never name a user
+    client_id: str = Field(regex=r"^[A-Za-z0-9_.-]{1,64}$")
+    scopes: List[str] = Field(default_factory=list, max_items=32)
+
+
+class ServiceAccount(ServiceAccountBase):
+    client_id: str
+    scopes: List[str]
+    active: bool
+    created_at: datetime
+
+
+class ServiceAccountCredentials(ServiceAccount):
+    client_secret: str
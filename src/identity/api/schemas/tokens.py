@@ -1,9 +1,38 @@
+from fastapi import Form
 from pydantic import BaseModel
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int | None = None
+    refresh_token: str | None = None
+
+
+class TokenRequestForm:
+    """Form of the token endpoint, it supports the `password`, `refresh_token` and `client_credentials` grants
+
+    Like :class:`fastapi.security.OAuth2PasswordRequestForm` the scopes are sent
+    in a single `scope` field separated by spaces.
+    """
+
+    def __init__(
+        self,
+        grant_type: str = Form(default="password", regex="^(password|refresh_token|client_credentials)$"),
+        username: str = Form(default=""),
+        password: str = Form(default=""),
+        scope: str = Form(default=""),
+        refresh_token: str = Form(default=""),
+        client_id: str = Form(default=""),
+        client_secret: str = Form(default=""),
+    ):
+        self.grant_type = grant_type
+        self.username = username
+        self.password = password
+        self.scopes = scope.split()
+        self.refresh_token = refresh_token
+        self.client_id = client_id
+        self.client_secret = client_secret
 
 
 class TokenData(BaseModel):
@@ -1,6 +1,7 @@
 
 from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from typing import List, Union
+from pydantic import BaseModel, EmailStr, Field
 
 
 class IdentityBase(BaseModel):
@@ -20,3 +21,59 @@ class User(IdentityBase):
     email: EmailStr
     active: bool
     validated: bool
+
+
+class UsersBatchGet(IdentityBase):
+    emails: List[EmailStr] = Field(max_items=1000)
+
+
+class UsersLookup(IdentityBase):
+    users: List[User]
+    missing: List[str]
+
+
+class UsersPage(IdentityBase):
+    items: List[User]
+    page_size: int
+    next_cursor: Union[str, None]
+
+
+class UserStats(IdentityBase):
+    total: int
+    active: int
+    validated: int
+
+
+class RejectedUserRow(IdentityBase):
+    row: int
+    email: Union[str, None]
+    reason: str
+
+
+class UserImportReport(IdentityBase):
+    created: int
+    rejected: List[RejectedUserRow]
+    elapsed_seconds: float
+    rows_per_second: float
+
+
+class UserFilter(IdentityBase):
+    email_domain: Union[str, None] = None
+    active: Union[bool, None] = None
+    validated: Union[bool, None] = None
+
+
+class UsersSelection(IdentityBase):
+    """Either a list of emails or a filter"""
+    emails: Union[List[EmailStr], None] = Field(default=None, max_items=10_000)
+    filter: Union[UserFilter, None] = None
+
+
+class UserUpdateOutcome(IdentityBase):
+    email: str
+    result: str
+
+
+class UsersUpdateReport(IdentityBase):
+    updated: int
+    results: List[UserUpdateOutcome]
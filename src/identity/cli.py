@@ -0,0 +1,125 @@
+"""Command line tools for administering the identity service.
+
+Run ``identity --help`` to list the commands.
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import sys
+
+from identity import config
+from identity.adapters.importers import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, READERS
+
+
+def _format_of(args) -> str:
+    if args.format:
+        return CSV_MEDIA_TYPE if args.format == "csv" else NDJSON_MEDIA_TYPE
+    return NDJSON_MEDIA_TYPE if args.file.endswith((".ndjson", ".jsonl")) else CSV_MEDIA_TYPE
+
+
+async def _import_users(args) -> int:
+    # Imported here so that --help works without database settings
+    from identity.adapters.db.session import async_session, engine
+    from identity.services.hashing import get_hashing_executor, shutdown_hashing_executor
+    from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+    from identity.services.users import bulk_new_users
+
+    reader = READERS[_format_of(args)]
+    try:
+        with open(args.file, newline="") as lines:
+            report = await bulk_new_users(reader(lines), UsersSqlAlchemyUnitOfWork(async_session),
+                                          batch_size=args.batch_size)
+        hashing = get_hashing_executor().metrics.snapshot()
+    finally:
+        shutdown_hashing_executor()
+        await engine.dispose()
+
+    for rejected in report.rejected:
+        print(f"row {rejected.row}: {rejected.email or '-'} {rejected.reason}", file=sys.stderr)
+    print(f"created={report.created} rejected={len(report.rejected)} "
+          f"elapsed={report.elapsed_seconds:.2f}s rows/s={report.rows_per_second:.1f} "
+          f"hash_avg={hashing['hash_time']['avg_seconds'] * 1000:.1f}ms "
+          f"queue_wait_avg={hashing['queue_wait']['avg_seconds'] * 1000:.1f}ms")
+    return 0
+
+
+async def _generate_signing_key(args) -> int:
+    from identity.services.keys import generate_signing_key
+
+    print(generate_signing_key(args.keys_dir, args.kid, args.algorithm, rsa_key_size=args.rsa_key_size))
+    return 0
+
+
+def _write_environment(path: str, values: dict):
+    """Sets the values in a dotenv file, other lines are kept"""
+    lines = []
+    if os.path.exists(path):
+        with open(path) as env_file:
+            lines = env_file.read().splitlines()
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        name = line.split("=", 1)[0].strip()
+        if name in pending:
+            lines[index] = f"{name}={pending.pop(name)}"
+    lines.extend(f"{name}={value}" for name, value in pending.items())
+    with open(path, "w") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+async def _calibrate_password_hash(args) -> int:
+    from identity.services.calibration import calibrate, measure_hash_seconds, to_environment
+
+    settings = dataclasses.replace(config.get_password_hash_settings(), scheme=args.scheme)
+    if args.argon2_memory_cost:
+        settings = dataclasses.replace(settings, argon2_memory_cost=args.argon2_memory_cost)
+    if args.argon2_parallelism:
+        settings = dataclasses.replace(settings, argon2_parallelism=args.argon2_parallelism)
+    settings = calibrate(settings, args.target_ms / 1000)
+    elapsed = measure_hash_seconds(settings)
+    environment = to_environment(settings)
+    for name, value in environment.items():
+        print(f"{name}={value}")
+    print(f"hash_time={elapsed * 1000:.1f}ms target={args.target_ms:.1f}ms", file=sys.stderr)
+    if args.env_file:
+        _write_environment(args.env_file, environment)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="identity", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_users = commands.add_parser("import-users", help="register the users of a CSV or NDJSON file")
+    import_users.add_argument("file", help="file with email (or username) and password of each user")
+    import_users.add_argument("--format", choices=["csv", "ndjson"],
+                              help="format of the file, by default guessed from its extension")
+    import_users.add_argument("--batch-size", type=int, default=config.get_users_import_batch_size())
+    import_users.set_defaults(handler=_import_users)
+
+    signing_key = commands.add_parser("generate-signing-key",
+                                      help="write a new private key for signing access tokens")
+    signing_key.add_argument("kid", help="id of the key, it names the PEM file")
+    signing_key.add_argument("--keys-dir", default=config.get_jwt_settings().keys_dir or ".",
+                             help="directory of the key ring, defaults to JWT_KEYS_DIR")
+    signing_key.add_argument("--algorithm", choices=["RS256", "RS384", "RS512", "ES256", "ES384", "ES512"],
+                             default="RS256")
+    signing_key.add_argument("--rsa-key-size", type=int, default=2048)
+    signing_key.set_defaults(handler=_generate_signing_key)
+
+    calibration = commands.add_parser("calibrate-password-hash",
+                                      help="pick the cost of password hashes that takes a target time here")
+    calibration.add_argument("--target-ms", type=float, default=250.0, help="time budget of a hash")
+    calibration.add_argument("--scheme", choices=["bcrypt", "argon2"],
+                             default=config.get_password_hash_settings().scheme)
+    calibration.add_argument("--argon2-memory-cost", type=int, help="KiB used by argon2, kept while calibrating")
+    calibration.add_argument("--argon2-parallelism", type=int)
+    calibration.add_argument("--env-file", help="dotenv file where the settings are written, e.g. .env")
+    calibration.set_defaults(handler=_calibrate_password_hash)
+
+    args = parser.parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
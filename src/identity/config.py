@@ -1,4 +1,8 @@
-from decouple import config
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+from decouple import Csv, config
 
 
 def get_jwt_secret_key():
@@ -13,10 +17,327 @@ def get_jwt_access_tocken_expire_minutes():
     return int(config('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', default=30))
 
 
-def get_database_url():
+@dataclass(frozen=True)
+class JWTSettings:
+    """Settings for signing and verifying access tokens
+
+    HMAC algorithms (HS256...) use `secret_key`. Asymmetric algorithms (RS256, ES256...)
+    use the PEM files of `keys_dir`, named after their key id, and sign with `active_kid`.
+    When `stateless_auth_seconds` is not 0 access tokens carry the state of the user,
+    which is trusted for that many seconds after the token is issued.
+    """
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    refresh_token_expire_days: int
+    verification_cache_size: int
+    keys_dir: str
+    active_kid: str
+    jwks_max_age_seconds: int
+    stateless_auth_seconds: int
+
+
+@lru_cache
+def get_jwt_settings() -> JWTSettings:
+    """Returns the JWT settings, the environment is read only the first time"""
+    return JWTSettings(
+        secret_key=get_jwt_secret_key(),
+        algorithm=get_jwt_algorithm(),
+        access_token_expire_minutes=get_jwt_access_tocken_expire_minutes(),
+        refresh_token_expire_days=int(config('JWT_REFRESH_TOKEN_EXPIRE_DAYS', default=30)),
+        verification_cache_size=int(config('JWT_VERIFICATION_CACHE_SIZE', default=10_000)),
+        keys_dir=config('JWT_KEYS_DIR', default=''),
+        active_kid=config('JWT_ACTIVE_KID', default=''),
+        jwks_max_age_seconds=int(config('JWKS_MAX_AGE_SECONDS', default=300)),
+        stateless_auth_seconds=int(config('JWT_STATELESS_AUTH_SECONDS', default=0)),
+    )
+
+
+def get_database_url(host: Union[str, None] = None, port: Union[str, None] = None):
+    """Returns the url of the primary database, or of a replica with the same credentials"""
     DB_USER = config("DB_USER")
     DB_PASSWORD = config("DB_PASSWORD")
     DB_DATABASE = config("DB_DATABASE")
-    DB_HOST = config("DB_HOST")
-    DB_PORT = config("DB_PORT")
+    DB_HOST = host or config("DB_HOST")
+    DB_PORT = port or config("DB_PORT")
     return f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+
+
+@dataclass(frozen=True)
+class ReplicaSettings:
+    """Settings of the read replicas of the database
+
+    `hosts` are `host` or `host:port` items, the replicas use the credentials
+    and the pool settings of the primary. Read-only units of work run on the
+    replica chosen by `selection`, `round_robin` or `least_loaded`. A replica
+    that cannot be reached is skipped for `retry_seconds`. The reads of a user
+    changed by the worker, and the listings, run on the primary for
+    `read_your_writes_seconds`, it should exceed the replication lag.
+    """
+    hosts: Tuple[str, ...]
+    selection: str
+    retry_seconds: float
+    read_your_writes_seconds: float
+
+
+@lru_cache
+def get_replica_settings() -> ReplicaSettings:
+    """Returns the replica settings, there are no replicas by default"""
+    return ReplicaSettings(
+        hosts=tuple(config('DB_REPLICA_HOSTS', default='', cast=Csv())),
+        selection=config('DB_REPLICA_SELECTION', default='round_robin'),
+        retry_seconds=float(config('DB_REPLICA_RETRY_SECONDS', default=5.0)),
+        read_your_writes_seconds=float(config('DB_READ_YOUR_WRITES_SECONDS', default=2.0)),
+    )
+
+
+def get_replica_urls() -> List[str]:
+    """Returns the url of each replica"""
+    urls = []
+    for host in get_replica_settings().hosts:
+        name, _, port = host.partition(":")
+        urls.append(get_database_url(name, port or None))
+    return urls
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """Settings of the engine and its connection pool
+
+    Each worker keeps up to `pool_size` connections open and opens up to
+    `max_overflow` more under load. A request waits `pool_timeout_seconds`
+    at most for a connection. Connections older than `pool_recycle_seconds`
+    are replaced (-1 never) and `pool_pre_ping` checks them before use.
+    `statement_cache_size` is the number of prepared statements asyncpg
+    keeps per connection, 0 disables them. A `pool_size` of 0 disables the
+    pool, every session opens its own connection.
+
+    With `pgbouncer` the database is reached through PgBouncer in transaction
+    mode: statements are not cached and get unique names, since consecutive
+    transactions may run on different server connections. Use no pool or a
+    small one, PgBouncer keeps the connections to Postgres.
+    """
+    pool_size: int
+    max_overflow: int
+    pool_timeout_seconds: float
+    pool_recycle_seconds: int
+    pool_pre_ping: bool
+    statement_cache_size: int
+    echo: bool
+    pgbouncer: bool
+
+
+@lru_cache
+def get_database_settings() -> DatabaseSettings:
+    """Returns the database settings, the defaults are those of SQLAlchemy and asyncpg"""
+    return DatabaseSettings(
+        pool_size=int(config('DB_POOL_SIZE', default=5)),
+        max_overflow=int(config('DB_MAX_OVERFLOW', default=10)),
+        pool_timeout_seconds=float(config('DB_POOL_TIMEOUT_SECONDS', default=30.0)),
+        pool_recycle_seconds=int(config('DB_POOL_RECYCLE_SECONDS', default=-1)),
+        pool_pre_ping=config('DB_POOL_PRE_PING', default=False, cast=bool),
+        statement_cache_size=int(config('DB_STATEMENT_CACHE_SIZE', default=100)),
+        echo=config('DB_ECHO', default=False, cast=bool),
+        pgbouncer=config('DB_PGBOUNCER', default=False, cast=bool),
+    )
+
+
+def get_password_hash_executor():
+    """Kind of pool used for hashing passwords: `process` or `thread`"""
+    return config('PASSWORD_HASH_EXECUTOR', default='process')
+
+
+def get_password_hash_workers():
+    """Number of hashing workers, 0 means one per CPU"""
+    return int(config('PASSWORD_HASH_WORKERS', default=0))
+
+
+def get_password_hash_max_pending():
+    """Maximum number of hashing jobs queued or running at the same time"""
+    return int(config('PASSWORD_HASH_MAX_PENDING', default=64))
+
+
+def get_password_hash_timeout_seconds() -> Union[float, None]:
+    """Seconds to wait for a hashing job, 0 or less waits forever"""
+    timeout = float(config('PASSWORD_HASH_TIMEOUT_SECONDS', default=5.0))
+    return timeout if timeout > 0 else None
+
+
+@dataclass(frozen=True)
+class PasswordHashSettings:
+    """Settings of the password hashes
+
+    `scheme` is `bcrypt` or `argon2` (argon2id, it needs the `argon2` extra).
+    Hashes of the other scheme or of a lower cost are still verified and are
+    replaced when their users log in. Run ``identity calibrate-password-hash``
+    to pick the costs for the hardware.
+    """
+    scheme: str
+    bcrypt_rounds: int
+    argon2_time_cost: int
+    argon2_memory_cost: int
+    argon2_parallelism: int
+
+
+@lru_cache
+def get_password_hash_settings() -> PasswordHashSettings:
+    """Returns the password hash settings, the environment is read only the first time"""
+    return PasswordHashSettings(
+        scheme=config('PASSWORD_HASH_SCHEME', default='bcrypt'),
+        bcrypt_rounds=int(config('PASSWORD_BCRYPT_ROUNDS', default=12)),
+        argon2_time_cost=int(config('PASSWORD_ARGON2_TIME_COST', default=3)),
+        argon2_memory_cost=int(config('PASSWORD_ARGON2_MEMORY_COST', default=65536)),
+        argon2_parallelism=int(config('PASSWORD_ARGON2_PARALLELISM', default=4)),
+    )
+
+
+def get_user_cache_max_size():
+    """Maximum number of users cached by each worker, 0 disables the cache"""
+    return int(config('USER_CACHE_MAX_SIZE', default=10_000))
+
+
+def get_user_cache_ttl_seconds():
+    """Seconds a cached user is valid
+
+    Other workers forget the users changed when they rebuild their filter of
+    revoked tokens, within `REVOCATION_REFRESH_SECONDS`, the TTL bounds the
+    staleness if the signal of a change is missed.
+    """
+    return float(config('USER_CACHE_TTL_SECONDS', default=30.0))
+
+
+def get_users_stream_batch_size():
+    """Number of users fetched at once when users are streamed"""
+    return int(config('USERS_STREAM_BATCH_SIZE', default=1000))
+
+
+def get_user_counts_approximate():
+    """If `True` the total of paginated listings is estimated from Postgres statistics"""
+    return config('USER_COUNTS_APPROXIMATE', default=False, cast=bool)
+
+
+def get_users_import_batch_size():
+    """Number of users hashed and inserted at once by bulk imports"""
+    return int(config('USERS_IMPORT_BATCH_SIZE', default=1000))
+
+
+def get_users_bulk_update_batch_size():
+    """Number of users changed by each statement of bulk validate/enable/disable"""
+    return int(config('USERS_BULK_UPDATE_BATCH_SIZE', default=1000))
+
+
+def get_json_response():
+    """Library used to render JSON responses: `orjson` (default) or `json` from the standard library"""
+    return config('JSON_RESPONSE', default='orjson')
+
+
+def get_revocation_refresh_seconds():
+    """Seconds between rebuilds of the filter of revoked tokens of each worker"""
+    return float(config('REVOCATION_REFRESH_SECONDS', default=10.0))
+
+
+def get_revocation_commit_margin_seconds():
+    """Longest time between taking the time of a revocation and committing it
+
+    Rebuilds pass the ids revoked since the previous rebuild minus this margin
+    to the subscribers. Keep it above the transaction timeout of the database,
+    e.g. `idle_in_transaction_session_timeout`, and the clock skew of the workers.
+    """
+    return float(config('REVOCATION_COMMIT_MARGIN_SECONDS', default=60.0))
+
+
+def get_revocation_filter_capacity():
+    """Expected number of revoked access tokens that have not expired"""
+    return int(config('REVOCATION_FILTER_CAPACITY', default=100_000))
+
+
+def get_revocation_filter_error_rate():
+    """False positive rate of the filter of revoked tokens"""
+    return float(config('REVOCATION_FILTER_ERROR_RATE', default=0.001))
+
+
+def get_client_secret_key():
+    """Key of the HMAC of the secrets of service accounts, defaults to the JWT secret key"""
+    return config('CLIENT_SECRET_KEY', default=get_jwt_secret_key())
+
+
+def get_client_token_cache_size():
+    """Maximum number of access tokens of service accounts reused by each worker, 0 disables the reuse"""
+    return int(config('CLIENT_TOKEN_CACHE_SIZE', default=10_000))
+
+
+def get_login_throttle_backend():
+    """Where login attempts are counted: `memory` (per worker), `redis` (shared) or `none`"""
+    return config('LOGIN_THROTTLE_BACKEND', default='memory')
+
+
+def get_login_throttle_period_seconds():
+    return float(config('LOGIN_THROTTLE_PERIOD_SECONDS', default=60.0))
+
+
+def get_login_throttle_account_attempts():
+    """Login attempts admitted per period for each account"""
+    return int(config('LOGIN_THROTTLE_ACCOUNT_ATTEMPTS', default=10))
+
+
+def get_login_throttle_client_attempts():
+    """Login attempts admitted per period for each client address"""
+    return int(config('LOGIN_THROTTLE_CLIENT_ATTEMPTS', default=100))
+
+
+def get_login_throttle_trusted_proxies() -> Tuple[str, ...]:
+    """Addresses or networks, e.g. `10.0.0.0/8`, of the proxies whose forwarding headers are trusted
+
+    Logins are throttled by the client address read from the `Forwarded` or
+    `X-Forwarded-For` headers of the requests coming from them. Empty by default,
+    the headers are ignored and the address is that of the peer.
+    """
+    return tuple(config('LOGIN_THROTTLE_TRUSTED_PROXIES', default='', cast=Csv()))
+
+
+def get_login_throttle_redis_url():
+    return config('LOGIN_THROTTLE_REDIS_URL', default='redis://localhost:6379/0')
+
+
+@dataclass(frozen=True)
+class ConcurrencyLimitSettings:
+    """Settings of the concurrency limit of a route class
+
+    The limit of requests in flight starts at `initial_limit` and adapts to
+    their latency between `min_limit` and `max_limit`. Up to `max_queue`
+    requests wait for `queue_timeout_seconds` at most.
+    """
+    initial_limit: int
+    min_limit: int
+    max_limit: int
+    max_queue: int
+    queue_timeout_seconds: float
+
+
+_CONCURRENCY_LIMIT_DEFAULTS = {
+    "auth": ConcurrencyLimitSettings(initial_limit=16, min_limit=2, max_limit=128, max_queue=512,
+                                     queue_timeout_seconds=5.0),
+    "admin": ConcurrencyLimitSettings(initial_limit=4, min_limit=1, max_limit=16, max_queue=32,
+                                      queue_timeout_seconds=10.0),
+    "default": ConcurrencyLimitSettings(initial_limit=100, min_limit=10, max_limit=1000, max_queue=1000,
+                                        queue_timeout_seconds=2.0),
+}
+
+
+def get_concurrency_limits_enabled():
+    """Limits the requests in flight of each route class, disabled by default"""
+    return config('CONCURRENCY_LIMITS_ENABLED', default=False, cast=bool)
+
+
+def get_concurrency_limit_settings(route_class: str) -> ConcurrencyLimitSettings:
+    """Returns the settings of a route class, e.g. `CONCURRENCY_AUTH_MAX_QUEUE` for the `auth` class"""
+    defaults = _CONCURRENCY_LIMIT_DEFAULTS[route_class]
+    prefix = f"CONCURRENCY_{route_class.upper()}"
+    return ConcurrencyLimitSettings(
+        initial_limit=int(config(f'{prefix}_INITIAL_LIMIT', default=defaults.initial_limit)),
+        min_limit=int(config(f'{prefix}_MIN_LIMIT', default=defaults.min_limit)),
+        max_limit=int(config(f'{prefix}_MAX_LIMIT', default=defaults.max_limit)),
+        max_queue=int(config(f'{prefix}_MAX_QUEUE', default=defaults.max_queue)),
+        queue_timeout_seconds=float(config(f'{prefix}_QUEUE_TIMEOUT_SECONDS',
+                                           default=defaults.queue_timeout_seconds)),
+    )
@@ -1,28 +1,75 @@
-from typing import TypeVar, Generic, List
+import base64
+import json
+from datetime import datetime
+from typing import TypeVar, Generic, List, Tuple, Union
 
 T = TypeVar('T')
 
 class Page(Generic[T]):
     """Generic class that represents a paginated result
 
+    Pages are requested either by number or by cursor. Pages requested by cursor
+    do not have number nor total, clients ask for the next one using `next_cursor`.
+
     :param items: List of objects
     :type items: List[T]
-    :param page: Page number of the items. First page is 1
-    :type page: int
-    :param total: Total number of object
-    :type total: int
+    :param page: Page number of the items. First page is 1. `None` for cursor pages.
+    :type page: int, optional
+    :param page_size: Maximum number of objects per page
+    :type page_size: int
+    :param total: Total number of object, `None` if it was not computed
+    :type total: int, optional
+    :param next_cursor: opaque token to get the next page, `None` if this is the last page
+    :type next_cursor: str, optional
     :param has_next: `True` if there are more objects, `False` otherwise
     :type has_next: bool
     """
     items: List[T]
-    page: int
-    total: int
+    page: Union[int, None]
+    total: Union[int, None]
+    next_cursor: Union[str, None]
     has_next: bool
 
-    def __init__(self, items: List[T], page: int, page_size: int, total: int):
+    def __init__(self, items: List[T], page: Union[int, None], page_size: int, total: Union[int, None],
+                 next_cursor: Union[str, None] = None):
         self.items = items
         self.page = page
         self.page_size = page_size
         self.total = total
-        previous_items = (page - 1) * page_size
-        self.has_next = previous_items + len(items) < total
+        self.next_cursor = next_cursor
+        if total is None:
+            self.has_next = next_cursor is not None
+        else:
+            previous_items = (page - 1) * page_size
+            self.has_next = previous_items + len(items) < total
+
+
+def encode_cursor(updated_at: datetime, email: str) -> str:
+    """Encodes the position of a user in the listing as an opaque token
+
+    :param updated_at: last update of the last user of the page
+    :type updated_at: datetime
+    :param email: email of the last user of the page
+    :type email: str
+    :return: url safe token
+    :rtype: str
+    """
+    raw = json.dumps([updated_at.isoformat(), email], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decodes a token created by :func:`encode_cursor`
+
+    :param cursor: token
+    :type cursor: str
+    :raises ValueError: if the token is not valid
+    :return: the update datetime and email of the user
+    :rtype: Tuple[datetime, str]
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, email = json.loads(raw)
+        return datetime.fromisoformat(updated_at), str(email)
+    except (TypeError, ValueError) as ex:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from ex
@@ -0,0 +1,33 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+from identity.domain.utils import utcnow
+
+
+@dataclass(slots=True, kw_only=True)
+class ServiceAccount:
+    """An account of a machine client, it gets access tokens with the client credentials grant
+
+    Only the HMAC of the secret of the client is kept.
+
+    :param client_id: id of the client, it is the subject of its access tokens
+    :type client_id: str
+    :param secret_hash: HMAC-SHA256 of the secret of the client
+    :type secret_hash: bytes
+    :param scopes: scopes the client can be granted
+    :type scopes: List[str]
+    :param active: if `False` the client cannot get new tokens
+    :type active: bool
+    :param created_at: utc datetime when the account was created
+    :type created_at: datetime
+    """
+    client_id: str
+    secret_hash: bytes
+    scopes: List[str] = field(default_factory=list)
+    active: bool = True
+    created_at: datetime = field(default_factory=utcnow)
+
+    def allows(self, scopes: List[str]) -> bool:
+        """Returns if the client can be granted all the given scopes"""
+        return set(scopes) <= set(self.scopes)
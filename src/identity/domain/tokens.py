@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Union
+
+from identity.domain.utils import utcnow
+
+
+@dataclass(slots=True, kw_only=True)
+class RefreshToken:
+    """A refresh token as stored, only the digest of the token is kept
+
+    A refresh token can be exchanged once for a new access token and a new refresh
+    token of the same family. Presenting a used token again revokes its whole family.
+
+    :param token_hash: SHA-256 digest of the token
+    :type token_hash: bytes
+    :param family_id: id shared by the tokens issued from the same login
+    :type family_id: str
+    :param email: email of the user
+    :type email: str
+    :param scopes: scopes granted to the access tokens
+    :type scopes: List[str]
+    :param created_at: utc datetime when the token was issued
+    :type created_at: datetime
+    :param expires_at: utc datetime when the token expires
+    :type expires_at: datetime
+    :param used_at: utc datetime when the token was exchanged, `None` if it has not been used
+    :type used_at: Union[datetime, None]
+    :param revoked_at: utc datetime when the family of the token was revoked
+    :type revoked_at: Union[datetime, None]
+    """
+    token_hash: bytes
+    family_id: str
+    email: str
+    scopes: List[str] = field(default_factory=list)
+    created_at: datetime = field(default_factory=utcnow)
+    expires_at: datetime
+    used_at: Union[datetime, None] = None
+    revoked_at: Union[datetime, None] = None
+
+    def is_reused(self) -> bool:
+        """Returns if the token has already been exchanged and its family is still valid"""
+        return self.used_at is not None and self.revoked_at is None
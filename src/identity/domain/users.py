@@ -1,22 +1,98 @@
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from pydantic import BaseModel, EmailStr, Field
+from typing import Any, List, Union
+
+import email_validator
 
 from identity.domain.utils import utcnow
 
 
-class User(BaseModel):
+def validate_email(email: str) -> str:
+    """Checks the format of an email address and normalizes it
+
+    The domain is lower cased, the local part is kept as is because it is case sensitive.
+
+    :param email: email address
+    :type email: str
+    :raises ValueError: if it is not a valid email address
+    :return: the normalized email address
+    :rtype: str
+    """
+    if not isinstance(email, str):
+        raise ValueError("An email address must be a string")
+    try:
+        email_validator.validate_email(email, check_deliverability=False)
+    except email_validator.EmailNotValidError as ex:
+        raise ValueError(str(ex)) from ex
+    local_part, _, domain = email.rpartition("@")
+    return f"{local_part}@{domain.lower()}"
+
+
+@dataclass(slots=True, kw_only=True)
+class UserProfile:
+    """Read model of a user without its credentials
+
+    Listings and lookups return profiles, they never read the password hash.
+    Only :class:`User` entities are changed and stored.
+
+    :param created_at: utc datetime when the user was created
+    :type create_at: datetime
+    :param updated_at: utc datetime when the user was last updated
+    :type updated_at: datetime
+    :param email: email address of the user.
+    :type email: str
+    :param active: if `True` the user can be used.
+    :type active: bool
+    :param validated: if `True` the email address of the user has been validated.
+    :type validated: bool
+    """
+    created_at: datetime = field(default_factory=utcnow)
+    updated_at: datetime = field(default_factory=utcnow)
+    email: str
+    active: bool = False
+    validated: bool = False
+
+    def profile(self) -> "UserProfile":
+        """Returns a copy of the profile, the credentials of a user are left out"""
+        return UserProfile(**{name: getattr(self, name) for name in PROFILE_FIELDS})
+
+    def is_validated(self) -> bool:
+        """Returns if the emails address has been validated
+
+        :return: `True` if the emails address has been validated, `False` otherwise.
+        :rtype: bool
+        """
+        return self.validated
+
+    def is_active(self) -> bool:
+        """Returns if the user is active
+
+        :return: `True` if the user is active, `False` otherwise.
+        :rtype: bool
+        """
+        return self.active
+
+
+PROFILE_FIELDS = tuple(profile_field.name for profile_field in fields(UserProfile))
+
+
+@dataclass(slots=True, eq=False, kw_only=True)
+class User(UserProfile):
     """Represents a user (identity)
 
     A user is identified by an email that must be unique.
     First a user email should be validated using :func:`validate`
     and then the user should be activated calling :func:`enable` method.
 
+    Attributes are not validated, emails coming from outside should be checked
+    with :func:`validate_email` first.
+
     :param created_at: utc datetime when the user was created
     :type create_at: datetime
     :param updated_at: utc datetime when the user was last updated
     :type updated_at: datetime
     :param email: email address of the user.
-    :type email: EmailStr
+    :type email: str
     :param password: hashed password of the user
     :type password: str
     :param active: if `True` the user can be used. Default it is `False`.
@@ -25,15 +101,12 @@ class User(BaseModel):
                       Default it is `False`.
     :type validated: bool
     """
-    created_at: datetime = Field(default_factory=utcnow)
-    updated_at: datetime = Field(default_factory=utcnow)
-    email: EmailStr
     password: str
-    active: bool = False
-    validated: bool = False
 
-    class Config:
-        orm_mode = True
+    @classmethod
+    def from_orm(cls, obj: Any) -> "User":
+        """Creates a user from any object with the same attributes, e.g. an ORM user"""
+        return cls(**{name: getattr(obj, name) for name in USER_FIELDS})
 
     def __eq__(self, other):
         if not isinstance(other, User):
@@ -48,14 +121,6 @@ class User(BaseModel):
         self.updated_at = utcnow()
         self.validated = True
 
-    def is_validated(self) -> bool:
-        """Returns if the emails address has been validated
-
-        :return: `True` if the emails address has been validated, `False` otherwise.
-        :rtype: bool
-        """
-        return self.validated
-    
     def disable(self):
         """Disables the user and cannot be used
         """
@@ -67,11 +132,104 @@ class User(BaseModel):
         """
         self.updated_at = utcnow()
         self.active = True
-    
-    def is_active(self) -> bool:
-        """Returns if the user is active
 
-        :return: `True` if the user is active, `False` otherwise.
-        :rtype: bool
-        """
-        return self.active
+
+USER_FIELDS = tuple(user_field.name for user_field in fields(User))
+
+
+@dataclass(frozen=True)
+class UserStats:
+    """Number of users
+
+    :param total: number of users
+    :type total: int
+    :param active: number of active users
+    :type active: int
+    :param validated: number of users with a validated email address
+    :type validated: int
+    """
+    total: int
+    active: int
+    validated: int
+
+
+@dataclass(frozen=True)
+class RejectedUserRow:
+    """A row of a users import that was not added
+
+    :param row: number of the row, the first one is 1
+    :type row: int
+    :param email: email of the row, if any
+    :type email: Union[str, None]
+    :param reason: `invalid`, `duplicated` in the import or `already_exists`
+    :type reason: str
+    """
+    row: int
+    email: Union[str, None]
+    reason: str
+
+
+@dataclass
+class UserImportReport:
+    """Result of importing many users at once
+
+    :param created: number of users added
+    :type created: int
+    :param rejected: rows that were not added
+    :type rejected: List[RejectedUserRow]
+    :param elapsed_seconds: duration of the import
+    :type elapsed_seconds: float
+    """
+    created: int = 0
+    rejected: List[RejectedUserRow] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.created + len(self.rejected)
+        return rows / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+@dataclass(frozen=True)
+class UserFilter:
+    """Selects users by their attributes, `None` values do not filter
+
+    :param email_domain: domain of the email address, e.g. `version1.com`
+    :type email_domain: Union[str, None]
+    :param active: state of the users
+    :type active: Union[bool, None]
+    :param validated: state of the email address of the users
+    :type validated: Union[bool, None]
+    """
+    email_domain: Union[str, None] = None
+    active: Union[bool, None] = None
+    validated: Union[bool, None] = None
+
+    def is_empty(self) -> bool:
+        return self.email_domain is None and self.active is None and self.validated is None
+
+
+@dataclass(frozen=True)
+class UserUpdateOutcome:
+    """Result of changing a user in a bulk operation
+
+    :param email: email of the user
+    :type email: str
+    :param result: `updated` or `not_found`
+    :type result: str
+    """
+    email: str
+    result: str
+
+
+@dataclass
+class UsersLookup:
+    """Result of getting many users by email
+
+    :param users: users found, in the order they were requested
+    :type users: List[UserProfile]
+    :param missing: emails that do not belong to any user
+    :type missing: List[str]
+    """
+    users: List[UserProfile] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
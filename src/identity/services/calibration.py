@@ -0,0 +1,72 @@
+"""Module that picks the cost of the password hashes for the hardware.
+
+The cost is the highest one whose hash takes at most a target time on this
+machine. Each bcrypt round doubles the time, argon2 grows linearly with its
+time cost and its memory cost is kept. Calibrate on the hardware that serves
+the logins, e.g. ``identity calibrate-password-hash --target-ms 250``.
+"""
+import secrets
+import statistics
+import time
+from dataclasses import replace
+from typing import Callable, Dict
+
+from identity.config import PasswordHashSettings
+from identity.services.security import build_crypt_context
+
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 31
+MIN_ARGON2_TIME_COST = 2
+MAX_ARGON2_TIME_COST = 64
+
+
+def measure_hash_seconds(settings: PasswordHashSettings, samples: int = 3) -> float:
+    """Returns the median seconds to hash a password with the settings"""
+    context = build_crypt_context(settings)
+    password = secrets.token_urlsafe(12)
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(password)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def calibrate(settings: PasswordHashSettings, target_seconds: float,
+              measure: Callable[[PasswordHashSettings], float] = measure_hash_seconds) -> PasswordHashSettings:
+    """Returns the settings with the highest cost of their scheme that hashes within the target time
+
+    The cost is never lower than the recommended minimum, even if it takes longer.
+
+    :param settings: current settings, only the cost of their scheme is changed
+    :type settings: PasswordHashSettings
+    :param target_seconds: time budget of a hash
+    :type target_seconds: float
+    :param measure: function returning the seconds to hash a password with some settings
+    :type measure: Callable[[PasswordHashSettings], float]
+    :return: the calibrated settings
+    :rtype: PasswordHashSettings
+    """
+    if settings.scheme == "argon2":
+        cost_field, lowest, highest = "argon2_time_cost", MIN_ARGON2_TIME_COST, MAX_ARGON2_TIME_COST
+    else:
+        cost_field, lowest, highest = "bcrypt_rounds", MIN_BCRYPT_ROUNDS, MAX_BCRYPT_ROUNDS
+
+    calibrated = replace(settings, **{cost_field: lowest})
+    for cost in range(lowest + 1, highest + 1):
+        candidate = replace(settings, **{cost_field: cost})
+        if measure(candidate) > target_seconds:
+            break
+        calibrated = candidate
+    return calibrated
+
+
+def to_environment(settings: PasswordHashSettings) -> Dict[str, str]:
+    """Returns the environment variables that configure the settings"""
+    return {
+        "PASSWORD_HASH_SCHEME": settings.scheme,
+        "PASSWORD_BCRYPT_ROUNDS": str(settings.bcrypt_rounds),
+        "PASSWORD_ARGON2_TIME_COST": str(settings.argon2_time_cost),
+        "PASSWORD_ARGON2_MEMORY_COST": str(settings.argon2_memory_cost),
+        "PASSWORD_ARGON2_PARALLELISM": str(settings.argon2_parallelism),
+    }
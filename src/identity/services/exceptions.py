@@ -14,3 +14,50 @@ class UserDoesNotExistException(Exception):
 class InvalidEmailFormatException(Exception):
     """The format of the email is not valid."""
     pass
+
+
+class InvalidUserSelectionException(Exception):
+    """Users must be selected by a list of emails or by a non empty filter, not both."""
+    pass
+
+
+class InvalidCursorException(Exception):
+    """The pagination cursor is not valid."""
+    pass
+
+
+class PasswordHashingBusyException(Exception):
+    """There are too many password hashing jobs waiting to be run."""
+    pass
+
+
+class PasswordHashingTimeoutException(Exception):
+    """A password hashing job did not finish in time."""
+    pass
+
+
+class InvalidRefreshTokenException(Exception):
+    """The refresh token does not exist, has expired, has been used or has been revoked."""
+    pass
+
+
+class ServiceAccountAlreadyExistsException(Exception):
+    """A service account with the same client id already exists."""
+    pass
+
+
+class ServiceAccountDoesNotExistException(Exception):
+    """A service account with a given client id does not exist."""
+    pass
+
+
+class LoginThrottledException(Exception):
+    """There have been too many login attempts of the account or the client.
+
+    :param retry_after: seconds to wait before trying again
+    :type retry_after: float
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
@@ -0,0 +1,185 @@
+"""Module for running password hashing out of the event loop.
+
+Hashing algorithms such as bcrypt are CPU bound on purpose, a single call takes
+hundreds of milliseconds. Running them inside a coroutine blocks every other
+request served by the same worker, so they are sent to a bounded pool of
+processes (or threads) and awaited.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Union
+
+from identity import config
+from identity.services.exceptions import PasswordHashingBusyException, PasswordHashingTimeoutException
+
+
+class TimingStats:
+    """Accumulates durations in seconds
+
+    :param count: number of durations recorded
+    :type count: int
+    :param total: sum of all durations recorded
+    :type total: float
+    :param max: longest duration recorded
+    :type max: float
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_seconds": self.total / self.count if self.count else 0.0,
+            "max_seconds": self.max,
+        }
+
+
+class HashingMetrics:
+    """Counters and timings of the jobs run by a :class:`HashingExecutor`"""
+
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.queue_wait = TimingStats()
+        self.hash_time = TimingStats()
+
+    def snapshot(self) -> dict:
+        return {
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "queue_wait": self.queue_wait.snapshot(),
+            "hash_time": self.hash_time.snapshot(),
+        }
+
+
+def _timed(func: Callable, *args):
+    """Runs the function in the worker and returns when it started and finished.
+
+    `time.monotonic` is system wide on the platforms we deploy to,
+    so the values can be compared with the ones taken by the parent process.
+    """
+    started = time.monotonic()
+    result = func(*args)
+    return result, started, time.monotonic()
+
+
+class HashingExecutor:
+    """Runs hashing functions in a pool and awaits them without blocking the event loop
+
+    :param kind: `process` (default) or `thread`
+    :type kind: str
+    :param workers: number of workers of the pool, by default one per CPU
+    :type workers: int, optional
+    :param max_pending: maximum number of jobs queued or running. Further jobs are rejected.
+    :type max_pending: int
+    :param timeout: seconds to wait for a job before giving up, `None` waits forever.
+    :type timeout: float, optional
+    """
+
+    def __init__(self, kind: str = "process", workers: Union[int, None] = None,
+                 max_pending: int = 64, timeout: Union[float, None] = 5.0):
+        workers = workers or os.cpu_count() or 1
+        if kind == "process":
+            self._executor: Executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        else:
+            raise ValueError(f"Unknown hashing executor kind: {kind!r}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.metrics = HashingMetrics()
+        self._lock = threading.Lock()
+
+    async def run(self, func: Callable, *args, timeout: Union[float, None] = None):
+        """Runs `func(*args)` in the pool and returns its result
+
+        :param func: function to run, it must be picklable for process pools.
+        :type func: Callable
+        :param timeout: seconds to wait for this job, defaults to the timeout of the executor.
+        :type timeout: float, optional
+        :raises PasswordHashingBusyException: if there are `max_pending` jobs already.
+        :raises PasswordHashingTimeoutException: if the job does not finish in time.
+        :return: the value returned by `func`
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.metrics.rejected += 1
+                raise PasswordHashingBusyException()
+            self.pending += 1
+        if timeout is None:
+            timeout = self.timeout
+
+        submitted = time.monotonic()
+        try:
+            job = self._executor.submit(_timed, func, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # The slot is released when the job really ends, not when the caller stops
+        # waiting for it, so timed out jobs still count against the queue depth.
+        job.add_done_callback(self._release)
+        try:
+            result, started, finished = await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise PasswordHashingTimeoutException()
+        except Exception:
+            self.metrics.failed += 1
+            raise
+        self.metrics.completed += 1
+        self.metrics.queue_wait.record(max(started - submitted, 0.0))
+        self.metrics.hash_time.record(finished - started)
+        return result
+
+    def _release(self, _job):
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_hashing_executor: Union[HashingExecutor, None] = None
+
+
+def get_hashing_executor() -> HashingExecutor:
+    """Returns the executor shared by the process, it is created on first use from the settings"""
+    global _hashing_executor
+    if _hashing_executor is None:
+        _hashing_executor = HashingExecutor(
+            kind=config.get_password_hash_executor(),
+            workers=config.get_password_hash_workers(),
+            max_pending=config.get_password_hash_max_pending(),
+            timeout=config.get_password_hash_timeout_seconds(),
+        )
+    return _hashing_executor
+
+
+def set_hashing_executor(executor: Union[HashingExecutor, None]):
+    """Replaces the executor shared by the process, the previous one is shut down."""
+    global _hashing_executor
+    if _hashing_executor is not None and _hashing_executor is not executor:
+        _hashing_executor.shutdown(wait=False)
+    _hashing_executor = executor
+
+
+def shutdown_hashing_executor():
+    set_hashing_executor(None)
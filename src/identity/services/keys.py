@@ -0,0 +1,164 @@
+"""Module with the keys used to sign access tokens with asymmetric algorithms.
+
+Tokens are signed by the active key of a key ring and carry its id in the `kid`
+header. The public part of every key of the ring is published as a JWK Set, so
+other services can verify tokens without calling this one.
+
+Keys are rotated in three steps:
+
+1. Add the new key to the keys directory. It is published but not used yet.
+2. Once the caches of the JWK Set have expired, make it the active key.
+3. Once the tokens signed by the previous key have expired, remove it.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Union
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+from jose.backends.base import Key
+from jose.constants import ALGORITHMS
+from jose.exceptions import JWTError
+
+from identity import config
+
+ASYMMETRIC_ALGORITHMS = ALGORITHMS.RSA_DS | ALGORITHMS.EC_DS
+
+_CURVES = {ALGORITHMS.ES256: ec.SECP256R1, ALGORITHMS.ES384: ec.SECP384R1, ALGORITHMS.ES512: ec.SECP521R1}
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    """A key of the ring
+
+    :param kid: id of the key, sent in the `kid` header of the tokens
+    :type kid: str
+    :param algorithm: algorithm of the tokens signed with the key, e.g. `RS256`
+    :type algorithm: str
+    :param public_key: key that verifies the signatures
+    :type public_key: Key
+    :param private_key: key that signs tokens, `None` for retiring keys known by their public part only
+    :type private_key: Union[Key, None]
+    """
+    kid: str
+    algorithm: str
+    public_key: Key
+    private_key: Union[Key, None] = None
+
+    def to_jwk(self) -> dict:
+        """Returns the public part of the key as a JWK"""
+        return {**self.public_key.to_dict(), "kid": self.kid, "use": "sig"}
+
+
+class KeyRing:
+    """Keys that verify access tokens, one of them signs the new ones
+
+    :param keys: keys of the ring
+    :type keys: List[SigningKey]
+    :param active_kid: id of the key that signs new tokens, it must have a private key.
+    :type active_kid: str
+    :raises ValueError: if there is no active key
+    """
+
+    def __init__(self, keys: List[SigningKey], active_kid: str):
+        self.keys: Dict[str, SigningKey] = {key.kid: key for key in keys}
+        active = self.keys.get(active_kid)
+        if active is None or active.private_key is None:
+            raise ValueError(f"The active key {active_kid!r} is not a private key of the ring")
+        self.active = active
+        self._jwks = {"keys": [key.to_jwk() for key in self.keys.values()]}
+
+    def get(self, kid: Union[str, None]) -> SigningKey:
+        """Returns the key with the given id
+
+        :raises JWTError: if the ring has no such key
+        """
+        key = self.keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key: {kid!r}")
+        return key
+
+    def jwks(self) -> dict:
+        """Returns the public keys as a JWK Set"""
+        return self._jwks
+
+
+def load_key(path: str, algorithm: str) -> SigningKey:
+    """Loads a PEM file with a private or a public key, the key id is the name of the file
+
+    :param path: path of the PEM file, e.g. `keys/2023-06.pem`
+    :type path: str
+    :param algorithm: algorithm of the tokens signed with the key
+    :type algorithm: str
+    :return: the key
+    :rtype: SigningKey
+    """
+    with open(path, "rb") as pem:
+        key = jwk.construct(pem.read(), algorithm)
+    kid = os.path.splitext(os.path.basename(path))[0]
+    if key.is_public():
+        return SigningKey(kid, algorithm, key)
+    return SigningKey(kid, algorithm, key.public_key(), key)
+
+
+def load_key_ring(keys_dir: str, algorithm: str, active_kid: str) -> KeyRing:
+    """Loads all the PEM files of a directory
+
+    :param keys_dir: directory with a PEM file per key
+    :type keys_dir: str
+    :param algorithm: algorithm of the tokens, one of :data:`ASYMMETRIC_ALGORITHMS`
+    :type algorithm: str
+    :param active_kid: id of the key that signs new tokens
+    :type active_kid: str
+    :raises ValueError: if the algorithm is not asymmetric or there is no active key
+    :return: the key ring
+    :rtype: KeyRing
+    """
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(f"{algorithm} is not an asymmetric algorithm")
+    paths = sorted(os.path.join(keys_dir, name) for name in os.listdir(keys_dir) if name.endswith(".pem"))
+    return KeyRing([load_key(path, algorithm) for path in paths], active_kid)
+
+
+def generate_signing_key(keys_dir: str, kid: str, algorithm: str, rsa_key_size: int = 2048) -> str:
+    """Writes a new private key to the keys directory
+
+    :param keys_dir: directory of the key ring
+    :type keys_dir: str
+    :param kid: id of the key, it names the PEM file
+    :type kid: str
+    :param algorithm: algorithm of the tokens, one of :data:`ASYMMETRIC_ALGORITHMS`
+    :type algorithm: str
+    :param rsa_key_size: bits of RSA keys, defaults to 2048
+    :type rsa_key_size: int, optional
+    :raises FileExistsError: if there is a key with the same id
+    :return: path of the PEM file
+    :rtype: str
+    """
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(f"{algorithm} is not an asymmetric algorithm")
+    if algorithm in _CURVES:
+        private_key = ec.generate_private_key(_CURVES[algorithm]())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=rsa_key_size)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    # Only the owner can read the file
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as key_file:
+        key_file.write(pem)
+    return path
+
+
+@lru_cache
+def get_key_ring() -> Union[KeyRing, None]:
+    """Returns the key ring of the settings, `None` if tokens are signed with a shared secret"""
+    settings = config.get_jwt_settings()
+    if settings.algorithm not in ASYMMETRIC_ALGORITHMS:
+        return None
+    return load_key_ring(settings.keys_dir, settings.algorithm, settings.active_kid)
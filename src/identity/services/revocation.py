@@ -0,0 +1,199 @@
+"""Module with the per worker view of the revoked access tokens.
+
+Each worker keeps a Bloom filter with the ids (`jti`) of the revoked tokens
+that have not expired, rebuilt from the store every few seconds by a background
+task, see :meth:`RevocationList.start`. Most tokens are not in the filter and
+are accepted without querying the store, only the tokens in the filter, revoked
+ones and rare false positives, are checked.
+
+Tokens revoked by a worker are added to its filter at once. Other workers see
+them when they rebuild their filters, at most `refresh_seconds` later. The ids
+revoked since the previous rebuild are also passed to the subscribers, e.g.
+the signals of the users changed by other workers.
+"""
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Callable, List, Union
+
+from identity import config
+from identity.adapters.bloom import BloomFilter
+from identity.domain.utils import utcnow
+from identity.services.uow.users import UsersAbstractUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationStats:
+    """Counters of a :class:`RevocationList`
+
+    :param skipped: checks answered by the filter alone
+    :type skipped: int
+    :param exact_checks: checks that queried the store
+    :type exact_checks: int
+    :param false_positives: exact checks of tokens that were not revoked
+    :type false_positives: int
+    :param refreshes: number of times the filter was rebuilt
+    :type refreshes: int
+    :param failed_refreshes: rebuilds of the background task that failed
+    :type failed_refreshes: int
+    """
+
+    def __init__(self):
+        self.skipped = 0
+        self.exact_checks = 0
+        self.false_positives = 0
+        self.refreshes = 0
+        self.failed_refreshes = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class RevocationList:
+    """Checks if access tokens have been revoked, it is meant to be used from a single event loop
+
+    :param refresh_seconds: seconds between rebuilds of the filter
+    :type refresh_seconds: float
+    :param capacity: expected number of revoked tokens that have not expired
+    :type capacity: int
+    :param error_rate: false positive rate of the filter
+    :type error_rate: float
+    :param clock: function returning the current time in seconds
+    :type clock: Callable[[], float]
+    :param commit_margin_seconds: longest time between taking the time of a revocation and committing it
+    :type commit_margin_seconds: float
+    """
+
+    def __init__(self, refresh_seconds: float = 10.0, capacity: int = 100_000, error_rate: float = 0.001,
+                 clock: Callable[[], float] = time.monotonic, commit_margin_seconds: float = 60.0):
+        self.refresh_seconds = refresh_seconds
+        self.commit_margin_seconds = commit_margin_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.clock = clock
+        self.stats = RevocationStats()
+        self._filter: Union[BloomFilter, None] = None
+        self._refreshed_at = 0.0
+        self._recent = set()
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._read_at: Union[datetime, None] = None
+        self._task: Union[asyncio.Task, None] = None
+
+    def __len__(self):
+        return len(self._filter) if self._filter is not None else 0
+
+    async def is_revoked(self, jti: Union[str, None], uow: UsersAbstractUnitOfWork) -> bool:
+        """Checks if the token with the given id has been revoked
+
+        :param jti: id of the token, tokens without id cannot be revoked
+        :type jti: Union[str, None]
+        :param uow: Unit of work used to read the store if needed
+        :type uow: UsersAbstractUnitOfWork
+        :return: `True` if it has been revoked
+        :rtype: bool
+        """
+        if jti is None:
+            return False
+        await self._refresh_if_stale(uow)
+        if jti not in self._filter:
+            self.stats.skipped += 1
+            return False
+        self.stats.exact_checks += 1
+        async with uow:
+            revoked = await uow.revoked_tokens.is_revoked(jti)
+        if not revoked:
+            self.stats.false_positives += 1
+        return revoked
+
+    def add(self, jti: str):
+        """Adds a token revoked by this worker, it must already be in the store"""
+        self._recent.add(jti)
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def start(self, uow_factory: Callable[[], UsersAbstractUnitOfWork]):
+        """Rebuilds the filter in a background task every `refresh_seconds`
+
+        Requests then only read the current filter, they wait for a rebuild only
+        if there is no filter yet. Without the task the request that finds the
+        filter stale rebuilds it.
+
+        :param uow_factory: returns a new unit of work on the primary database
+        :type uow_factory: Callable[[], UsersAbstractUnitOfWork]
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever(uow_factory))
+
+    async def stop(self):
+        """Stops the background task started by :meth:`start`"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def subscribe(self, listener: Callable[[List[str]], None]):
+        """Calls `listener(ids)` after each rebuild with the ids revoked since the previous one
+
+        Ids revoked up to `commit_margin_seconds` before the previous rebuild
+        are passed again, so that those committed late are not missed. The first
+        rebuild passes all the revoked ids that have not expired.
+        """
+        self._listeners.append(listener)
+
+    async def refresh(self, uow: UsersAbstractUnitOfWork):
+        """Rebuilds the filter with the revoked tokens that have not expired"""
+        recent, self._recent = self._recent, set()
+        now = utcnow()
+        async with uow:
+            jtis = await uow.revoked_tokens.list_unexpired(now)
+            revoked = jtis
+            if self._listeners and self._read_at is not None:
+                # Revocations are committed after their time is taken, the last ones are read again
+                since = self._read_at - timedelta(seconds=self.commit_margin_seconds)
+                revoked = await uow.revoked_tokens.list_revoked_since(since, now)
+        # Tokens revoked by this worker while the store was read are kept
+        self._filter = BloomFilter.of([*jtis, *recent, *self._recent], self.capacity, self.error_rate)
+        self._refreshed_at = self.clock()
+        self._read_at = now
+        self.stats.refreshes += 1
+        for listener in self._listeners:
+            listener(revoked)
+
+    def _is_stale(self) -> bool:
+        if self._filter is None:
+            return True
+        # The background task keeps the filter fresh
+        return self._task is None and self.clock() - self._refreshed_at >= self.refresh_seconds
+
+    async def _refresh_if_stale(self, uow: UsersAbstractUnitOfWork):
+        if not self._is_stale():
+            return
+        # While a request rebuilds the filter the others keep using the previous one
+        if self._lock.locked() and self._filter is not None:
+            return
+        async with self._lock:
+            if self._is_stale():
+                await self.refresh(uow)
+
+    async def _refresh_forever(self, uow_factory: Callable[[], UsersAbstractUnitOfWork]):
+        while True:
+            try:
+                async with self._lock:
+                    await self.refresh(uow_factory())
+            except Exception:
+                self.stats.failed_refreshes += 1
+                logger.exception("The filter of revoked tokens could not be rebuilt")
+            await asyncio.sleep(self.refresh_seconds)
+
+
+revocation_list = RevocationList(
+    refresh_seconds=config.get_revocation_refresh_seconds(),
+    capacity=config.get_revocation_filter_capacity(),
+    error_rate=config.get_revocation_filter_error_rate(),
+    commit_margin_seconds=config.get_revocation_commit_margin_seconds(),
+)
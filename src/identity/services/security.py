@@ -1,30 +1,114 @@
 """Module with security functionalities."""
 
+import asyncio
+import hashlib
+import time
+import uuid
+from dataclasses import replace
 from datetime import datetime, timedelta
-from typing import Union
+from types import MappingProxyType
+from typing import List, Mapping, Tuple, Union
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from identity import config
+from identity.adapters.cache import LRUCache
 from identity.domain.users import User
+from identity.services import keys
+from identity.services.hashing import get_hashing_executor
 from identity.services.uow.users import UsersAbstractUnitOfWork
 
 
-JWT_SECRET_KEY = config.get_jwt_secret_key()
-JWT_ALGORITHM = config.get_jwt_algorithm()
-JWT_ACCESS_TOKEN_EXPIRE_MINUTES = config.get_jwt_access_tocken_expire_minutes()
+PASSWORD_HASH_SCHEMES = ("bcrypt", "argon2")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def build_crypt_context(settings: config.PasswordHashSettings) -> CryptContext:
+    """Returns the context that hashes passwords with the scheme and costs of the settings
 
-def get_password_hash(password) -> str:
-    """Hashes a plain text password to protect it"""
+    It verifies hashes of every scheme of :data:`PASSWORD_HASH_SCHEMES`, but those
+    of another scheme or of a lower cost need to be updated.
+
+    :param settings: password hash settings
+    :type settings: PasswordHashSettings
+    :raises ValueError: if the scheme is not supported
+    :return: the context
+    :rtype: CryptContext
+    """
+    if settings.scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f"{settings.scheme} is not a supported password hash scheme")
+    return CryptContext(
+        schemes=[settings.scheme, *(scheme for scheme in PASSWORD_HASH_SCHEMES if scheme != settings.scheme)],
+        default=settings.scheme,
+        deprecated="auto",
+        bcrypt__rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+        argon2__type="ID",
+        argon2__rounds=settings.argon2_time_cost,
+        argon2__min_rounds=settings.argon2_time_cost,
+        argon2__memory_cost=settings.argon2_memory_cost,
+        argon2__parallelism=settings.argon2_parallelism,
+    )
+
+
+pwd_context = build_crypt_context(config.get_password_hash_settings())
+
+
+def _hash_password(password) -> str:
     return pwd_context.hash(password)
 
 
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _check_password(plain_password, hashed_password) -> Tuple[bool, Union[str, None]]:
+    # A new hash is returned if the stored one has an old scheme or cost
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def get_password_hash(password) -> str:
+    """Hashes a plain text password to protect it.
+
+    The hash is computed by the hashing executor so the event loop is not blocked.
+    """
+    return await get_hashing_executor().run(_hash_password, password)
+
+
+async def get_password_hashes(passwords: List[str], chunk_size: int = 16) -> List[str]:
+    """Hashes many passwords in parallel using all the workers of the hashing executor.
+
+    Passwords are sent in small chunks and at most one chunk per worker is queued,
+    so hashing jobs of other requests are interleaved with them.
+
+    :param passwords: plain text passwords
+    :type passwords: List[str]
+    :param chunk_size: number of passwords hashed by each job, defaults to 16
+    :type chunk_size: int, optional
+    :return: the hashes in the same order as the passwords
+    :rtype: List[str]
+    """
+    executor = get_hashing_executor()
+    in_flight = asyncio.Semaphore(executor.workers)
+    # The timeout of the executor is meant for a single hash
+    timeout = executor.timeout * chunk_size if executor.timeout else None
+
+    async def hash_chunk(chunk):
+        async with in_flight:
+            return await executor.run(_hash_passwords, chunk, timeout=timeout)
+
+    chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    hashes = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in hashes for hashed in chunk]
+
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     """Creates an access token for a user using the data provided and valid for a period of time.
 
+    Every token gets a unique id in the `jti` claim, so it can be revoked, and the time
+    it was issued in the `iat` claim.
+    With asymmetric algorithms the token is signed by the active key of the key ring
+    and its id is sent in the `kid` header.
+
     :param data: Data that will be enconded in the token.
     :type data: dict
     :param expires_delta: _description_, defaults to None
@@ -33,29 +117,81 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     :rtype: _type_
     """
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
+        expire = now + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    to_encode.setdefault("iat", now)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    key_ring = keys.get_key_ring()
+    if key_ring is not None:
+        signing_key = key_ring.active
+        return jwt.encode(to_encode, signing_key.private_key, algorithm=signing_key.algorithm,
+                          headers={"kid": signing_key.kid})
+    settings = config.get_jwt_settings()
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 
-def _verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+verified_tokens = LRUCache(max_size=config.get_jwt_settings().verification_cache_size)
+
+
+def decode_access_token(token: str) -> Mapping:
+    """Verifies an access token and returns its claims.
+
+    Clients send the same token many times, so the verified claims are cached
+    by the digest of the token until the token expires. Tokens are verified
+    once per worker instead of once per request. With asymmetric algorithms
+    the key is picked from the key ring by the `kid` header of the token.
+
+    :param token: encoded access token
+    :type token: str
+    :raises JWTError: if the signature is not valid or the token has expired.
+    :return: read only claims of the token
+    :rtype: Mapping
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = verified_tokens.get(digest)
+    if claims is not None:
+        return claims
+    key_ring = keys.get_key_ring()
+    if key_ring is not None:
+        signing_key = key_ring.get(jwt.get_unverified_header(token).get("kid"))
+        key, algorithm = signing_key.public_key, signing_key.algorithm
+    else:
+        settings = config.get_jwt_settings()
+        key, algorithm = settings.secret_key, settings.algorithm
+    claims = MappingProxyType(jwt.decode(token, key, algorithms=[algorithm]))
+    expires_at = claims.get("exp")
+    if isinstance(expires_at, (int, float)):
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            verified_tokens.set(digest, claims, ttl=ttl)
+    return claims
+
+
+async def _verify_password(plain_password, hashed_password) -> Tuple[bool, Union[str, None]]:
+    return await get_hashing_executor().run(_check_password, plain_password, hashed_password)
 
 
 async def authenticate_user(email: str, password: str, uow: UsersAbstractUnitOfWork) -> Union[User, None]:
     """Checks if the password is correct for the given email.
     If it ok the User object is return, otherwise None.
 
+    If the hash of the password was computed with another scheme or a lower cost
+    than the current settings, it is replaced by a new one, so costs can be raised
+    without asking users to reset their passwords.
+
     :param email: email address of the user
     :type email: str
     :param password: passwor of the user in plain text
     :type password: str
     :param uow: Unit of work for users.
     :type uow: UsersAbstractUnitOfWork
+    :raises PasswordHashingBusyException:
+    :raises PasswordHashingTimeoutException:
     :return: Return the authenticated user or None, otherwise.
     :rtype: Union[User, None]
     """
@@ -63,6 +199,12 @@ async def authenticate_user(email: str, password: str, uow: UsersAbstractUnitOfW
         user = await uow.users.get_user(email)
         if not user:
             return None
-        if not _verify_password(password, user.password):
+        verified, new_hash = await _verify_password(password, user.password)
+        if not verified:
             return None
+        if new_hash is not None:
+            # Only the hash is written, the user may have been changed since it was cached
+            if await uow.users.update_password(email, user.password, new_hash):
+                user = replace(user, password=new_hash)
+            await uow.commit()
         return user
@@ -0,0 +1,199 @@
+"""Module that contains the functions for managing service accounts and issuing their access tokens.
+
+Machine clients get access tokens with the client credentials grant. Their
+secrets are random strings generated by the service, so they are checked with
+an HMAC-SHA256 keyed by `CLIENT_SECRET_KEY` instead of a slow password hash.
+
+Clients tend to ask for a token before every call. The tokens issued are
+reused for the same client, secret and scopes during the first half of their
+lifetime, so a repeated request costs an HMAC and a lookup in memory and
+clients always get tokens valid for at least half the lifetime.
+
+Disabling an account stores a signal with the revoked tokens. Every worker
+forgets the tokens it reuses for the account when its filter of revoked tokens
+is rebuilt, and reads the account before trusting a token issued to it.
+"""
+import hashlib
+import hmac
+import secrets
+import time
+from datetime import timedelta
+from typing import List, Tuple, Union
+
+from identity import config
+from identity.adapters.cache import LRUCache
+from identity.domain.service_accounts import ServiceAccount
+from identity.domain.users import UserProfile
+from identity.services.exceptions import ServiceAccountAlreadyExistsException, ServiceAccountDoesNotExistException
+from identity.services.revocation import revocation_list
+from identity.services.security import create_access_token
+from identity.services.tokens import client_change_signal, signal_client_changes
+from identity.services.uow.users import UsersAbstractUnitOfWork
+
+
+def hash_client_secret(secret: str) -> bytes:
+    """Returns the HMAC that identifies the secret of a client in the store"""
+    return hmac.new(config.get_client_secret_key().encode(), secret.encode(), hashlib.sha256).digest()
+
+
+def _new_client_tokens_cache() -> Union[LRUCache, None]:
+    max_size = config.get_client_token_cache_size()
+    if max_size <= 0:
+        return None
+    return LRUCache(max_size=max_size, ttl=config.get_jwt_settings().access_token_expire_minutes * 60 / 2)
+
+
+client_tokens = _new_client_tokens_cache()
+
+
+async def new_service_account(client_id: str, scopes: List[str],
+                              uow: UsersAbstractUnitOfWork) -> Tuple[ServiceAccount, str]:
+    """Creates a new service account with a random secret
+
+    :param client_id: id of the client. It must be unique.
+    :type client_id: str
+    :param scopes: scopes the client can be granted
+    :type scopes: List[str]
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :raises ServiceAccountAlreadyExistsException:
+    :return: the account and its secret, the secret is not stored in plain text.
+    :rtype: Tuple[ServiceAccount, str]
+    """
+    secret = secrets.token_urlsafe(32)
+    async with uow:
+        account = await uow.service_accounts.add(
+            ServiceAccount(client_id=client_id, secret_hash=hash_client_secret(secret), scopes=list(scopes))
+        )
+        if account is None:
+            raise ServiceAccountAlreadyExistsException()
+        await uow.commit()
+    return account, secret
+
+
+async def disable_service_account(client_id: str, uow: UsersAbstractUnitOfWork) -> ServiceAccount:
+    """Disables a service account so that it cannot get new tokens
+
+    The tokens already issued to the account are rejected too, the other workers
+    stop reusing them after their next rebuild of the filter of revoked tokens.
+
+    :param client_id: id of the client
+    :type client_id: str
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :raises ServiceAccountDoesNotExistException:
+    :return: the disabled account
+    :rtype: ServiceAccount
+    """
+    async with uow:
+        account = await uow.service_accounts.update_active(client_id, False)
+        if account is None:
+            raise ServiceAccountDoesNotExistException()
+        await signal_client_changes([client_id], uow)
+        await uow.commit()
+    if client_tokens is not None:
+        client_tokens.invalidate_matching(lambda key: key[0] == client_id)
+    return account
+
+
+def forget_disabled_clients(cache: LRUCache, revoked: List[str]) -> int:
+    """Removes from a cache of client tokens those of the accounts disabled by any worker
+
+    It is subscribed to the revocation list of the worker.
+
+    :param cache: cache of the tokens reused by client, secret and scopes
+    :type cache: LRUCache
+    :param revoked: ids revoked since the previous rebuild of the filter
+    :type revoked: List[str]
+    :return: number of entries removed
+    :rtype: int
+    """
+    signals = set(revoked)
+    if not signals:
+        return 0
+    return cache.invalidate_matching(lambda key: client_change_signal(key[0]) in signals)
+
+
+async def authenticate_client(client_id: str, client_secret: str,
+                              uow: UsersAbstractUnitOfWork) -> Union[ServiceAccount, None]:
+    """Checks the credentials of a client
+
+    :param client_id: id of the client
+    :type client_id: str
+    :param client_secret: secret of the client in plain text
+    :type client_secret: str
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: the account if the credentials are valid and it is active, otherwise `None`.
+    :rtype: Union[ServiceAccount, None]
+    """
+    async with uow:
+        account = await uow.service_accounts.get(client_id)
+    if account is None or not account.active:
+        return None
+    if not hmac.compare_digest(account.secret_hash, hash_client_secret(client_secret)):
+        return None
+    return account
+
+
+async def issue_client_token(client_id: str, client_secret: str, scopes: List[str],
+                             uow: UsersAbstractUnitOfWork) -> Union[Tuple[str, int], None]:
+    """Issues an access token for a service account or reuses one issued recently
+
+    :param client_id: id of the client
+    :type client_id: str
+    :param client_secret: secret of the client in plain text
+    :type client_secret: str
+    :param scopes: scopes requested, all the scopes of the account if empty
+    :type scopes: List[str]
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: the access token and the seconds until it expires, `None` if the credentials
+             are not valid or the scopes are not allowed.
+    :rtype: Union[Tuple[str, int], None]
+    """
+    secret_hash = hash_client_secret(client_secret)
+    key = (client_id, secret_hash, tuple(sorted(set(scopes))))
+
+    async def issue():
+        account = await authenticate_client(client_id, client_secret, uow)
+        if account is None or not account.allows(scopes):
+            return None
+        expires_minutes = config.get_jwt_settings().access_token_expire_minutes
+        access_token = create_access_token(
+            data={"sub": client_id, "client_id": client_id, "scopes": list(scopes or account.scopes)},
+            expires_delta=timedelta(minutes=expires_minutes),
+        )
+        return access_token, time.time() + expires_minutes * 60
+
+    if client_tokens is None:
+        issued = await issue()
+    else:
+        # Concurrent requests of the same client wait for a single token
+        issued = await client_tokens.get_or_load(key, issue)
+    if issued is None:
+        return None
+    access_token, expires_at = issued
+    return access_token, int(expires_at - time.time())
+
+
+async def service_account_user(claims, uow: UsersAbstractUnitOfWork) -> Union[UserProfile, None]:
+    """Returns the principal of an access token of a service account
+
+    The tokens are short lived and trusted until they expire, the account is only
+    read if it has been disabled recently.
+
+    :param claims: verified claims of an access token of a service account
+    :type claims: Mapping
+    :param uow: Unit of work used to read the signals and the account
+    :type uow: UsersAbstractUnitOfWork
+    :return: the principal or `None` if the account is disabled or no longer exists
+    :rtype: Union[UserProfile, None]
+    """
+    client_id = claims["client_id"]
+    if await revocation_list.is_revoked(client_change_signal(client_id), uow):
+        async with uow:
+            account = await uow.service_accounts.get(client_id)
+        if account is None or not account.active:
+            return None
+    return UserProfile(email=client_id, active=True, validated=True)
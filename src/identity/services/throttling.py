@@ -0,0 +1,92 @@
+"""Module that throttles the logins by account and by client address.
+
+Logins with a password cost a slow hash, so attempts are counted before the
+user is read or the password is hashed, and rejected once an account or a
+client address has made too many. Attempts from addresses already throttled
+do not count for the account.
+"""
+from typing import Union
+
+from identity import config
+from identity.adapters.throttling import RateLimiter, RedisFixedWindow, ShardedTokenBucket
+from identity.services.exceptions import LoginThrottledException
+
+
+class ThrottleStats:
+    """Counters of a :class:`LoginThrottle`
+
+    :param admitted: attempts admitted
+    :type admitted: int
+    :param rejected_account: attempts rejected because of their account
+    :type rejected_account: int
+    :param rejected_client: attempts rejected because of their client address
+    :type rejected_client: int
+    """
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected_account = 0
+        self.rejected_client = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class LoginThrottle:
+    """Limits the login attempts of each account and each client address
+
+    :param account_limiter: limiter of the attempts by account
+    :type account_limiter: RateLimiter
+    :param client_limiter: limiter of the attempts by client address
+    :type client_limiter: RateLimiter
+    """
+
+    def __init__(self, account_limiter: RateLimiter, client_limiter: RateLimiter):
+        self.account_limiter = account_limiter
+        self.client_limiter = client_limiter
+        self.stats = ThrottleStats()
+
+    async def check(self, username: str, client_host: str):
+        """Counts a login attempt
+
+        :param username: username of the attempt, it is not checked
+        :type username: str
+        :param client_host: address of the client
+        :type client_host: str
+        :raises LoginThrottledException: if the attempt is rejected
+        """
+        retry_after = await self.client_limiter.acquire(f"client:{client_host}")
+        if retry_after:
+            self.stats.rejected_client += 1
+            raise LoginThrottledException(retry_after)
+        # Emails differing in case are counted together
+        retry_after = await self.account_limiter.acquire(f"account:{username.lower()}")
+        if retry_after:
+            self.stats.rejected_account += 1
+            raise LoginThrottledException(retry_after)
+        self.stats.admitted += 1
+
+
+def build_login_throttle() -> Union[LoginThrottle, None]:
+    """Returns the throttle of the settings, `None` if logins are not throttled"""
+    backend = config.get_login_throttle_backend()
+    period_seconds = config.get_login_throttle_period_seconds()
+    account_attempts = config.get_login_throttle_account_attempts()
+    client_attempts = config.get_login_throttle_client_attempts()
+    if backend == "none":
+        return None
+    if backend == "redis":
+        url = config.get_login_throttle_redis_url()
+        return LoginThrottle(
+            RedisFixedWindow.from_url(url, account_attempts, period_seconds, prefix="throttle:login"),
+            RedisFixedWindow.from_url(url, client_attempts, period_seconds, prefix="throttle:login"),
+        )
+    if backend == "memory":
+        return LoginThrottle(
+            ShardedTokenBucket(account_attempts, period_seconds),
+            ShardedTokenBucket(client_attempts, period_seconds),
+        )
+    raise ValueError(f"{backend} is not a login throttle backend")
+
+
+login_throttle = build_login_throttle()
@@ -0,0 +1,283 @@
+"""Module that contains the functions for issuing and renewing refresh tokens.
+
+Refresh tokens are random strings, only their SHA-256 digest is stored.
+Renewing an access token takes one update of the token by its digest and a
+signature, passwords are not hashed again.
+
+In stateless mode (`JWT_STATELESS_AUTH_SECONDS`) access tokens also carry the
+state of the user, which is trusted for a few seconds after the token is issued
+instead of reading the user. When the state of a user changes a signal is
+stored with the revoked tokens, so every worker reads the user again, at most
+`REVOCATION_REFRESH_SECONDS` later. The signals are also stored when users are
+cached, so the other workers forget their copies of the user at that time too.
+"""
+import hashlib
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Iterable, List, Mapping, Tuple, Union
+
+from jose import JWTError
+
+from identity import config
+from identity.adapters.cache import LRUCache
+from identity.adapters.repositories.users import UsersCachedRepository
+from identity.domain.tokens import RefreshToken
+from identity.domain.users import User, UserProfile
+from identity.domain.utils import utcnow
+from identity.services.exceptions import InvalidRefreshTokenException, UserDoesNotExistException
+from identity.services.revocation import revocation_list
+from identity.services.security import decode_access_token
+from identity.services.uow.users import UsersAbstractUnitOfWork
+
+
+def hash_refresh_token(token: str) -> bytes:
+    """Returns the digest that identifies a refresh token in the store"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _new_refresh_token(email: str, scopes: List[str], family_id: str) -> Tuple[str, RefreshToken]:
+    token = secrets.token_urlsafe(32)
+    now = utcnow()
+    stored = RefreshToken(
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        email=email,
+        scopes=list(scopes),
+        created_at=now,
+        expires_at=now + timedelta(days=config.get_jwt_settings().refresh_token_expire_days),
+    )
+    return token, stored
+
+
+async def issue_refresh_token(email: str, scopes: List[str], uow: UsersAbstractUnitOfWork) -> str:
+    """Issues the first refresh token of a new family, e.g. after checking a password
+
+    :param email: email of the user
+    :type email: str
+    :param scopes: scopes granted to the access tokens
+    :type scopes: List[str]
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: the refresh token, it is not stored in plain text.
+    :rtype: str
+    """
+    token, stored = _new_refresh_token(email, scopes, uuid.uuid4().hex)
+    async with uow:
+        await uow.refresh_tokens.add(stored)
+        await uow.commit()
+    return token
+
+
+async def rotate_refresh_token(token: str, uow: UsersAbstractUnitOfWork) -> Tuple[str, RefreshToken]:
+    """Exchanges a refresh token for a new one of the same family
+
+    A token can be exchanged only once. If a used token is presented again,
+    it may have been stolen, so the whole family is revoked, including the
+    token that replaced it.
+
+    :param token: refresh token
+    :type token: str
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :raises InvalidRefreshTokenException: if the token does not exist, has expired,
+                                          has been used or has been revoked.
+    :return: the new refresh token and the token exchanged
+    :rtype: Tuple[str, RefreshToken]
+    """
+    token_hash = hash_refresh_token(token)
+    async with uow:
+        used = await uow.refresh_tokens.use(token_hash, utcnow())
+        if used is None:
+            known = await uow.refresh_tokens.get(token_hash)
+            if known is not None and known.is_reused():
+                await uow.refresh_tokens.revoke_family(known.family_id, utcnow())
+                await uow.commit()
+            raise InvalidRefreshTokenException()
+        new_token, stored = _new_refresh_token(used.email, used.scopes, used.family_id)
+        await uow.refresh_tokens.add(stored)
+        await uow.commit()
+    return new_token, used
+
+
+async def revoke_token(token: str, uow: UsersAbstractUnitOfWork) -> bool:
+    """Revokes an access token or the family of a refresh token, e.g. when the user logs out
+
+    Revoked access tokens are added to the filter of this worker at once,
+    the other workers see them when they rebuild their filters.
+
+    :param token: access token or refresh token
+    :type token: str
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: `False` if the token is not valid or cannot be revoked
+    :rtype: bool
+    """
+    now = utcnow()
+    try:
+        claims = decode_access_token(token)
+    except JWTError:
+        async with uow:
+            known = await uow.refresh_tokens.get(hash_refresh_token(token))
+            if known is None:
+                return False
+            await uow.refresh_tokens.revoke_family(known.family_id, now)
+            await uow.commit()
+        return True
+
+    jti = claims.get("jti")
+    if jti is None:
+        return False
+    async with uow:
+        # Revocations are rare, forget the expired ones meanwhile
+        await uow.revoked_tokens.delete_expired(now)
+        await uow.revoked_tokens.add(jti, datetime.utcfromtimestamp(claims["exp"]), now)
+        await uow.commit()
+    revocation_list.add(jti)
+    return True
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def user_version(user: User) -> int:
+    """Returns the version of the user, the microseconds of its last update since the epoch"""
+    return (user.updated_at - _EPOCH) // timedelta(microseconds=1)
+
+
+def user_change_signal(email: str) -> str:
+    """Returns the id stored with the revoked tokens when the state of a user changes
+
+    It is longer than the `jti` of the access tokens, so they never collide.
+    """
+    return hashlib.sha256(f"user:{email}".encode()).hexdigest()
+
+
+def client_change_signal(client_id: str) -> str:
+    """Returns the id stored with the revoked tokens when a service account is disabled"""
+    return hashlib.sha256(f"client:{client_id}".encode()).hexdigest()
+
+
+def user_claims(user: User) -> dict:
+    """Returns the claims with the state of the user, none if the stateless mode is disabled"""
+    if not config.get_jwt_settings().stateless_auth_seconds:
+        return {}
+    return {"active": user.active, "validated": user.validated, "ver": user_version(user)}
+
+
+async def read_user_claims(email: str, uow: UsersAbstractUnitOfWork) -> dict:
+    """Reads the user and returns the claims with its state, e.g. when an access token is renewed
+
+    :param email: email of the user
+    :type email: str
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :raises UserDoesNotExistException:
+    :return: the claims, none if the stateless mode is disabled and then the user is not read.
+    :rtype: dict
+    """
+    if not config.get_jwt_settings().stateless_auth_seconds:
+        return {}
+    async with uow:
+        user = await uow.users.get_user(email)
+    if user is None:
+        raise UserDoesNotExistException()
+    return user_claims(user)
+
+
+async def trusted_user(claims: Mapping, uow: UsersAbstractUnitOfWork) -> Union[UserProfile, None]:
+    """Returns the user described by the claims of an access token, if they can be trusted
+
+    The claims are trusted for `stateless_auth_seconds` after the token is issued,
+    unless the state of the user has changed since then.
+    The profile returned has no password and its creation time is unknown.
+
+    :param claims: verified claims of an access token
+    :type claims: Mapping
+    :param uow: Unit of work used to read the signals if the filter hits
+    :type uow: UsersAbstractUnitOfWork
+    :return: the profile of the user or `None` if it has to be read
+    :rtype: Union[UserProfile, None]
+    """
+    trust_seconds = config.get_jwt_settings().stateless_auth_seconds
+    if not trust_seconds or "ver" not in claims or "iat" not in claims:
+        return None
+    if time.time() - claims["iat"] >= trust_seconds:
+        return None
+    if await revocation_list.is_revoked(user_change_signal(claims["sub"]), uow):
+        return None
+    updated_at = _EPOCH + timedelta(microseconds=claims["ver"])
+    return UserProfile(email=claims["sub"], created_at=updated_at, updated_at=updated_at,
+                       active=claims["active"], validated=claims["validated"])
+
+
+async def signal_user_changes(emails: Iterable[str], uow: UsersAbstractUnitOfWork):
+    """Stops trusting the claims of the tokens issued to the users before now
+
+    It must be called in the transaction that changes the users, it does nothing
+    if the stateless mode and the cache of users are disabled. Signals are kept
+    while there may be tokens whose claims are trusted, and until every worker
+    has rebuilt its filter and forgotten its cached copies of the users.
+
+    :param emails: emails of the users changed
+    :type emails: Iterable[str]
+    :param uow: Unit of work of the change, it is not committed. The signals
+                are added to the filter of the worker once it is.
+    :type uow: UsersAbstractUnitOfWork
+    """
+    keep_seconds = config.get_jwt_settings().stateless_auth_seconds
+    if config.get_user_cache_max_size() > 0:
+        # Until every worker rebuilds its filter after the change is committed
+        keep_seconds = max(keep_seconds, config.get_revocation_commit_margin_seconds()
+                           + 2 * config.get_revocation_refresh_seconds())
+    if not keep_seconds:
+        return
+    await _add_signals([user_change_signal(email) for email in emails], keep_seconds, uow)
+
+
+async def signal_client_changes(client_ids: Iterable[str], uow: UsersAbstractUnitOfWork):
+    """Stops trusting the access tokens issued to the service accounts before now
+
+    It must be called in the transaction that disables the accounts. Signals are
+    kept until the tokens issued before them expire.
+
+    :param client_ids: ids of the service accounts changed
+    :type client_ids: Iterable[str]
+    :param uow: Unit of work of the change, it is not committed. The signals
+                are added to the filter of the worker once it is.
+    :type uow: UsersAbstractUnitOfWork
+    """
+    keep_seconds = config.get_jwt_settings().access_token_expire_minutes * 60
+    await _add_signals([client_change_signal(client_id) for client_id in client_ids], keep_seconds, uow)
+
+
+async def _add_signals(signals: List[str], keep_seconds: float, uow: UsersAbstractUnitOfWork):
+    now = utcnow()
+    await uow.revoked_tokens.add_many(signals, now + timedelta(seconds=keep_seconds), now)
+    # The filter of this worker only learns the signals once they are in the store
+    uow.on_commit(partial(_add_to_revocation_list, signals))
+
+
+def _add_to_revocation_list(jtis: List[str]):
+    for jti in jtis:
+        revocation_list.add(jti)
+
+
+def forget_changed_users(cache: LRUCache, revoked: List[str]) -> int:
+    """Removes from a cache of users those changed by any worker, given the ids revoked recently
+
+    It is subscribed to the revocation list of the worker.
+
+    :param cache: cache of users by email
+    :type cache: LRUCache
+    :param revoked: ids revoked since the previous rebuild of the filter
+    :type revoked: List[str]
+    :return: number of entries removed
+    :rtype: int
+    """
+    signals = set(revoked)
+    if not signals:
+        return 0
+    return UsersCachedRepository.invalidate_emails(cache, lambda email: user_change_signal(email) in signals)
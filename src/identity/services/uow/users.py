@@ -1,8 +1,25 @@
 """This moldule provides clases following the Unit of Work Pattern.
 This units of work are transactions for managing users."""
 import abc
+from typing import Callable, List, Union
 
-from identity.adapters.repositories.users import UsersAbstractRepository, UsersSqlAlchemyRepository
+from identity.adapters.cache import LRUCache
+from identity.adapters.db.replicas import Replica, ReplicaRouter
+from identity.adapters.repositories.service_accounts import (
+    ServiceAccountsAbstractRepository,
+    ServiceAccountsSqlAlchemyRepository,
+)
+from identity.adapters.repositories.tokens import (
+    RefreshTokensAbstractRepository,
+    RefreshTokensSqlAlchemyRepository,
+    RevokedTokensAbstractRepository,
+    RevokedTokensSqlAlchemyRepository,
+)
+from identity.adapters.repositories.users import (
+    UsersAbstractRepository,
+    UsersCachedRepository,
+    UsersSqlAlchemyRepository,
+)
 
 
 class UsersAbstractUnitOfWork(abc.ABC):
@@ -13,12 +30,53 @@ class UsersAbstractUnitOfWork(abc.ABC):
     Client must call manually to the :func:`commit` method before
     exit from the context, otherwise, the :func:`rollback` will take effect.
 
+    Transactions that only read are entered with :func:`read_only`.
+    Work that must only happen if the transaction is committed, e.g. updating
+    the state of the worker, is registered with :func:`on_commit`.
+
     :param users: repository for managing serialization of users
     :type users: class:`identity.adapters.repositories.users.UsersAbstractRepository`
+    :param refresh_tokens: repository for managing the refresh tokens of the users
+    :type refresh_tokens: class:`identity.adapters.repositories.tokens.RefreshTokensAbstractRepository`
+    :param revoked_tokens: repository for managing the ids of revoked access tokens
+    :type revoked_tokens: class:`identity.adapters.repositories.tokens.RevokedTokensAbstractRepository`
+    :param service_accounts: repository for managing the accounts of machine clients
+    :type service_accounts: class:`identity.adapters.repositories.service_accounts.ServiceAccountsAbstractRepository`
     """
     users: UsersAbstractRepository
+    refresh_tokens: RefreshTokensAbstractRepository
+    revoked_tokens: RevokedTokensAbstractRepository
+    service_accounts: ServiceAccountsAbstractRepository
+    _read_only = False
+    _read_key = None
+    _commit_callbacks: List[Callable[[], None]]
+
+    def read_only(self, key: Union[str, None] = None) -> "UsersAbstractUnitOfWork":
+        """Declares that the next transaction only reads, so it may run on a replica
+
+        It is used as `async with uow.read_only(email):`.
+
+        :param key: email of the user read, `None` for listings. Recent changes of the
+                    worker to that user, or to any user for listings, are read from the primary.
+        :type key: Union[str, None]
+        :return: the unit of work
+        :rtype: UsersAbstractUnitOfWork
+        """
+        self._read_only = True
+        self._read_key = key
+        return self
+
+    def on_commit(self, callback: Callable[[], None]):
+        """Calls `callback()` after the current transaction is committed, it is dropped on rollback
+
+        :param callback: function without arguments
+        :type callback: Callable[[], None]
+        """
+        self._commit_callbacks.append(callback)
 
     async def __aexit__(self, *args):
+        self._read_only = False
+        self._read_key = None
         await self.rollback()
 
     @abc.abstractmethod
@@ -31,23 +89,79 @@ class UsersAbstractUnitOfWork(abc.ABC):
         """Method for undoing the changes"""
         pass
 
+    def _committed(self):
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _rolled_back(self):
+        self._commit_callbacks = []
+
 
 class UsersSqlAlchemyUnitOfWork(UsersAbstractUnitOfWork):
-    """Unit of work for making transaction with users in a database using sqlalchemy"""
+    """Unit of work for making transaction with users in a database using sqlalchemy
+
+    A new session is taken from `session_factory` each time the context is entered,
+    so an instance must not be shared by concurrent tasks.
+    Use one unit of work per request instead.
 
-    def __init__(self, session_factory):
-        self.session = session_factory()
+    :param session_factory: callable that returns a new `AsyncSession`
+    :type session_factory: class:`sqlalchemy.ext.asyncio.async_sessionmaker`
+    :param cache: optional cache of users by email shared by the units of work
+    :type cache: class:`identity.adapters.cache.LRUCache`, optional
+    :param approximate_counts: estimate the total of paginated listings from database statistics
+    :type approximate_counts: bool
+    :param replicas: optional router of the read-only transactions to the replicas,
+                     the users changed by the others are pinned to the primary when committed.
+    :type replicas: class:`identity.adapters.db.replicas.ReplicaRouter`, optional
+    """
+
+    def __init__(self, session_factory, cache: Union[LRUCache, None] = None, approximate_counts: bool = False,
+                 replicas: Union[ReplicaRouter, None] = None):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.approximate_counts = approximate_counts
+        self.replicas = replicas
 
     async def __aenter__(self):
-        self.users = UsersSqlAlchemyRepository(self.session)
-        # return await super().__aenter__()
+        self.replica: Union[Replica, None] = None
+        self._commit_callbacks = []
+        connected = None
+        if self._read_only and self.replicas is not None:
+            connected = await self.replicas.connect(self._read_key)
+        if connected is not None:
+            self.replica, self.session = connected
+        else:
+            self.session = self.session_factory()
+        self._repository = UsersSqlAlchemyRepository(self.session, approximate_counts=self.approximate_counts)
+        self.users = self._repository
+        if self.cache is not None:
+            self.users = UsersCachedRepository(self.users, self.cache)
+        self.refresh_tokens = RefreshTokensSqlAlchemyRepository(self.session)
+        self.revoked_tokens = RevokedTokensSqlAlchemyRepository(self.session)
+        self.service_accounts = ServiceAccountsSqlAlchemyRepository(self.session)
+        return self
 
     async def __aexit__(self, *args):
-        await super().__aexit__(*args)
-        await self.session.close()
+        try:
+            await super().__aexit__(*args)
+            await self.session.close()
+        finally:
+            if self.replica is not None:
+                self.replicas.release(self.replica)
 
     async def commit(self):
         await self.session.commit()
+        if self.replicas is not None:
+            self.replicas.pin(self._repository.changed)
+        self._invalidate_cache()
+        self._committed()
 
     async def rollback(self):
+        self._rolled_back()
         await self.session.rollback()
+        self._invalidate_cache()
+
+    def _invalidate_cache(self):
+        if isinstance(self.users, UsersCachedRepository):
+            self.users.invalidate_changes()
@@ -2,14 +2,34 @@
 
 .. note::
    The are async methods to increase performance in IO blocking situations.
+
+Functions that only read enter the unit of work with `uow.read_only()`, so
+they may run on a read replica.
 """
-from typing import List
-from pydantic.error_wrappers import ValidationError
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Tuple, Union
 
-from identity.domain.users import User
-from identity.domain.pagination import Page
-from identity.services.exceptions import InvalidEmailFormatException, UserAlreadyExistsException, UserDoesNotExistException
-from identity.services.security import get_password_hash
+from identity.domain.users import (
+    RejectedUserRow,
+    User,
+    UserFilter,
+    UserProfile,
+    UserImportReport,
+    UsersLookup,
+    UserStats,
+    UserUpdateOutcome,
+    validate_email,
+)
+from identity.domain.pagination import Page, decode_cursor
+from identity.services.exceptions import (
+    InvalidCursorException,
+    InvalidEmailFormatException,
+    InvalidUserSelectionException,
+    UserAlreadyExistsException,
+    UserDoesNotExistException,
+)
+from identity.services.security import get_password_hash, get_password_hashes
+from identity.services.tokens import signal_user_changes
 from identity.services.uow.users import UsersAbstractUnitOfWork
 
 
@@ -24,24 +44,99 @@ async def new_user(email: str, plain_password: str, uow: UsersAbstractUnitOfWork
     :type uow: UsersAbstractUnitOfWork
     :raises InvalidEmailFormatException:
     :raises UserAlreadyExistsException:
+    :raises PasswordHashingBusyException:
+    :raises PasswordHashingTimeoutException:
     :return: a User object.
     :rtype: User
     """
     try:
-        hashed_password = get_password_hash(plain_password)
-        new_user_param = User(email=email, password=hashed_password)
-    except ValidationError as ve:
+        email = validate_email(email)
+    except ValueError:
         raise InvalidEmailFormatException()
+    new_user_param = User(email=email, password=await get_password_hash(plain_password))
 
     async with uow:
-        if await uow.users.get_user(email) is not None:
-            raise UserAlreadyExistsException()
-
         new_user = await uow.users.add_user(new_user_param)
+        if new_user is None:
+            raise UserAlreadyExistsException()
         await uow.commit()
     return new_user
 
 
+async def bulk_new_users(rows: Union[Iterable[Tuple[Union[str, None], Union[str, None]]],
+                                     AsyncIterable[Tuple[Union[str, None], Union[str, None]]]],
+                         uow: UsersAbstractUnitOfWork, batch_size: int = 1000) -> UserImportReport:
+    """Creates many users at once
+
+    Passwords of each batch are hashed in parallel by all the hashing workers
+    and the batch is inserted with a single statement and committed.
+    Invalid rows, emails repeated in `rows` and emails already registered are reported
+    instead of failing the import.
+
+    :param rows: email and password in plain text of each user, an async iterable
+                 is read as the batches are inserted, e.g. a request body being received
+    :type rows: Union[Iterable[Tuple[Union[str, None], Union[str, None]]], AsyncIterable[...]]
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param batch_size: number of users inserted at once, defaults to 1000
+    :type batch_size: int, optional
+    :raises PasswordHashingBusyException:
+    :raises PasswordHashingTimeoutException:
+    :return: number of users created, rejected rows and throughput.
+    :rtype: UserImportReport
+    """
+    started = time.perf_counter()
+    report = UserImportReport()
+    seen = set()
+    batch = []
+    row = 0
+    async for email, plain_password in _iterate(rows):
+        row += 1
+        try:
+            if not plain_password:
+                raise ValueError()
+            # The password is set once the batch has been hashed
+            user = User(email=validate_email(email), password="")
+        except ValueError:
+            report.rejected.append(RejectedUserRow(row, email, "invalid"))
+            continue
+        if user.email in seen:
+            report.rejected.append(RejectedUserRow(row, user.email, "duplicated"))
+            continue
+        seen.add(user.email)
+        batch.append((row, user, plain_password))
+        if len(batch) >= batch_size:
+            await _add_users_batch(batch, uow, report)
+            batch = []
+    if batch:
+        await _add_users_batch(batch, uow, report)
+    report.rejected.sort(key=lambda rejected: rejected.row)
+    report.elapsed_seconds = time.perf_counter() - started
+    return report
+
+
+async def _iterate(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _add_users_batch(batch: List[Tuple[int, User, str]], uow: UsersAbstractUnitOfWork,
+                           report: UserImportReport):
+    hashed_passwords = await get_password_hashes([plain_password for _, _, plain_password in batch])
+    for (_, user, _), hashed_password in zip(batch, hashed_passwords):
+        user.password = hashed_password
+    async with uow:
+        existing = await uow.users.bulk_add_users([user for _, user, _ in batch])
+        await uow.commit()
+    report.created += len(batch) - len(existing)
+    report.rejected.extend(RejectedUserRow(row, user.email, "already_exists")
+                           for row, user, _ in batch if user.email in existing)
+
+
 async def get_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     """Gets a user by email
 
@@ -53,27 +148,66 @@ async def get_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     :return: a User object.
     :rtype: User
     """
-    async with uow:
+    async with uow.read_only(email):
         user = await uow.users.get_user(email)
         if user is None:
             raise UserDoesNotExistException()
         return user
 
 
-async def list_users(uow: UsersAbstractUnitOfWork) -> List[User]:
+async def get_users(emails: List[str], uow: UsersAbstractUnitOfWork) -> UsersLookup:
+    """Gets many users by email with a single query
+
+    :param emails: emails of the users you want to get, repeated ones are returned once.
+    :type emails: List[str]
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: the users found in the order requested and the emails not found.
+    :rtype: UsersLookup
+    """
+    emails = list(dict.fromkeys(emails))
+    async with uow.read_only():
+        users = {user.email: user for user in await uow.users.get_users(emails)}
+    lookup = UsersLookup()
+    for email in emails:
+        if email in users:
+            lookup.users.append(users[email])
+        else:
+            lookup.missing.append(email)
+    return lookup
+
+
+async def list_users(uow: UsersAbstractUnitOfWork) -> List[UserProfile]:
     """Returns a list with all users
 
     :param uow: Unit of work for users.
     :type uow: UsersAbstractUnitOfWork
-    :return: returns a list with all users.
-    :rtype: List[User]
+    :return: returns a list with the profiles of all users.
+    :rtype: List[UserProfile]
     """
-    async with uow:
+    async with uow.read_only():
         return await uow.users.list_users()
 
 
-async def list_paginated_users(uow: UsersAbstractUnitOfWork, page:int = 1, page_size:int = 100_000) -> Page[User]:
-    """_summary_
+async def stream_users(uow: UsersAbstractUnitOfWork, batch_size: int = 1000) -> AsyncIterator[UserProfile]:
+    """Iterates over all users without loading all of them in memory.
+
+    The unit of work stays open until the iteration ends.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param batch_size: number of users fetched from the database at once, defaults to 1000
+    :type batch_size: int, optional
+    :return: an async iterator of the profiles of the users
+    :rtype: AsyncIterator[UserProfile]
+    """
+    async with uow.read_only():
+        async for user in uow.users.stream_users(batch_size):
+            yield user
+
+
+async def list_paginated_users(uow: UsersAbstractUnitOfWork, page:int = 1, page_size:int = 100_000) -> Page[UserProfile]:
+    """Returns a page of users, most recently updated first.
 
     :param uow: Unit of work for users.
     :type uow: UsersAbstractUnitOfWork
@@ -81,13 +215,49 @@ async def list_paginated_users(uow: UsersAbstractUnitOfWork, page:int = 1, page_
     :type page: int, optional
     :param page_size: number of elements per page, defaults to 100_000
     :type page_size: int, optional
-    :return: A Page object with required information
-    :rtype: Page[User]
+    :return: A Page object with the profiles of the users
+    :rtype: Page[UserProfile]
     """
-    async with uow:
+    async with uow.read_only():
         return await uow.users.list_paginated_users(page, page_size)
+
+
+async def list_users_by_cursor(uow: UsersAbstractUnitOfWork, cursor: Union[str, None] = None,
+                               page_size: int = 100) -> Page[UserProfile]:
+    """Returns a page of users, most recently updated first.
+
+    Unlike :func:`list_paginated_users` every page costs the same however deep it is.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param cursor: `next_cursor` of the previous page, `None` for the first page.
+    :type cursor: str, optional
+    :param page_size: number of elements per page, defaults to 100
+    :type page_size: int, optional
+    :raises InvalidCursorException:
+    :return: A Page object with the profiles of the users and the cursor of the next page
+    :rtype: Page[UserProfile]
+    """
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise InvalidCursorException()
+    async with uow.read_only():
+        return await uow.users.list_users_by_cursor(after, page_size)
     
 
+async def get_user_stats(uow: UsersAbstractUnitOfWork) -> UserStats:
+    """Returns the number of users. It does not depend on how many users there are.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :return: the number of users, active users and validated users
+    :rtype: UserStats
+    """
+    async with uow.read_only():
+        return await uow.users.get_user_stats()
+
+
 async def validate_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     """Validates the email of a user. It is first step required to allow the user to be active.
 
@@ -100,11 +270,10 @@ async def validate_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     :rtype: User
     """
     async with uow:
-        user = await uow.users.get_user(email)
+        user = await uow.users.update_user_status(email, validated=True)
         if user is None:
             raise UserDoesNotExistException()
-        user.validate()
-        user = await uow.users.update_user(user)
+        await signal_user_changes([user.email], uow)
         await uow.commit()
         return user
 
@@ -121,11 +290,10 @@ async def enable_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     :rtype: User
     """
     async with uow:
-        user = await uow.users.get_user(email)
+        user = await uow.users.update_user_status(email, active=True)
         if user is None:
             raise UserDoesNotExistException()
-        user.enable()
-        user = await uow.users.update_user(user)
+        await signal_user_changes([user.email], uow)
         await uow.commit()
         return user
 
@@ -142,10 +310,100 @@ async def disable_user(email: str, uow: UsersAbstractUnitOfWork) -> User:
     :rtype: User
     """
     async with uow:
-        user = await uow.users.get_user(email)
+        user = await uow.users.update_user_status(email, active=False)
         if user is None:
             raise UserDoesNotExistException()
-        user.disable()
-        user = await uow.users.update_user(user)
+        await signal_user_changes([user.email], uow)
         await uow.commit()
         return user
+
+
+async def _bulk_update_status(uow: UsersAbstractUnitOfWork, emails: Union[List[str], None],
+                              user_filter: Union[UserFilter, None], batch_size: int,
+                              **status) -> List[UserUpdateOutcome]:
+    if (emails is None) == (user_filter is None) or (user_filter is not None and user_filter.is_empty()):
+        raise InvalidUserSelectionException()
+
+    outcomes = []
+    if emails is not None:
+        emails = list(dict.fromkeys(emails))
+        for start in range(0, len(emails), batch_size):
+            batch = emails[start:start + batch_size]
+            async with uow:
+                updated = {user.email for user in await uow.users.update_users_status(batch, **status)}
+                await signal_user_changes(updated, uow)
+                await uow.commit()
+            outcomes.extend(UserUpdateOutcome(email, "updated" if email in updated else "not_found")
+                            for email in batch)
+        return outcomes
+
+    while True:
+        async with uow:
+            users = await uow.users.update_filtered_users_status(user_filter, batch_size, **status)
+            await signal_user_changes([user.email for user in users], uow)
+            await uow.commit()
+        outcomes.extend(UserUpdateOutcome(user.email, "updated") for user in users)
+        if len(users) < batch_size:
+            return outcomes
+
+
+async def bulk_validate_users(uow: UsersAbstractUnitOfWork, emails: Union[List[str], None] = None,
+                              user_filter: Union[UserFilter, None] = None,
+                              batch_size: int = 1000) -> List[UserUpdateOutcome]:
+    """Validates the emails of many users. Users are given by email or selected by a filter.
+
+    Each batch is changed with a single statement and committed.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param emails: emails of the users
+    :type emails: Union[List[str], None]
+    :param user_filter: criteria to select the users, those already validated are skipped.
+    :type user_filter: Union[UserFilter, None]
+    :param batch_size: number of users changed by each statement, defaults to 1000
+    :type batch_size: int, optional
+    :raises InvalidUserSelectionException: if both or none of `emails` and `user_filter` are given.
+    :return: the outcome for each user
+    :rtype: List[UserUpdateOutcome]
+    """
+    return await _bulk_update_status(uow, emails, user_filter, batch_size, validated=True)
+
+
+async def bulk_enable_users(uow: UsersAbstractUnitOfWork, emails: Union[List[str], None] = None,
+                            user_filter: Union[UserFilter, None] = None,
+                            batch_size: int = 1000) -> List[UserUpdateOutcome]:
+    """Activates many users. Users are given by email or selected by a filter.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param emails: emails of the users
+    :type emails: Union[List[str], None]
+    :param user_filter: criteria to select the users, those already active are skipped.
+    :type user_filter: Union[UserFilter, None]
+    :param batch_size: number of users changed by each statement, defaults to 1000
+    :type batch_size: int, optional
+    :raises InvalidUserSelectionException: if both or none of `emails` and `user_filter` are given.
+    :return: the outcome for each user
+    :rtype: List[UserUpdateOutcome]
+    """
+    return await _bulk_update_status(uow, emails, user_filter, batch_size, active=True)
+
+
+async def bulk_disable_users(uow: UsersAbstractUnitOfWork, emails: Union[List[str], None] = None,
+                             user_filter: Union[UserFilter, None] = None,
+                             batch_size: int = 1000) -> List[UserUpdateOutcome]:
+    """Disables many users, e.g. all the users of an organisation.
+
+    :param uow: Unit of work for users.
+    :type uow: UsersAbstractUnitOfWork
+    :param emails: emails of the users
+    :type emails: Union[List[str], None]
+    :param user_filter: criteria to select the users, those already disabled are skipped.
+    :type user_filter: Union[UserFilter, None]
+    :param batch_size: number of users changed by each statement, defaults to 1000
+    :type batch_size: int, optional
+    :raises InvalidUserSelectionException: if both or none of `emails` and `user_filter` are given.
+    :return: the outcome for each user
+    :rtype: List[UserUpdateOutcome]
+    """
+    return await _bulk_update_status(uow, emails, user_filter, batch_size, active=False)
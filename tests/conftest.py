@@ -1,8 +1,14 @@
 import asyncio
+import os
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.sql import text
 
+# The api modules build the engine when imported, it never connects during the tests.
+for name, value in (("DB_USER", "identity"), ("DB_PASSWORD", "identity"), ("DB_DATABASE", "identity"),
+                    ("DB_HOST", "localhost"), ("DB_PORT", "5432")):
+    os.environ.setdefault(name, value)
+
 from identity.adapters.db.tables import Base
 # from identity.adapters.db.tables.users import User
 
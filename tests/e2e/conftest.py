@@ -0,0 +1,56 @@
+import asyncio
+import httpx
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from identity.adapters.db.tables import Base
+from identity.api.dependencies import get_login_throttle, get_users_uow
+from identity.api.main import app
+from identity.services import security
+from identity.services.hashing import HashingExecutor, set_hashing_executor
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+
+async def init_models(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    """A database file, so that every session gets its own connection from the pool"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'identity.db'}", connect_args={"timeout": 30})
+    asyncio.run(init_models(engine))
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def file_session_maker(file_db):
+    return async_sessionmaker(bind=file_db, expire_on_commit=False)
+
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(security, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    set_hashing_executor(HashingExecutor(kind="thread", workers=4, max_pending=1000))
+    yield
+    set_hashing_executor(None)
+
+
+@pytest.fixture
+def api_app(file_session_maker, fast_hashing):
+    app.dependency_overrides[get_users_uow] = lambda: UsersSqlAlchemyUnitOfWork(file_session_maker)
+    # Every client has the same address, tests that need throttling override it
+    app.dependency_overrides[get_login_throttle] = lambda: None
+    yield app
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client_factory(api_app):
+    def factory():
+        transport = httpx.ASGITransport(app=api_app)
+        return httpx.AsyncClient(transport=transport, base_url="http://identity")
+    return factory
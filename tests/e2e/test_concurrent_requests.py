@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from sqlalchemy import update
+
+from identity.adapters.db.tables import users as db
+
+PARALLEL_REQUESTS = 300
+
+
+def email_of(number):
+    return f"user{number}@version1.com"
+
+
+async def activate_all(session_maker):
+    async with session_maker() as session:
+        await session.execute(update(db.User).values(active=True))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_parallel_requests_do_not_interfere(client_factory, file_session_maker):
+    async with client_factory() as client:
+        async def register(number):
+            response = await client.post("/v1/users", json={"username": email_of(number), "password": f"pw{number}"})
+            assert response.status_code == 200, response.text
+            return response.json()["email"]
+
+        emails = await asyncio.gather(*(register(n) for n in range(PARALLEL_REQUESTS)))
+        assert emails == [email_of(n) for n in range(PARALLEL_REQUESTS)]
+
+        await activate_all(file_session_maker)
+
+        async def login_and_read_own_user(number):
+            response = await client.post(
+                "/v1/token", data={"username": email_of(number), "password": f"pw{number}", "scope": "me"}
+            )
+            assert response.status_code == 200, response.text
+            token = response.json()["access_token"]
+            response = await client.get(f"/v1/users/{email_of(number)}", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200, response.text
+            return response.json()["email"]
+
+        emails = await asyncio.gather(*(login_and_read_own_user(n) for n in range(PARALLEL_REQUESTS)))
+        assert emails == [email_of(n) for n in range(PARALLEL_REQUESTS)]
+
+
+
+@pytest.mark.asyncio
+async def test_parallel_duplicated_registrations_create_one_user(client_factory):
+    async with client_factory() as client:
+        async def register():
+            return await client.post("/v1/users", json={"username": email_of(0), "password": "pw"})
+
+        responses = await asyncio.gather(*(register() for _ in range(50)))
+
+    status_codes = sorted(response.status_code for response in responses)
+    assert status_codes == [200] + [409] * 49
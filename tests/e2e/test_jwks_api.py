@@ -0,0 +1,25 @@
+import pytest
+
+from identity.services import keys
+
+
+@pytest.mark.asyncio
+async def test_jwks_is_empty_with_shared_secret(client_factory):
+    async with client_factory() as client:
+        response = await client.get("/.well-known/jwks.json")
+
+    assert response.status_code == 200
+    assert response.json() == {"keys": []}
+    assert response.headers["cache-control"] == "public, max-age=300"
+
+
+@pytest.mark.asyncio
+async def test_jwks_lists_the_key_ring(client_factory, tmp_path, monkeypatch):
+    keys.generate_signing_key(str(tmp_path), "2023-06", "ES256")
+    ring = keys.load_key_ring(str(tmp_path), "ES256", "2023-06")
+    monkeypatch.setattr(keys, "get_key_ring", lambda: ring)
+
+    async with client_factory() as client:
+        response = await client.get("/.well-known/jwks.json")
+
+    assert [(key["kid"], key["kty"], key["crv"]) for key in response.json()["keys"]] == [("2023-06", "EC", "P-256")]
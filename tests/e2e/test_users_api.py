@@ -0,0 +1,250 @@
+import dataclasses
+import json
+import pytest
+from jose import jwt
+from sqlalchemy import update
+
+from identity import config
+from identity.adapters.throttling import ShardedTokenBucket
+from identity.api.dependencies import get_login_throttle
+from identity.api.routers import tokens as tokens_router
+
+from identity.adapters.db.tables import users as db
+from identity.services.security import create_access_token
+from identity.services.throttling import LoginThrottle
+
+
+async def register_users(client, count):
+    for number in range(count):
+        response = await client.post("/v1/users", json={"username": f"user{number}@version1.com", "password": "pw"})
+        assert response.status_code == 200, response.text
+
+
+async def admin_headers(session_maker, client):
+    await client.post("/v1/users", json={"username": "admin@version1.com", "password": "pw"})
+    async with session_maker() as session:
+        await session.execute(update(db.User).where(db.User.email == "admin@version1.com").values(active=True))
+        await session.commit()
+    token = create_access_token({"sub": "admin@version1.com", "scopes": ["me", "users:read", "admin"]})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.asyncio
+async def test_list_users_by_cursor(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        await register_users(client, 5)
+
+        emails, cursor = [], None
+        while True:
+            params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+            response = await client.get("/v1/users", params=params, headers=headers)
+            assert response.status_code == 200, response.text
+            page = response.json()
+            emails += [user["email"] for user in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        response = await client.get("/v1/users", headers=headers)
+        assert emails == [user["email"] for user in response.json()]
+        assert len(emails) == 6
+
+
+@pytest.mark.asyncio
+async def test_list_users_invalid_cursor(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        response = await client.get("/v1/users", params={"cursor": "nope"}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_users_as_ndjson(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        await register_users(client, 5)
+
+        response = await client.get("/v1/users", headers={**headers, "Accept": "application/x-ndjson"})
+        listed = await client.get("/v1/users", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == listed.json()
+    assert all("password" not in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_user_stats(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        await register_users(client, 2)
+        response = await client.get("/v1/users/stats", headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"total": 3, "active": 1, "validated": 0}
+
+
+@pytest.mark.asyncio
+async def test_import_users(client_factory, file_session_maker):
+    body = "email,password\nuser0@version1.com,pw\nuser1@version1.com,pw\nadmin@version1.com,pw\n"
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        response = await client.post("/v1/users:import", content=body, headers={**headers, "Content-Type": "text/csv"})
+        unsupported = await client.post("/v1/users:import", content=body,
+                                        headers={**headers, "Content-Type": "application/xml"})
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["created"] == 2
+    assert report["rejected"] == [{"row": 3, "email": "admin@version1.com", "reason": "already_exists"}]
+    assert unsupported.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_users(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        await register_users(client, 2)
+        response = await client.post("/v1/users:enable", headers=headers,
+                                     json={"emails": ["user0@version1.com", "user9@version1.com"]})
+        validated = await client.post("/v1/users:validate", headers=headers,
+                                      json={"filter": {"email_domain": "version1.com"}})
+        invalid = await client.post("/v1/users:disable", headers=headers, json={"filter": {}})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"updated": 1, "results": [{"email": "user0@version1.com", "result": "updated"},
+                                                         {"email": "user9@version1.com", "result": "not_found"}]}
+    assert validated.json()["updated"] == 3
+    assert invalid.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_batch_get_users(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        await register_users(client, 2)
+        response = await client.post("/v1/users:batchGet", headers=headers,
+                                     json={"emails": ["user1@version1.com", "user9@version1.com", "user0@version1.com"]})
+
+    assert response.status_code == 200, response.text
+    lookup = response.json()
+    assert [user["email"] for user in lookup["users"]] == ["user1@version1.com", "user0@version1.com"]
+    assert "password" not in lookup["users"][0]
+    assert lookup["missing"] == ["user9@version1.com"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_access_token(client_factory, file_session_maker):
+    async with client_factory() as client:
+        await admin_headers(file_session_maker, client)
+        login = await client.post("/v1/token", data={"username": "admin@version1.com", "password": "pw",
+                                                     "scope": "me users:read"})
+        refreshed = await client.post("/v1/token", data={"grant_type": "refresh_token", "scope": "me",
+                                                         "refresh_token": login.json()["refresh_token"]})
+        me = await client.get("/v1/users/admin@version1.com",
+                              headers={"Authorization": f"Bearer {refreshed.json()['access_token']}"})
+        reused = await client.post("/v1/token", data={"grant_type": "refresh_token",
+                                                      "refresh_token": login.json()["refresh_token"]})
+        revoked = await client.post("/v1/token", data={"grant_type": "refresh_token",
+                                                       "refresh_token": refreshed.json()["refresh_token"]})
+
+    assert login.status_code == 200, login.text
+    assert login.json()["expires_in"] == 30 * 60
+    assert refreshed.status_code == 200, refreshed.text
+    assert refreshed.json()["refresh_token"] != login.json()["refresh_token"]
+    assert me.json()["email"] == "admin@version1.com"
+    assert reused.status_code == 401
+    assert revoked.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_revoked_access_token_is_rejected(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        before = await client.get("/v1/users/admin@version1.com", headers=headers)
+        revoked = await client.post("/v1/token/revoke", data={"token": headers["Authorization"].split()[1]})
+        after = await client.get("/v1/users/admin@version1.com", headers=headers)
+
+    assert before.status_code == 200
+    assert revoked.status_code == 200
+    assert after.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stateless_auth_reads_users_that_changed(client_factory, file_session_maker, monkeypatch):
+    settings = dataclasses.replace(config.get_jwt_settings(), stateless_auth_seconds=60)
+    monkeypatch.setattr(config, "get_jwt_settings", lambda: settings)
+    async with client_factory() as client:
+        await admin_headers(file_session_maker, client)
+        login = await client.post("/v1/token", data={"username": "admin@version1.com", "password": "pw",
+                                                     "scope": "me admin"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        before = await client.get("/v1/users/admin@version1.com", headers=headers)
+        disabled = await client.post("/v1/users:disable", json={"emails": ["admin@version1.com"]}, headers=headers)
+        after = await client.get("/v1/users/admin@version1.com", headers=headers)
+
+    assert jwt.get_unverified_claims(login.json()["access_token"])["active"] is True
+    assert before.status_code == 200
+    assert disabled.status_code == 200, disabled.text
+    assert after.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_client_credentials_grant(client_factory, file_session_maker):
+    async with client_factory() as client:
+        headers = await admin_headers(file_session_maker, client)
+        created = await client.post("/v1/admin/service-accounts", json={"client_id": "billing", "scopes": ["me"]},
+                                    headers=headers)
+        credentials = {"grant_type": "client_credentials", "client_id": "billing",
+                       "client_secret": created.json()["client_secret"]}
+        issued = await client.post("/v1/token", data=credentials)
+        lookup = await client.post("/v1/users:batchGet", json={"emails": ["admin@version1.com"]},
+                                   headers={"Authorization": f"Bearer {issued.json()['access_token']}"})
+        duplicated = await client.post("/v1/admin/service-accounts", json={"client_id": "billing"}, headers=headers)
+        invalid = await client.post("/v1/token", data={**credentials, "client_secret": "wrong"})
+        disabled = await client.post("/v1/admin/service-accounts/billing/disable", headers=headers)
+        rejected = await client.post("/v1/users:batchGet", json={"emails": ["admin@version1.com"]},
+                                     headers={"Authorization": f"Bearer {issued.json()['access_token']}"})
+
+    assert created.status_code == 200, created.text
+    assert issued.status_code == 200, issued.text
+    assert issued.json()["refresh_token"] is None
+    assert lookup.status_code == 200, lookup.text
+    assert [user["email"] for user in lookup.json()["users"]] == ["admin@version1.com"]
+    assert duplicated.status_code == 409
+    assert invalid.status_code == 401
+    assert disabled.status_code == 200, disabled.text
+    assert rejected.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_login_attempts_are_throttled(api_app, client_factory, file_session_maker, mocker):
+    throttle = LoginThrottle(ShardedTokenBucket(2, 60), ShardedTokenBucket(100, 60))
+    api_app.dependency_overrides[get_login_throttle] = lambda: throttle
+    authenticate = mocker.spy(tokens_router, "authenticate_user")
+    async with client_factory() as client:
+        await admin_headers(file_session_maker, client)
+        attempts = [await client.post("/v1/token", data={"username": "admin@version1.com", "password": "wrong"})
+                    for _ in range(3)]
+
+    assert [attempt.status_code for attempt in attempts] == [401, 401, 429]
+    assert int(attempts[-1].headers["Retry-After"]) == 30
+    assert authenticate.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_forwarded_clients_are_throttled_apart(api_app, client_factory, file_session_maker, monkeypatch):
+    monkeypatch.setattr(config, "get_login_throttle_trusted_proxies", lambda: ("127.0.0.0/8",))
+    throttle = LoginThrottle(ShardedTokenBucket(100, 60), ShardedTokenBucket(2, 60))
+    api_app.dependency_overrides[get_login_throttle] = lambda: throttle
+    form = {"username": "admin@version1.com", "password": "wrong"}
+    async with client_factory() as client:
+        await admin_headers(file_session_maker, client)
+        first = [await client.post("/v1/token", data=form, headers={"X-Forwarded-For": "203.0.113.1"})
+                 for _ in range(3)]
+        second = await client.post("/v1/token", data=form, headers={"Forwarded": 'for="203.0.113.2:4711"'})
+
+    assert [attempt.status_code for attempt in first] == [401, 401, 429]
+    assert second.status_code == 401
@@ -0,0 +1,62 @@
+import asyncio
+import dataclasses
+import pytest
+from sqlalchemy import exc, text
+
+from identity import config
+from identity.adapters.db.pool import Histogram
+from identity.adapters.db.session import create_engine
+
+
+@pytest.fixture
+def small_pool_engine(tmp_path):
+    settings = dataclasses.replace(config.get_database_settings(), pool_size=1, max_overflow=0,
+                                   pool_timeout_seconds=0.2)
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", settings)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.mark.asyncio
+async def test_pool_records_checkout_waits(small_pool_engine):
+    async def hold(seconds):
+        async with small_pool_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await asyncio.sleep(seconds)
+
+    holder = asyncio.ensure_future(hold(0.05))
+    await asyncio.sleep(0.01)
+    await hold(0)
+    await holder
+
+    snapshot = small_pool_engine.pool.snapshot()
+    assert snapshot["size"] == 1
+    assert snapshot["checked_out"] == 0
+    assert snapshot["idle"] == 1
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checkout_wait"]["count"] == 2
+    assert snapshot["checkout_wait"]["buckets"]["+Inf"] == 2
+    assert snapshot["checkout_wait"]["p99_seconds"] >= 0.025
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_timeouts(small_pool_engine):
+    async with small_pool_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        with pytest.raises(exc.TimeoutError):
+            async with small_pool_engine.connect():
+                pass
+        assert small_pool_engine.pool.snapshot()["checked_out"] == 1
+
+    assert small_pool_engine.pool.metrics.timeouts == 1
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.005, 0.05, 5.0):
+        histogram.record(seconds)
+
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.75) == 0.1
+    assert histogram.quantile(1.0) == float("inf")
+    assert histogram.snapshot()["buckets"] == {"0.01": 2, "0.1": 3, "1": 3, "+Inf": 4}
@@ -0,0 +1,72 @@
+import dataclasses
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import update
+
+from identity import config
+from identity.adapters.cache import LRUCache
+from identity.adapters.db.tables import users as db
+from identity.services import security
+from identity.services.hashing import HashingExecutor, set_hashing_executor
+from identity.services.security import authenticate_user, build_crypt_context
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import disable_user, get_user
+
+
+@pytest.fixture
+def weak_hash(session_maker, init_database, monkeypatch):
+    settings = dataclasses.replace(config.get_password_hash_settings(), scheme="bcrypt", bcrypt_rounds=5)
+    monkeypatch.setattr(security, "pwd_context", build_crypt_context(settings))
+    set_hashing_executor(HashingExecutor(kind="thread", workers=1))
+    yield CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw")
+    set_hashing_executor(None)
+
+
+async def set_password(session_maker, password):
+    async with session_maker() as session:
+        await session.execute(update(db.User).where(db.User.email == "potato@version1.com").values(password=password))
+        await session.commit()
+
+
+async def stored_password(session_maker):
+    async with session_maker() as session:
+        return (await session.get(db.User, "potato@version1.com")).password
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_passwords_with_a_lower_cost(session_maker, weak_hash):
+    await set_password(session_maker, weak_hash)
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    user = await authenticate_user("potato@version1.com", "pw", uow)
+
+    stored = await stored_password(session_maker)
+    assert user.email == "potato@version1.com"
+    assert stored.startswith("$2b$05$")
+    assert user.updated_at.isoformat() == "2023-04-04T12:00:00"
+    assert await authenticate_user("potato@version1.com", "pw", uow) is not None
+    assert await stored_password(session_maker) == stored
+
+
+@pytest.mark.asyncio
+async def test_wrong_password_keeps_the_hash(session_maker, weak_hash):
+    await set_password(session_maker, weak_hash)
+
+    assert await authenticate_user("potato@version1.com", "wrong", UsersSqlAlchemyUnitOfWork(session_maker)) is None
+    assert await stored_password(session_maker) == weak_hash
+
+
+@pytest.mark.asyncio
+async def test_rehash_keeps_changes_made_by_another_worker(session_maker, weak_hash):
+    await set_password(session_maker, weak_hash)
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=LRUCache())
+    await get_user("potato@version1.com", uow)
+
+    await disable_user("potato@version1.com", UsersSqlAlchemyUnitOfWork(session_maker))
+    # The user cached by this worker is still active
+    assert await authenticate_user("potato@version1.com", "pw", uow) is not None
+
+    stored = await get_user("potato@version1.com", UsersSqlAlchemyUnitOfWork(session_maker))
+    assert stored.password.startswith("$2b$05$")
+    assert not stored.is_active()
+    assert stored.updated_at.isoformat() != "2023-04-04T12:00:00"
@@ -0,0 +1,32 @@
+import pytest
+
+from identity.domain.users import RejectedUserRow
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import bulk_new_users, get_user, get_user_stats
+
+
+@pytest.mark.asyncio
+async def test_bulk_new_users_reports_rejected_rows(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    rows = [
+        ("petete@version1.com", "pw1"),
+        ("pepita@version1.com", "pw2"),
+        ("not an email", "pw3"),
+        ("petete@version1.com", "pw4"),
+        ("pitita@version1.com", None),
+        ("patata@version1.com", "pw6"),
+    ]
+
+    report = await bulk_new_users(rows, uow, batch_size=2)
+
+    assert report.created == 2
+    assert report.rejected == [
+        RejectedUserRow(2, "pepita@version1.com", "already_exists"),
+        RejectedUserRow(3, "not an email", "invalid"),
+        RejectedUserRow(4, "petete@version1.com", "duplicated"),
+        RejectedUserRow(5, "pitita@version1.com", "invalid"),
+    ]
+    assert report.rows_per_second > 0
+    assert (await get_user_stats(uow)).total == 5
+    user = await get_user("patata@version1.com", uow)
+    assert user.password not in ("", "pw6")
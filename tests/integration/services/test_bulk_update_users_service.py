@@ -0,0 +1,65 @@
+import pytest
+
+from identity.adapters.cache import LRUCache
+from identity.domain.users import UserFilter, UserUpdateOutcome
+from identity.services.exceptions import InvalidUserSelectionException
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import bulk_disable_users, bulk_enable_users, bulk_validate_users, get_user
+
+
+@pytest.mark.asyncio
+async def test_bulk_enable_users_by_email(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    outcomes = await bulk_enable_users(uow, emails=["pepita@version1.com", "nobody@version1.com",
+                                                    "purita@version1.com", "pepita@version1.com"], batch_size=2)
+
+    assert outcomes == [
+        UserUpdateOutcome("pepita@version1.com", "updated"),
+        UserUpdateOutcome("nobody@version1.com", "not_found"),
+        UserUpdateOutcome("purita@version1.com", "updated"),
+    ]
+    assert (await get_user("pepita@version1.com", uow)).is_active()
+    assert (await get_user("purita@version1.com", uow)).is_active()
+
+
+@pytest.mark.asyncio
+async def test_bulk_validate_users_by_filter_skips_validated(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    outcomes = await bulk_validate_users(uow, user_filter=UserFilter(email_domain="version1.com"), batch_size=1)
+
+    assert outcomes == [UserUpdateOutcome("pepita@version1.com", "updated")]
+    assert (await get_user("pepita@version1.com", uow)).is_validated()
+
+
+@pytest.mark.asyncio
+async def test_bulk_disable_users_invalidates_cached_users(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=LRUCache())
+
+    assert (await get_user("potato@version1.com", uow)).is_active()
+    outcomes = await bulk_disable_users(uow, user_filter=UserFilter(active=True))
+
+    assert outcomes == [UserUpdateOutcome("potato@version1.com", "updated")]
+    assert not (await get_user("potato@version1.com", uow)).is_active()
+
+
+@pytest.mark.asyncio
+async def test_bulk_filter_does_not_match_similar_domains(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    assert await bulk_enable_users(uow, user_filter=UserFilter(email_domain="ersion1.com")) == []
+    assert await bulk_enable_users(uow, user_filter=UserFilter(email_domain="version_.com")) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("selection", [
+    {},
+    {"emails": ["pepita@version1.com"], "user_filter": UserFilter(active=False)},
+    {"user_filter": UserFilter()},
+])
+async def test_bulk_update_requires_one_selection(init_database, session_maker, selection):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    with pytest.raises(InvalidUserSelectionException):
+        await bulk_enable_users(uow, **selection)
@@ -0,0 +1,66 @@
+from functools import partial
+
+import pytest
+
+from identity.adapters.cache import LRUCache
+from identity.services.revocation import RevocationList
+from identity.services.tokens import forget_changed_users
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import disable_user, enable_user, get_user
+
+
+@pytest.mark.asyncio
+async def test_get_user_is_cached(init_database, session_maker):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+
+    await get_user("potato@version1.com", uow)
+    user = await get_user("potato@version1.com", uow)
+
+    assert user.is_active()
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_disable_user_invalidates_cached_user(init_database, session_maker):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+
+    await get_user("potato@version1.com", uow)
+    await disable_user("potato@version1.com", uow)
+    user = await get_user("potato@version1.com", uow)
+
+    assert not user.is_active()
+    assert cache.stats.invalidations >= 1
+
+
+@pytest.mark.asyncio
+async def test_cached_user_is_not_modified_by_callers(init_database, session_maker):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+
+    user = await get_user("pepita@version1.com", uow)
+    user.enable()
+
+    assert not (await get_user("pepita@version1.com", uow)).is_active()
+    assert (await enable_user("pepita@version1.com", uow)).is_active()
+    assert (await get_user("pepita@version1.com", uow)).is_active()
+
+
+@pytest.mark.asyncio
+async def test_user_changed_by_another_worker_is_forgotten(init_database, session_maker):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+    revocation_list = RevocationList(refresh_seconds=60)
+    revocation_list.subscribe(partial(forget_changed_users, cache))
+    await get_user("potato@version1.com", uow)
+    await get_user("pepita@version1.com", uow)
+    await revocation_list.refresh(uow)
+
+    await disable_user("potato@version1.com", UsersSqlAlchemyUnitOfWork(session_maker))
+    assert (await get_user("potato@version1.com", uow)).is_active()
+    await revocation_list.refresh(uow)
+
+    assert not (await get_user("potato@version1.com", uow)).is_active()
+    assert cache.stats.invalidations == 1
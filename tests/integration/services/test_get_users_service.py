@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+
+from identity.adapters.cache import LRUCache
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import disable_user, get_user, get_users
+
+
+@pytest.fixture
+def statements(in_memory_db):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            executed.append(statement)
+
+    event.listen(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.asyncio
+async def test_get_users_with_one_query(init_database, session_maker, statements):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    lookup = await get_users(["potato@version1.com", "nobody@version1.com", "pepita@version1.com",
+                              "potato@version1.com"], uow)
+
+    assert [user.email for user in lookup.users] == ["potato@version1.com", "pepita@version1.com"]
+    assert lookup.missing == ["nobody@version1.com"]
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_users_reads_only_users_not_cached(init_database, session_maker, statements):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+
+    await get_user("potato@version1.com", uow)
+    lookup = await get_users(["potato@version1.com", "purita@version1.com"], uow)
+    again = await get_users(["potato@version1.com", "purita@version1.com"], uow)
+
+    assert [user.email for user in lookup.users] == ["potato@version1.com", "purita@version1.com"]
+    assert again == lookup
+    assert len(statements) == 2
+    assert cache.stats.hits == 3
+
+
+@pytest.mark.asyncio
+async def test_get_users_does_not_read_passwords(init_database, session_maker):
+    cache = LRUCache()
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, cache=cache)
+
+    lookup = await get_users(["potato@version1.com"], uow)
+    await disable_user("potato@version1.com", uow)
+
+    assert not hasattr(lookup.users[0], "password")
+    # Profiles cached by get_users are not used to authenticate
+    assert (await get_user("potato@version1.com", uow)).password == "mypass2"
+    assert not (await get_users(["potato@version1.com"], uow)).users[0].is_active()
@@ -1,7 +1,9 @@
 import pytest
 
 from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
-from identity.services.users import list_users, list_paginated_users
+from identity.services.users import list_users, list_paginated_users, list_users_by_cursor, stream_users
+from identity.services.exceptions import InvalidCursorException
+from identity.domain.users import UserProfile
 
 @pytest.mark.asyncio
 async def test_empty_list_users_service(session_maker):
@@ -26,6 +28,12 @@ async def test_list_default_paginated_users(init_database, session_maker):
     assert page.total == 3
     assert not page.has_next
 
+@pytest.mark.asyncio
+async def test_list_paginated_users_does_not_read_passwords(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    page = await list_paginated_users(uow)
+    assert all(type(user) is UserProfile for user in page.items)
+
 @pytest.mark.asyncio
 async def test_list_paginated_users_page1_size1(init_database, session_maker):
     uow = UsersSqlAlchemyUnitOfWork(session_maker)
@@ -45,3 +53,28 @@ async def test_list_paginated_users_page3_size1(init_database, session_maker):
     assert page.page_size == 1
     assert page.total == 3
     assert not page.has_next
+
+@pytest.mark.asyncio
+async def test_list_users_by_cursor_pages_through_all_users(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    first = await list_users_by_cursor(uow, page_size=2)
+    assert [user.email for user in first.items] == ["potato@version1.com", "purita@version1.com"]
+    assert first.total is None
+    assert first.has_next
+
+    second = await list_users_by_cursor(uow, cursor=first.next_cursor, page_size=2)
+    assert [user.email for user in second.items] == ["pepita@version1.com"]
+    assert second.next_cursor is None
+    assert not second.has_next
+
+@pytest.mark.asyncio
+async def test_list_users_by_cursor_invalid_cursor(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    with pytest.raises(InvalidCursorException):
+        await list_users_by_cursor(uow, cursor="not a cursor")
+
+@pytest.mark.asyncio
+async def test_stream_users_in_small_batches(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    emails = [user.email async for user in stream_users(uow, batch_size=1)]
+    assert emails == ["potato@version1.com", "purita@version1.com", "pepita@version1.com"]
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from identity.adapters.db.replicas import Replica, ReplicaRouter
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import disable_user, get_user, list_users
+from tests.conftest import init_database_with_users, init_models
+
+
+@pytest.fixture
+def replica_session_maker(tmp_path):
+    """A replica that lags behind the primary, it has the same users before they were changed"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    asyncio.run(init_models(engine))
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(init_database_with_users(session_maker))
+    yield session_maker
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def unreachable_session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+@pytest.mark.asyncio
+async def test_reads_run_on_the_replica(init_database, session_maker, replica_session_maker):
+    router = ReplicaRouter([Replica("replica", replica_session_maker)])
+    primary_uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    await disable_user("potato@version1.com", primary_uow)
+
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, replicas=router)
+    # The change has not reached the replica and was made by another worker
+    assert (await get_user("potato@version1.com", uow)).is_active()
+    assert len(await list_users(uow)) == 3
+    assert router.replicas[0].reads == 2
+    assert router.replicas[0].in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_changes_of_the_worker_are_read_from_the_primary(init_database, session_maker,
+                                                               replica_session_maker):
+    router = ReplicaRouter([Replica("replica", replica_session_maker)], read_your_writes_seconds=60.0)
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, replicas=router)
+
+    await disable_user("potato@version1.com", uow)
+
+    assert not (await get_user("potato@version1.com", uow)).is_active()
+    assert not next(user for user in await list_users(uow) if user.email == "potato@version1.com").is_active()
+    assert router.replicas[0].reads == 0
+    assert router.stats.pinned_reads == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_never_run_on_the_replica(init_database, session_maker, replica_session_maker):
+    router = ReplicaRouter([Replica("replica", replica_session_maker)])
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, replicas=router)
+
+    await disable_user("potato@version1.com", uow)
+
+    assert not (await get_user("potato@version1.com", UsersSqlAlchemyUnitOfWork(session_maker))).is_active()
+    assert router.replicas[0].reads == 0
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back(init_database, session_maker, replica_session_maker,
+                                              unreachable_session_maker):
+    router = ReplicaRouter([Replica("down", unreachable_session_maker), Replica("up", replica_session_maker)])
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, replicas=router)
+
+    await get_user("potato@version1.com", uow)
+    await get_user("potato@version1.com", uow)
+
+    down, up = router.replicas
+    assert down.failures == 1
+    assert up.reads == 2
+
+
+@pytest.mark.asyncio
+async def test_reads_run_on_the_primary_without_healthy_replicas(init_database, session_maker,
+                                                                 unreachable_session_maker):
+    router = ReplicaRouter([Replica("down", unreachable_session_maker)])
+    uow = UsersSqlAlchemyUnitOfWork(session_maker, replicas=router)
+
+    assert (await get_user("potato@version1.com", uow)).is_active()
+    assert router.stats.fallback_reads == 1
+    assert router.replicas[0].in_use == 0
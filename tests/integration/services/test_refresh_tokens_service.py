@@ -0,0 +1,50 @@
+import pytest
+from datetime import timedelta
+from sqlalchemy import update
+
+from identity.adapters.db.tables import tokens as db_tokens
+from identity.domain.utils import utcnow
+from identity.services.exceptions import InvalidRefreshTokenException
+from identity.services.tokens import hash_refresh_token, issue_refresh_token, rotate_refresh_token
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+
+@pytest.mark.asyncio
+async def test_rotate_refresh_token(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = await issue_refresh_token("potato@version1.com", ["me"], uow)
+
+    new_token, used = await rotate_refresh_token(token, uow)
+
+    assert new_token != token
+    assert used.email == "potato@version1.com"
+    assert used.scopes == ["me"]
+    async with uow:
+        stored = await uow.refresh_tokens.get(hash_refresh_token(new_token))
+    assert stored.family_id == used.family_id
+    assert stored.used_at is None
+
+
+@pytest.mark.asyncio
+async def test_reused_refresh_token_revokes_its_family(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = await issue_refresh_token("potato@version1.com", ["me"], uow)
+    new_token, _ = await rotate_refresh_token(token, uow)
+
+    with pytest.raises(InvalidRefreshTokenException):
+        await rotate_refresh_token(token, uow)
+    with pytest.raises(InvalidRefreshTokenException):
+        await rotate_refresh_token(new_token, uow)
+
+
+@pytest.mark.asyncio
+async def test_expired_and_unknown_refresh_tokens_are_rejected(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = await issue_refresh_token("potato@version1.com", ["me"], uow)
+    async with session_maker() as session:
+        await session.execute(update(db_tokens.RefreshToken).values(expires_at=utcnow() - timedelta(seconds=1)))
+        await session.commit()
+
+    for invalid in (token, "unknown"):
+        with pytest.raises(InvalidRefreshTokenException):
+            await rotate_refresh_token(invalid, uow)
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from jose import jwt
+
+from identity.domain.utils import utcnow
+from identity.services.revocation import RevocationList
+from identity.services.security import create_access_token
+from identity.services import tokens
+from identity.services.tokens import (
+    client_change_signal,
+    issue_refresh_token,
+    revoke_token,
+    rotate_refresh_token,
+    signal_client_changes,
+)
+from identity.services.exceptions import InvalidRefreshTokenException
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+
+def jti_of(token):
+    return jwt.get_unverified_claims(token)["jti"]
+
+
+@pytest.mark.asyncio
+async def test_revoked_tokens_are_found_by_other_workers(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    revoked = create_access_token({"sub": "potato@version1.com"})
+    valid = create_access_token({"sub": "potato@version1.com"})
+    other_worker = RevocationList(refresh_seconds=60)
+
+    assert not await other_worker.is_revoked(jti_of(revoked), uow)
+    assert await revoke_token(revoked, uow)
+    await other_worker.refresh(uow)
+
+    assert await other_worker.is_revoked(jti_of(revoked), uow)
+    assert not await other_worker.is_revoked(jti_of(valid), uow)
+    assert other_worker.stats.exact_checks == 1
+    assert other_worker.stats.skipped == 2
+
+
+@pytest.mark.asyncio
+async def test_filter_is_rebuilt_when_stale(init_database, session_maker):
+    now = [0.0]
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = create_access_token({"sub": "potato@version1.com"})
+    other_worker = RevocationList(refresh_seconds=10, clock=lambda: now[0])
+
+    assert not await other_worker.is_revoked(jti_of(token), uow)
+    await revoke_token(token, uow)
+    assert not await other_worker.is_revoked(jti_of(token), uow)
+    now[0] = 10.0
+
+    assert await other_worker.is_revoked(jti_of(token), uow)
+    assert other_worker.stats.refreshes == 2
+
+
+@pytest.mark.asyncio
+async def test_revoke_refresh_token_family(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = await issue_refresh_token("potato@version1.com", ["me"], uow)
+
+    assert await revoke_token(token, uow)
+    assert not await revoke_token("unknown", uow)
+    with pytest.raises(InvalidRefreshTokenException):
+        await rotate_refresh_token(token, uow)
+
+
+@pytest.mark.asyncio
+async def test_signals_reach_the_filter_only_when_committed(init_database, session_maker, monkeypatch):
+    worker = RevocationList(refresh_seconds=60)
+    monkeypatch.setattr(tokens, "revocation_list", worker)
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    reader = UsersSqlAlchemyUnitOfWork(session_maker)
+    await worker.refresh(reader)
+
+    async with uow:
+        await signal_client_changes(["rolled-back"], uow)
+    async with uow:
+        await signal_client_changes(["committed"], uow)
+        assert not await worker.is_revoked(client_change_signal("committed"), reader)
+        await uow.commit()
+
+    assert await worker.is_revoked(client_change_signal("committed"), reader)
+    assert not await worker.is_revoked(client_change_signal("rolled-back"), reader)
+    assert worker.stats.false_positives == 0
+
+
+@pytest.mark.asyncio
+async def test_filter_is_rebuilt_by_the_background_task(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    token = create_access_token({"sub": "potato@version1.com"})
+    # Without the task every request would find the filter stale
+    worker = RevocationList(refresh_seconds=0.05, clock=lambda: 1e9)
+    worker.start(lambda: UsersSqlAlchemyUnitOfWork(session_maker))
+    try:
+        await asyncio.sleep(0.01)
+        # Requests only read the filter, they have no unit of work to rebuild it
+        assert not await worker.is_revoked(jti_of(token), None)
+        await revoke_token(token, uow)
+        for _ in range(40):
+            if await worker.is_revoked(jti_of(token), uow):
+                break
+            await asyncio.sleep(0.05)
+        assert await worker.is_revoked(jti_of(token), uow)
+    finally:
+        await worker.stop()
+
+    assert worker.stats.refreshes >= 2
+    assert worker.stats.failed_refreshes == 0
+
+
+@pytest.mark.asyncio
+async def test_revocations_committed_late_are_passed_to_subscribers(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    worker = RevocationList(refresh_seconds=10, commit_margin_seconds=60)
+    passed = []
+    worker.subscribe(passed.extend)
+    await worker.refresh(uow)
+
+    # Its time was taken 30 seconds before it was committed
+    now = utcnow()
+    async with uow:
+        await uow.revoked_tokens.add("late", now + timedelta(minutes=5), now - timedelta(seconds=30))
+        await uow.commit()
+    await worker.refresh(uow)
+
+    assert "late" in passed
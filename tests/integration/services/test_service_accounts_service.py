@@ -0,0 +1,124 @@
+from functools import partial
+
+import pytest
+from sqlalchemy import event
+
+from identity.adapters.cache import LRUCache
+from identity.services import service_accounts, tokens
+from identity.services.exceptions import ServiceAccountAlreadyExistsException
+from identity.services.revocation import RevocationList
+from identity.services.security import decode_access_token
+from identity.services.service_accounts import (
+    disable_service_account,
+    forget_disabled_clients,
+    issue_client_token,
+    new_service_account,
+    service_account_user,
+)
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+
+
+@pytest.fixture(autouse=True)
+def empty_client_tokens():
+    service_accounts.client_tokens.clear()
+
+
+@pytest.fixture(autouse=True)
+def revocation_list(monkeypatch):
+    revocation_list = RevocationList(refresh_seconds=60)
+    monkeypatch.setattr(tokens, "revocation_list", revocation_list)
+    monkeypatch.setattr(service_accounts, "revocation_list", revocation_list)
+    return revocation_list
+
+
+@pytest.fixture
+def statements(in_memory_db):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.asyncio
+async def test_client_tokens_are_reused(init_database, session_maker, statements):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    account, secret = await new_service_account("billing", ["me", "users:read"], uow)
+
+    token, expires_in = await issue_client_token("billing", secret, ["users:read"], uow)
+    statements.clear()
+    reused, _ = await issue_client_token("billing", secret, ["users:read"], uow)
+    other, _ = await issue_client_token("billing", secret, [], uow)
+
+    assert account.secret_hash != secret.encode()
+    assert reused == token
+    assert other != token
+    assert len(statements) == 1
+    assert 0 < expires_in <= 30 * 60
+    claims = decode_access_token(token)
+    assert claims["client_id"] == "billing"
+    assert claims["scopes"] == ["users:read"]
+    assert decode_access_token(other)["scopes"] == ["me", "users:read"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_client_credentials(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    _, secret = await new_service_account("billing", ["me"], uow)
+
+    assert await issue_client_token("billing", "wrong", ["me"], uow) is None
+    assert await issue_client_token("unknown", secret, ["me"], uow) is None
+    assert await issue_client_token("billing", secret, ["admin"], uow) is None
+    with pytest.raises(ServiceAccountAlreadyExistsException):
+        await new_service_account("billing", [], uow)
+
+
+@pytest.mark.asyncio
+async def test_disabled_accounts_get_no_tokens(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    _, secret = await new_service_account("billing", ["me"], uow)
+    assert await issue_client_token("billing", secret, ["me"], uow) is not None
+
+    account = await disable_service_account("billing", uow)
+
+    assert not account.active
+    assert await issue_client_token("billing", secret, ["me"], uow) is None
+
+
+@pytest.mark.asyncio
+async def test_tokens_of_disabled_accounts_are_rejected(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    _, secret = await new_service_account("billing", ["me"], uow)
+    _, other_secret = await new_service_account("reports", ["me"], uow)
+    token, _ = await issue_client_token("billing", secret, ["me"], uow)
+    other, _ = await issue_client_token("reports", other_secret, ["me"], uow)
+    assert (await service_account_user(decode_access_token(token), uow)).email == "billing"
+
+    await disable_service_account("billing", uow)
+
+    assert await service_account_user(decode_access_token(token), uow) is None
+    assert (await service_account_user(decode_access_token(other), uow)).email == "reports"
+    # Only the tokens of the disabled account are forgotten
+    reused, _ = await issue_client_token("reports", other_secret, ["me"], uow)
+    assert reused == other
+
+
+@pytest.mark.asyncio
+async def test_other_workers_forget_the_tokens_of_disabled_accounts(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    other_worker_tokens = LRUCache()
+    other_worker_revocations = RevocationList(refresh_seconds=60)
+    other_worker_revocations.subscribe(partial(forget_disabled_clients, other_worker_tokens))
+    await other_worker_revocations.refresh(uow)
+    other_worker_tokens.set(("billing", b"secret", ("me",)), ("token", 0.0))
+    other_worker_tokens.set(("reports", b"secret", ("me",)), ("token", 0.0))
+
+    await new_service_account("billing", ["me"], uow)
+    await disable_service_account("billing", uow)
+    await other_worker_revocations.refresh(uow)
+
+    assert other_worker_tokens.get(("billing", b"secret", ("me",))) is None
+    assert other_worker_tokens.get(("reports", b"secret", ("me",))) is not None
@@ -0,0 +1,85 @@
+import dataclasses
+import time
+
+import pytest
+from sqlalchemy import event
+
+from identity import config
+from identity.services import tokens
+from identity.services.revocation import RevocationList
+from identity.services.tokens import read_user_claims, trusted_user
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import bulk_disable_users, disable_user
+
+
+@pytest.fixture(autouse=True)
+def stateless_mode(monkeypatch):
+    settings = dataclasses.replace(config.get_jwt_settings(), stateless_auth_seconds=60)
+    monkeypatch.setattr(config, "get_jwt_settings", lambda: settings)
+    monkeypatch.setattr(tokens, "revocation_list", RevocationList(refresh_seconds=60))
+
+
+@pytest.fixture
+def statements(in_memory_db):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(in_memory_db.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def issued_claims(email, uow, issued_ago=0):
+    return {"sub": email, "iat": int(time.time()) - issued_ago, **await read_user_claims(email, uow)}
+
+
+@pytest.mark.asyncio
+async def test_recent_claims_are_trusted_without_reading_the_user(init_database, session_maker, statements):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    claims = await issued_claims("potato@version1.com", uow)
+    await trusted_user(claims, uow)
+    statements.clear()
+
+    user = await trusted_user(claims, uow)
+
+    assert user.email == "potato@version1.com"
+    assert user.is_active() and user.is_validated()
+    assert user.updated_at.isoformat() == "2023-04-04T12:00:00"
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_old_claims_are_not_trusted(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+
+    assert await trusted_user(await issued_claims("potato@version1.com", uow, issued_ago=60), uow) is None
+    assert await trusted_user({"sub": "potato@version1.com", "iat": int(time.time())}, uow) is None
+
+
+@pytest.mark.asyncio
+async def test_claims_are_not_trusted_after_the_user_changes(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    claims = await issued_claims("potato@version1.com", uow)
+    other_claims = await issued_claims("purita@version1.com", uow)
+
+    await disable_user("potato@version1.com", uow)
+    other_worker = RevocationList(refresh_seconds=60)
+    await other_worker.refresh(uow)
+
+    assert await trusted_user(claims, uow) is None
+    assert await trusted_user(other_claims, uow) is not None
+    assert await other_worker.is_revoked(tokens.user_change_signal("potato@version1.com"), uow)
+
+
+@pytest.mark.asyncio
+async def test_bulk_changes_are_signalled(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    claims = await issued_claims("potato@version1.com", uow)
+
+    await bulk_disable_users(uow, emails=["potato@version1.com", "nobody@version1.com"])
+    fresh_claims = await issued_claims("potato@version1.com", uow)
+
+    assert await trusted_user(claims, uow) is None
+    assert fresh_claims["active"] is False
@@ -0,0 +1,28 @@
+import pytest
+
+from identity.domain.users import UserStats
+from identity.services.uow.users import UsersSqlAlchemyUnitOfWork
+from identity.services.users import disable_user, enable_user, get_user_stats, new_user, validate_user
+
+
+@pytest.mark.asyncio
+async def test_empty_user_stats(session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    assert await get_user_stats(uow) == UserStats(total=0, active=0, validated=0)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_count_rows_inserted_outside_the_repository(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    assert await get_user_stats(uow) == UserStats(total=3, active=1, validated=2)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_follow_state_changes(init_database, session_maker):
+    uow = UsersSqlAlchemyUnitOfWork(session_maker)
+    await new_user("petete@version1.com", "pw", uow)
+    await validate_user("petete@version1.com", uow)
+    await enable_user("petete@version1.com", uow)
+    await disable_user("potato@version1.com", uow)
+
+    assert await get_user_stats(uow) == UserStats(total=4, active=1, validated=3)
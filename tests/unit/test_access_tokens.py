@@ -0,0 +1,38 @@
+from datetime import timedelta
+import pytest
+from jose import JWTError
+
+from identity.services import security
+from identity.services.security import create_access_token, decode_access_token
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    security.verified_tokens.clear()
+
+
+def test_decode_access_token_verifies_each_token_once(mocker):
+    decode = mocker.spy(security.jwt, "decode")
+    token = create_access_token({"sub": "petete@version1.com", "scopes": ["me"]})
+
+    first = decode_access_token(token)
+    second = decode_access_token(token)
+
+    assert first["sub"] == "petete@version1.com"
+    assert second == first
+    assert decode.call_count == 1
+
+
+def test_decode_access_token_does_not_cache_expired_tokens():
+    token = create_access_token({"sub": "petete@version1.com"}, expires_delta=timedelta(minutes=-1))
+
+    with pytest.raises(JWTError):
+        decode_access_token(token)
+    assert len(security.verified_tokens) == 0
+
+
+def test_decode_access_token_rejects_tampered_tokens():
+    token = create_access_token({"sub": "petete@version1.com"})
+
+    with pytest.raises(JWTError):
+        decode_access_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
@@ -0,0 +1,24 @@
+from identity.adapters.bloom import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.of((f"token{number}" for number in range(10_000)), capacity=10_000, error_rate=0.01)
+
+    assert all(f"token{number}" in bloom for number in range(10_000))
+    assert len(bloom) == 10_000
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter.of((f"token{number}" for number in range(10_000)), capacity=10_000, error_rate=0.01)
+
+    false_positives = sum(f"other{number}" in bloom for number in range(10_000))
+
+    assert false_positives < 200
+
+
+def test_bloom_filter_grows_with_the_items():
+    bloom = BloomFilter.of((f"token{number}" for number in range(100)), capacity=10)
+
+    assert bloom.capacity == 200
+    assert "token0" in bloom
+    assert "other" not in BloomFilter(capacity=10)
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+
+from identity.adapters.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock.now = 20
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats.expirations == 1
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_loaded_once():
+    cache = LRUCache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    values = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(10)))
+
+    assert values == ["value"] * 10
+    assert calls == 1
+    assert cache.stats.coalesced == 9
+    assert await cache.get_or_load("key", loader) == "value"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidated_load_is_not_stored():
+    cache = LRUCache()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        return "stale"
+
+    loading = asyncio.ensure_future(cache.get_or_load("key", loader))
+    await asyncio.sleep(0)
+    cache.invalidate("key")
+
+    assert await loading == "stale"
+    assert cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_none_is_not_stored():
+    cache = LRUCache()
+
+    async def loader():
+        return None
+
+    assert await cache.get_or_load("key", loader) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_many_misses_are_loaded_at_once():
+    cache = LRUCache()
+    cache.set("a", 1)
+    calls = []
+
+    async def loader(keys):
+        calls.append(keys)
+        await asyncio.sleep(0.01)
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    first, second = await asyncio.gather(
+        cache.get_many_or_load(["a", "b", "c", "missing", "b"], loader),
+        cache.get_many_or_load(["c", "d"], loader),
+    )
+
+    assert first == {"a": 1, "b": "B", "c": "C"}
+    assert second == {"c": "C", "d": "D"}
+    assert calls == [["b", "c", "missing"], ["d"]]
+    assert cache.stats.coalesced == 1
+    assert "missing" not in cache._entries
+
+
+def test_invalidate_matching_keys():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.set(("profile", "a"), 2)
+    cache.set("b", 3)
+
+    assert cache.invalidate_matching(lambda key: "a" in key) == 2
+    assert cache.get("b") == 3
+    assert len(cache) == 1
@@ -0,0 +1,36 @@
+import pytest
+from fastapi import Request
+
+from identity import config
+from identity.api.clients import client_address
+
+
+def request_from(peer, headers):
+    scope = {"type": "http", "client": (peer, 1234),
+             "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()]}
+    return Request(scope)
+
+
+@pytest.fixture(autouse=True)
+def trusted_proxies(monkeypatch):
+    monkeypatch.setattr(config, "get_login_throttle_trusted_proxies", lambda: ("10.0.0.0/8", "2001:db8::1"))
+
+
+def test_headers_of_untrusted_peers_are_ignored():
+    assert client_address(request_from("198.51.100.7", {"X-Forwarded-For": "203.0.113.1"})) == "198.51.100.7"
+
+
+def test_client_is_the_nearest_untrusted_address():
+    headers = {"X-Forwarded-For": "192.0.2.9, 203.0.113.1, 10.0.0.2"}
+
+    assert client_address(request_from("10.0.0.1", headers)) == "203.0.113.1"
+
+
+def test_forwarded_header_is_preferred():
+    headers = {"Forwarded": 'for=192.0.2.60;proto=https, for="[2001:db8::1]:4711"', "X-Forwarded-For": "203.0.113.1"}
+
+    assert client_address(request_from("10.0.0.1", headers)) == "192.0.2.60"
+
+
+def test_peer_is_the_client_without_headers():
+    assert client_address(request_from("10.0.0.1", {})) == "10.0.0.1"
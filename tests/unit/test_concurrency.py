@@ -0,0 +1,147 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from identity.adapters.concurrency import AdaptiveLimiter, ConcurrencyLimitExceeded
+from identity.api.concurrency import ConcurrencyLimitMiddleware, classify_route
+
+
+@pytest.mark.asyncio
+async def test_requests_over_the_limit_wait_for_a_slot():
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=1, queue_timeout=1.0)
+    await limiter.acquire()
+
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(ConcurrencyLimitExceeded):
+        await limiter.acquire()
+    limiter.release(0.01)
+    await waiting
+
+    assert limiter.in_flight == 1
+    assert limiter.stats.snapshot()["queued"] == 1
+    assert limiter.stats.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_requests_waiting_too_long_are_rejected():
+    limiter = AdaptiveLimiter(initial_limit=1, queue_timeout=0.01)
+    await limiter.acquire()
+
+    with pytest.raises(ConcurrencyLimitExceeded) as rejected:
+        await limiter.acquire()
+
+    assert rejected.value.retry_after == 1
+    assert limiter.stats.timeouts == 1
+    assert limiter.queue_size == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_handed_over_as_the_wait_times_out_is_kept(monkeypatch):
+    limiter = AdaptiveLimiter(initial_limit=1, queue_timeout=1.0)
+    await limiter.acquire()
+
+    async def hand_over_and_time_out(waiter, timeout):
+        # The slot is released in the same iteration of the loop in which the wait times out
+        limiter.release(0.01)
+        raise asyncio.TimeoutError()
+
+    monkeypatch.setattr(asyncio, "wait_for", hand_over_and_time_out)
+    await limiter.acquire()
+    monkeypatch.undo()
+    limiter.release(0.01)
+
+    assert limiter.in_flight == 0
+    assert limiter.stats.timeouts == 0
+    assert limiter.stats.admitted == 2
+    assert limiter.queue_size == 0
+
+
+def serve(limiter, latencies, clock=None, step=0.001):
+    for latency in latencies:
+        if clock is not None:
+            clock[0] += step
+        limiter.in_flight += 1
+        limiter.release(latency)
+
+
+def test_limit_follows_the_latency():
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=2, max_limit=12, clock=lambda: now[0])
+    serve(limiter, [0.1] * 100)
+    assert int(limiter.limit) == 12
+
+    serve(limiter, [1.0] * 30, clock=now, step=1.0)
+    assert limiter.limit == 2
+    assert limiter.stats.decreases > 0
+
+
+def test_limit_is_cut_once_per_interval():
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial_limit=100, min_limit=2, max_limit=100, decrease_interval=1.0,
+                              clock=lambda: now[0])
+    serve(limiter, [0.01] * 100, clock=now)
+
+    # A burst of slow requests within half a second
+    serve(limiter, [0.1] * 500, clock=now)
+
+    assert limiter.stats.decreases == 1
+    assert limiter.limit < 100
+
+
+def test_mixed_latencies_do_not_collapse_the_limit():
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial_limit=50, min_limit=2, max_limit=100, clock=lambda: now[0])
+    rng = random.Random(7)
+    # Cheap reads and slower requests of the same route class, without congestion
+    latencies = [0.0005 if rng.random() < 0.5 else rng.uniform(0.004, 0.02) for _ in range(20_000)]
+
+    serve(limiter, latencies, clock=now)
+
+    assert int(limiter.limit) == 100
+    assert limiter.stats.decreases == 0
+
+
+def test_route_classes():
+    assert classify_route("POST", "/v1/token") == "auth"
+    assert classify_route("POST", "/v1/users") == "auth"
+    assert classify_route("GET", "/v1/users") == "default"
+    assert classify_route("POST", "/v1/users:disable") == "admin"
+    assert classify_route("GET", "/v1/admin/metrics") == "admin"
+    assert classify_route("GET", "/v1/users/potato@version1.com") == "default"
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_load_with_503():
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.post("/v1/token")
+    async def slow_login():
+        await release.wait()
+        return {}
+
+    @app.get("/v1/users")
+    async def read():
+        return []
+
+    limiter = AdaptiveLimiter(initial_limit=1, max_queue=0)
+    app.add_middleware(ConcurrencyLimitMiddleware, limiters={"auth": limiter})
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://identity") as client:
+        first = asyncio.ensure_future(client.post("/v1/token"))
+        while limiter.in_flight == 0:
+            await asyncio.sleep(0.001)
+        shed = await client.post("/v1/token")
+        read = await client.get("/v1/users")
+        release.set()
+        served = await first
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert read.status_code == 200
+    assert served.status_code == 200
+    assert limiter.in_flight == 0
@@ -0,0 +1,77 @@
+import asyncio
+import time
+import pytest
+
+from identity import config
+from identity.services.hashing import HashingExecutor, get_hashing_executor, shutdown_hashing_executor
+from identity.services.exceptions import PasswordHashingBusyException, PasswordHashingTimeoutException
+
+
+def slow_upper(text, seconds=0.0):
+    time.sleep(seconds)
+    return text.upper()
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result_and_records_metrics():
+    executor = HashingExecutor(kind="thread", workers=1)
+    try:
+        assert await executor.run(slow_upper, "pass") == "PASS"
+    finally:
+        executor.shutdown()
+
+    assert executor.metrics.completed == 1
+    assert executor.metrics.hash_time.count == 1
+    assert executor.metrics.queue_wait.count == 1
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_run_rejects_jobs_when_queue_is_full():
+    executor = HashingExecutor(kind="thread", workers=1, max_pending=1)
+    try:
+        running = asyncio.ensure_future(executor.run(slow_upper, "a", 0.2))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PasswordHashingBusyException):
+            await executor.run(slow_upper, "b")
+        assert await running == "A"
+    finally:
+        executor.shutdown()
+
+    assert executor.metrics.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_run_timeout_keeps_slot_until_job_ends():
+    executor = HashingExecutor(kind="thread", workers=1, max_pending=1, timeout=0.05)
+    try:
+        with pytest.raises(PasswordHashingTimeoutException):
+            await executor.run(slow_upper, "a", 0.2)
+        assert executor.pending == 1
+        await asyncio.sleep(0.3)
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+    assert executor.metrics.timeouts == 1
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_timeout_of_zero_or_less_waits_forever(monkeypatch, value):
+    monkeypatch.setenv("PASSWORD_HASH_TIMEOUT_SECONDS", value)
+    monkeypatch.setenv("PASSWORD_HASH_EXECUTOR", "thread")
+    shutdown_hashing_executor()
+    try:
+        executor = get_hashing_executor()
+        assert executor.timeout is None
+        assert asyncio.run(executor.run(slow_upper, "pass", 0.01)) == "PASS"
+    finally:
+        shutdown_hashing_executor()
+
+    assert config.get_password_hash_timeout_seconds() is None
+    assert executor.metrics.timeouts == 0
+
+
+def test_unknown_executor_kind():
+    with pytest.raises(ValueError):
+        HashingExecutor(kind="gpu")
@@ -0,0 +1,43 @@
+import pytest
+
+from identity.adapters.importers import UsersCsvParser, iter_lines, read_users_csv, read_users_ndjson, stream_users
+
+
+def test_read_users_csv():
+    lines = ["email,password", "petete@version1.com,pw1", "pepita@version1.com,"]
+    assert list(read_users_csv(lines)) == [("petete@version1.com", "pw1"), ("pepita@version1.com", "")]
+
+
+def test_read_users_ndjson():
+    lines = [
+        '{"username": "petete@version1.com", "password": "pw1"}',
+        "",
+        "not json",
+        '{"email": "pepita@version1.com", "password": 1}',
+    ]
+    assert list(read_users_ndjson(lines)) == [
+        ("petete@version1.com", "pw1"),
+        (None, None),
+        ("pepita@version1.com", None),
+    ]
+
+
+async def _chunks(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+@pytest.mark.asyncio
+async def test_stream_users_splits_lines_across_chunks():
+    body = 'email,password\r\npetete@version1.com,"pw\n1"\r\npepita@version1.com,pw2'.encode()
+
+    for size in (1, 3, len(body)):
+        rows = [row async for row in stream_users(UsersCsvParser(), _chunks(body, size))]
+        assert rows == [("petete@version1.com", "pw\n1"), ("pepita@version1.com", "pw2")]
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_keeps_characters_split_across_chunks():
+    body = '{"email": "ñandú@version1.com"}\n{}'.encode()
+
+    assert [line async for line in iter_lines(_chunks(body, 1))] == ['{"email": "ñandú@version1.com"}\n', "{}"]
@@ -0,0 +1,57 @@
+import dataclasses
+import pytest
+from passlib.context import CryptContext
+
+from identity import config
+from identity.services.calibration import calibrate, to_environment
+from identity.services.security import build_crypt_context
+
+SETTINGS = dataclasses.replace(config.get_password_hash_settings(), scheme="bcrypt", bcrypt_rounds=5)
+
+
+def bcrypt_seconds(settings):
+    return 0.001 * 2 ** settings.bcrypt_rounds
+
+
+def test_calibrate_picks_the_highest_cost_within_the_target():
+    assert calibrate(SETTINGS, 0.25, measure=bcrypt_seconds).bcrypt_rounds == 10
+    assert calibrate(SETTINGS, 10.0, measure=bcrypt_seconds).bcrypt_rounds == 13
+    assert calibrate(SETTINGS, 0.001, measure=bcrypt_seconds).bcrypt_rounds == 10
+
+
+def test_calibrate_argon2_time_cost():
+    settings = dataclasses.replace(SETTINGS, scheme="argon2")
+
+    calibrated = calibrate(settings, 0.5, measure=lambda candidate: 0.1 * candidate.argon2_time_cost)
+
+    assert calibrated.argon2_time_cost == 5
+    assert calibrated.bcrypt_rounds == SETTINGS.bcrypt_rounds
+    assert to_environment(calibrated)["PASSWORD_ARGON2_TIME_COST"] == "5"
+
+
+def test_hashes_with_a_lower_cost_need_update():
+    context = build_crypt_context(SETTINGS)
+    weak = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw")
+
+    verified, new_hash = context.verify_and_update("pw", weak)
+
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+    assert not context.needs_update(new_hash)
+
+
+def test_unknown_scheme():
+    with pytest.raises(ValueError):
+        build_crypt_context(dataclasses.replace(SETTINGS, scheme="md5_crypt"))
+
+
+def test_bcrypt_hashes_are_replaced_by_argon2id():
+    pytest.importorskip("argon2")
+    context = build_crypt_context(dataclasses.replace(SETTINGS, scheme="argon2", argon2_time_cost=2,
+                                                      argon2_memory_cost=1024, argon2_parallelism=1))
+    bcrypt_hash = build_crypt_context(SETTINGS).hash("pw")
+
+    verified, new_hash = context.verify_and_update("pw", bcrypt_hash)
+
+    assert verified
+    assert new_hash.startswith("$argon2id$")
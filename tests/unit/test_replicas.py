@@ -0,0 +1,85 @@
+import pytest
+
+from identity.adapters.db.replicas import Replica, ReplicaRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(selection="round_robin", **kwargs):
+    clock = FakeClock()
+    replicas = [Replica(name, session_factory=None) for name in ("a", "b", "c")]
+    return ReplicaRouter(replicas, selection=selection, clock=clock, **kwargs), clock
+
+
+def first_names(router, times, key=None):
+    return [router.candidates(key)[0].name for _ in range(times)]
+
+
+def test_round_robin_rotates_the_replicas():
+    router, _ = make_router()
+
+    assert first_names(router, 4) == ["a", "b", "c", "a"]
+
+
+def test_least_loaded_prefers_the_replica_with_fewer_sessions():
+    router, _ = make_router("least_loaded")
+    router.replicas[0].in_use = 3
+    router.replicas[1].in_use = 1
+    router.replicas[2].in_use = 1
+
+    assert first_names(router, 4) == ["b", "b", "c", "b"]
+
+
+def test_unknown_selection_is_rejected():
+    with pytest.raises(ValueError):
+        make_router("random")
+
+
+def test_unhealthy_replicas_are_skipped_for_a_while():
+    router, clock = make_router(retry_seconds=5.0)
+    router.mark_unhealthy(router.replicas[0])
+    router.mark_unhealthy(router.replicas[1])
+
+    assert [replica.name for replica in router.candidates()] == ["c"]
+
+    router.mark_unhealthy(router.replicas[2])
+    assert router.candidates() == []
+    assert router.stats.fallback_reads == 1
+
+    clock.now += 5.0
+    assert len(router.candidates()) == 3
+    assert router.snapshot()["replicas"][0] == {"name": "a", "healthy": True, "in_use": 0, "reads": 0,
+                                               "failures": 1}
+
+
+def test_changed_users_and_listings_are_pinned_to_the_primary():
+    router, clock = make_router(read_your_writes_seconds=2.0)
+    router.pin(["pepita@version1.com"])
+
+    assert router.candidates("pepita@version1.com") == []
+    assert router.candidates() == []
+    assert len(router.candidates("potato@version1.com")) == 3
+    assert router.stats.pinned_reads == 2
+
+    clock.now += 2.0
+    router.pin([])
+    assert len(router.candidates("pepita@version1.com")) == 3
+    assert router.snapshot()["pinned"] == 0
+
+
+def test_every_read_is_pinned_when_there_are_too_many_pins():
+    router, clock = make_router(read_your_writes_seconds=2.0, max_pinned=2)
+    router.pin(["a@version1.com", "b@version1.com", "c@version1.com"])
+
+    assert router.snapshot()["pinned"] == 2
+    assert router.is_pinned("a@version1.com")
+    assert router.is_pinned("z@version1.com")
+
+    clock.now += 2.0
+    assert not router.is_pinned("a@version1.com")
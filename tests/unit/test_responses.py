@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+from identity.api import responses
+from identity.api.schemas.users import User, UsersPage, UsersUpdateReport
+from identity.domain.pagination import Page
+from identity.domain.users import User as DomainUser, UserUpdateOutcome
+
+
+def new_page():
+    when = datetime(2023, 4, 1, 10, 0, 0, 123456)
+    user = DomainUser(created_at=when, updated_at=when, email="petete@version1.com", password="hash", active=True)
+    return Page([user], None, 1, None, next_cursor="abc")
+
+
+def test_dump_picks_schema_fields():
+    content = responses.dump(UsersPage, new_page())
+
+    assert content["next_cursor"] == "abc"
+    assert content["page_size"] == 1
+    assert set(content["items"][0]) == set(User.__fields__)
+
+
+def test_trusted_response_renders_like_the_schema(monkeypatch):
+    page = new_page()
+    expected = json.loads(UsersPage.from_orm(page).json())
+
+    rendered = responses.trusted_response(UsersPage, page)
+    monkeypatch.setattr(responses, "JSON_RESPONSE_CLASS", JSONResponse)
+    rendered_by_json = responses.trusted_response(UsersPage, page)
+
+    assert json.loads(rendered.body) == expected
+    assert json.loads(rendered_by_json.body) == expected
+    assert json.loads(responses.render(responses.dump(UsersPage, page))) == expected
+
+
+def test_dump_picks_schema_fields_from_dicts():
+    outcomes = [UserUpdateOutcome(email="petete@version1.com", result="updated")]
+
+    content = responses.dump(UsersUpdateReport, {"updated": 1, "results": outcomes})
+
+    assert content == {"updated": 1, "results": [{"email": "petete@version1.com", "result": "updated"}]}
@@ -0,0 +1,85 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from jose import JWTError, jwt
+
+from identity.services import keys, security
+from identity.services.security import create_access_token, decode_access_token
+
+
+def write_public_key(keys_dir, kid):
+    """Keeps only the public part of a key, like a retired key"""
+    private_pem = (keys_dir / f"{kid}.pem").read_bytes()
+    private_key = serialization.load_pem_private_key(private_pem, password=None)
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo)
+    (keys_dir / f"{kid}.pem").write_bytes(public_pem)
+    return private_pem
+
+
+@pytest.fixture
+def keys_dir(tmp_path):
+    for kid in ("old", "current"):
+        keys.generate_signing_key(str(tmp_path), kid, "RS256")
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    security.verified_tokens.clear()
+
+
+def test_tokens_are_signed_by_the_active_key(keys_dir, monkeypatch):
+    ring = keys.load_key_ring(str(keys_dir), "RS256", "current")
+    monkeypatch.setattr(keys, "get_key_ring", lambda: ring)
+
+    token = create_access_token({"sub": "petete@version1.com"})
+
+    assert jwt.get_unverified_header(token)["kid"] == "current"
+    assert decode_access_token(token)["sub"] == "petete@version1.com"
+
+
+def test_tokens_of_retiring_keys_are_verified(keys_dir, monkeypatch):
+    old_private_key = write_public_key(keys_dir, "old")
+    ring = keys.load_key_ring(str(keys_dir), "RS256", "current")
+    monkeypatch.setattr(keys, "get_key_ring", lambda: ring)
+
+    token = jwt.encode({"sub": "petete@version1.com"}, old_private_key.decode(), algorithm="RS256",
+                       headers={"kid": "old"})
+
+    assert ring.keys["old"].private_key is None
+    assert decode_access_token(token)["sub"] == "petete@version1.com"
+
+
+def test_tokens_of_unknown_keys_are_rejected(keys_dir, tmp_path_factory, monkeypatch):
+    other_dir = tmp_path_factory.mktemp("other")
+    keys.generate_signing_key(str(other_dir), "current", "RS256")
+    other_ring = keys.load_key_ring(str(other_dir), "RS256", "current")
+    monkeypatch.setattr(keys, "get_key_ring", lambda: other_ring)
+    forged = create_access_token({"sub": "petete@version1.com"})
+    unknown = jwt.encode({"sub": "petete@version1.com"}, other_ring.active.private_key, algorithm="RS256",
+                         headers={"kid": "unknown"})
+
+    ring = keys.load_key_ring(str(keys_dir), "RS256", "current")
+    monkeypatch.setattr(keys, "get_key_ring", lambda: ring)
+
+    for token in (forged, unknown):
+        with pytest.raises(JWTError):
+            decode_access_token(token)
+
+
+def test_jwks_publishes_public_keys_only(keys_dir):
+    ring = keys.load_key_ring(str(keys_dir), "RS256", "current")
+
+    jwks = ring.jwks()
+
+    assert sorted(key["kid"] for key in jwks["keys"]) == ["current", "old"]
+    assert all(key["use"] == "sig" and key["kty"] == "RSA" and "d" not in key for key in jwks["keys"])
+
+
+def test_active_key_must_be_private(keys_dir):
+    write_public_key(keys_dir, "current")
+
+    with pytest.raises(ValueError):
+        keys.load_key_ring(str(keys_dir), "RS256", "current")
+    with pytest.raises(ValueError):
+        keys.load_key_ring(str(keys_dir), "HS256", "old")
@@ -0,0 +1,83 @@
+import pytest
+
+from identity.adapters.throttling import RedisFixedWindow, ShardedTokenBucket
+from identity.services.exceptions import LoginThrottledException
+from identity.services.throttling import LoginThrottle
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class LocalRedis:
+    """Stand-in of the Redis commands used by the limiters, keys expire with the clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+
+    async def incr(self, key):
+        value, expires_at = self.values.get(key, (0, None))
+        if expires_at is not None and expires_at <= self.clock():
+            value, expires_at = 0, None
+        self.values[key] = (value + 1, expires_at)
+        return value + 1
+
+    async def expire(self, key, seconds):
+        value, _ = self.values[key]
+        self.values[key] = (value, self.clock() + seconds)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_admits_bursts_and_refills():
+    clock = Clock()
+    limiter = ShardedTokenBucket(attempts=3, period_seconds=30, clock=clock)
+
+    assert [await limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert await limiter.acquire("a") == pytest.approx(10)
+    assert await limiter.acquire("b") == 0
+    clock.now = 10
+    assert await limiter.acquire("a") == 0
+    assert await limiter.acquire("a") > 0
+
+
+def test_token_bucket_keeps_a_bounded_number_of_keys():
+    limiter = ShardedTokenBucket(attempts=1, period_seconds=60, shards=4, max_keys_per_shard=2)
+
+    for number in range(100):
+        limiter.take(f"key{number}")
+
+    assert len(limiter) <= 8
+
+
+@pytest.mark.asyncio
+async def test_fixed_window_is_shared_by_workers():
+    clock = Clock(1000.0)
+    redis = LocalRedis(clock)
+    workers = [RedisFixedWindow(redis, attempts=2, period_seconds=60, clock=clock) for _ in range(2)]
+
+    assert await workers[0].acquire("a") == 0
+    assert await workers[1].acquire("a") == 0
+    assert await workers[0].acquire("a") == pytest.approx(20)
+    clock.now = 1020.0
+    assert await workers[1].acquire("a") == 0
+
+
+@pytest.mark.asyncio
+async def test_login_throttle_counts_accounts_and_clients():
+    throttle = LoginThrottle(ShardedTokenBucket(2, 60), ShardedTokenBucket(3, 60))
+
+    await throttle.check("Potato@version1.com", "10.0.0.1")
+    await throttle.check("potato@version1.com", "10.0.0.2")
+    with pytest.raises(LoginThrottledException):
+        await throttle.check("potato@version1.com", "10.0.0.1")
+    await throttle.check("pepita@version1.com", "10.0.0.1")
+    with pytest.raises(LoginThrottledException) as throttled:
+        await throttle.check("purita@version1.com", "10.0.0.1")
+
+    assert throttled.value.retry_after > 0
+    assert throttle.stats.snapshot() == {"admitted": 3, "rejected_account": 1, "rejected_client": 1}
@@ -1,7 +1,7 @@
 import pytest
 
 from datetime import datetime, timedelta
-from identity.domain.users import User
+from identity.domain.users import User, UserProfile, validate_email
 
 
 def new_user(active=False):
@@ -51,3 +51,39 @@ def test_disable_user():
 
     assert user.is_active()
     assert user.updated_at >= now
+
+
+def test_users_are_equal_by_email():
+    user = new_user()
+    other = User(email=user.email, password="other", active=True)
+
+    assert user == other
+    assert len({user, other}) == 1
+    assert not hasattr(user, "__dict__")
+
+
+def test_user_requires_a_password():
+    with pytest.raises(TypeError):
+        User(email='petete@version1.com')
+
+
+def test_profile_leaves_the_password_out():
+    profile = new_user(active=True).profile()
+
+    assert profile == UserProfile(created_at=profile.created_at, updated_at=profile.updated_at,
+                                  email='petete@version1.com', active=True)
+    assert not hasattr(profile, "password")
+
+
+@pytest.mark.parametrize("email, expected", [
+    ("petete@VERSION1.com", "petete@version1.com"),
+    ("Petete@version1.com", "Petete@version1.com"),
+])
+def test_validate_email(email, expected):
+    assert validate_email(email) == expected
+
+
+@pytest.mark.parametrize("email", ["petete", "petete@", "@version1.com", None])
+def test_validate_invalid_email(email):
+    with pytest.raises(ValueError):
+        validate_email(email)